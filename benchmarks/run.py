@@ -0,0 +1,242 @@
+"""Offline benchmarks of the dataset hot paths on synthetic captures.
+
+    hatch run bench --packets 10,1000,100000 --mix tcp=0.7,udp=0.3
+
+Every stage runs in a fresh process, so its peak RSS is not inflated by the
+stages before it. Stages needing tshark are skipped when it is not
+installed. Results are written as JSON, pass a previous result file with
+--compare to see the change of every stage.
+"""
+
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import click  # noqa: E402
+
+from dataset.dataset import Dataset  # noqa: E402
+from dataset.encoding import CaptureEncoding  # noqa: E402
+from dataset.tshark import clean_row  # noqa: E402
+from lib.clean_raw_data import clean_raw_data  # noqa: E402
+from lib.pcap import read_packets  # noqa: E402
+from lib.synthetic import PROTOCOL_MIX, write_synthetic_capture  # noqa: E402
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+STAGES = [
+    "read_packets",
+    "answer_questions_for_cap",
+    "format_rows",
+    "cap_to_str",
+    "generate_dataset",
+    "clean_raw_data",
+]
+
+# Stages that run tshark
+TSHARK_STAGES = {"cap_to_str", "generate_dataset"}
+
+
+@click.command()
+@click.option(
+    "--packets",
+    default="10,1000,100000",
+    show_default=True,
+    help="Comma separated sizes of the synthetic captures",
+)
+@click.option(
+    "--mix",
+    default=None,
+    help="Protocol mix as protocol=share pairs, e.g. tcp=0.7,udp=0.2,icmp=0.1",
+)
+@click.option("--stages", default=",".join(STAGES), show_default=True)
+@click.option(
+    "--output", default=None, help="Result file, by default named after the commit"
+)
+@click.option("--compare", default=None, help="Previous result file to compare with")
+def benchmark(packets, mix, stages, output, compare):
+    mix = _parse_mix(mix) if mix else PROTOCOL_MIX
+    stages = [stage for stage in stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise click.BadParameter(f"Unknown stages {', '.join(sorted(unknown))}")
+    if not shutil.which("tshark"):
+        click.echo(f"tshark not found, skipping {', '.join(sorted(TSHARK_STAGES))}")
+        stages = [stage for stage in stages if stage not in TSHARK_STAGES]
+
+    results = []
+    for size in [int(size) for size in packets.split(",")]:
+        with tempfile.TemporaryDirectory() as workdir:
+            capture_path = os.path.join(workdir, "captures")
+            os.makedirs(capture_path)
+            capture = os.path.join(capture_path, "synthetic.pcap")
+
+            start = time.perf_counter()
+            write_synthetic_capture(capture, size, mix)
+            timings = {"generate": _timing(time.perf_counter() - start, size, None)}
+
+            for stage in stages:
+                timings[stage] = _run_isolated(stage, capture, workdir, size)
+
+            results.append(
+                {
+                    "packets": size,
+                    "file_size": os.path.getsize(capture),
+                    "stages": timings,
+                }
+            )
+        _print_result(results[-1])
+
+    report = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mix": mix,
+        "results": results,
+    }
+
+    if output is None:
+        os.makedirs(RESULTS_PATH, exist_ok=True)
+        output = os.path.join(RESULTS_PATH, f"{report['commit'] or 'results'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    click.echo(f"Results written to {output}")
+
+    if compare:
+        with open(compare, "r") as f:
+            _print_comparison(json.load(f), report)
+
+
+def _run_isolated(stage: str, capture: str, workdir: str, size: int) -> dict:
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=get_context("spawn")
+    ) as executor:
+        seconds, base_rss, peak_rss = executor.submit(
+            _run_stage, stage, capture, workdir
+        ).result()
+    timing = _timing(seconds, size, peak_rss)
+    timing["base_rss_kb"] = base_rss
+    return timing
+
+
+def _run_stage(stage: str, capture: str, workdir: str) -> tuple:
+    """Run one stage in this (fresh) process, returns (seconds, base RSS, peak RSS)"""
+    os.chdir(workdir)
+    capture_path = os.path.dirname(capture)
+    dataset = Dataset(capture_path)
+    argument = None
+
+    if stage == "format_rows":
+        # Printed by tshark in the real pipeline, built here so it runs offline
+        argument = _tshark_fields(capture)
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        if stage == "read_packets":
+            for _ in read_packets(capture):
+                pass
+        elif stage == "answer_questions_for_cap":
+            dataset.answer_questions_for_cap(os.path.basename(capture))
+        elif stage == "format_rows":
+            CaptureEncoding().render(clean_row(line) for line in argument)
+        elif stage == "cap_to_str":
+            dataset._Dataset__cap_to_str(capture)
+        elif stage == "generate_dataset":
+            dataset.generate_dataset("benchmark", 10 * [""])
+        elif stage == "clean_raw_data":
+            os.makedirs("data", exist_ok=True)
+            clean_raw_data(capture_path, max_packets=sys.maxsize, workers=1)
+        seconds = time.perf_counter() - start
+
+    return seconds, base_rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _tshark_fields(capture: str) -> list:
+    """Approximation of the tshark output lines for the packets of a capture"""
+    lines = []
+    first = None
+    for number, packet in enumerate(read_packets(capture), start=1):
+        if first is None:
+            first = packet.timestamp
+        protocol = packet.layers[-1].upper() if packet.layers else ""
+        lines.append(
+            f"{number}\t{packet.timestamp - first:.6f}\t{packet.src or ''}\t"
+            f"{packet.dst or ''}\t{protocol}\t{packet.length}\t1234 → 80 [ACK] Seq=1 Ack=1 Win=512 Len=0\n"
+        )
+    return lines
+
+
+def _timing(seconds: float, size: int, peak_rss: int) -> dict:
+    return {
+        "seconds": round(seconds, 6),
+        "packets_per_second": round(size / seconds, 1) if seconds > 0 else None,
+        "peak_rss_kb": peak_rss,
+    }
+
+
+def _parse_mix(mix: str) -> dict:
+    try:
+        return {
+            protocol: float(share)
+            for protocol, share in (pair.split("=") for pair in mix.split(","))
+        }
+    except ValueError:
+        raise click.BadParameter(f"Invalid protocol mix {mix}")
+
+
+def _commit() -> str:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode("utf-8")
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_result(result: dict) -> None:
+    click.echo(f"{result['packets']} packets ({result['file_size']} bytes)")
+    for stage, timing in result["stages"].items():
+        rss = (
+            f"{timing['peak_rss_kb'] / 1024:8.1f} MB"
+            if timing["peak_rss_kb"]
+            else " " * 11
+        )
+        click.echo(
+            f"  {stage:<26} {timing['seconds']:10.4f} s {timing['packets_per_second'] or 0:14.1f} packets/s {rss}"
+        )
+
+
+def _print_comparison(previous: dict, current: dict) -> None:
+    click.echo(
+        f"Compared with {previous.get('commit')} (ratio of the times, < 1 is faster)"
+    )
+    before = {result["packets"]: result["stages"] for result in previous["results"]}
+    for result in current["results"]:
+        for stage, timing in result["stages"].items():
+            old = before.get(result["packets"], {}).get(stage)
+            if old and old["seconds"]:
+                click.echo(
+                    f"  {result['packets']:>10} {stage:<26} {timing['seconds'] / old['seconds']:6.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    benchmark()
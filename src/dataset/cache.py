@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import tempfile
+from subprocess import check_output
+
+CACHE_PATH = os.path.join(os.getcwd(), "data/cache")
+
+# Bump when the stored artifacts change shape or meaning
+CACHE_VERSION = 3
+
+_tshark_version = None
+
+
+def tshark_version() -> str:
+    """Version line of the installed tshark, part of every cache key"""
+    global _tshark_version
+
+    if _tshark_version is None:
+        try:
+            out = check_output(["tshark", "--version"])
+            _tshark_version = out.decode("utf-8").splitlines()[0].strip()
+        except Exception:
+            _tshark_version = "unknown"
+    return _tshark_version
+
+
+class CaptureCache:
+    """Content-addressed store of the artifacts computed for each capture.
+
+    Entries are JSON files named after the hash of the capture content plus
+    the tshark version, so renamed or copied captures are still hits and a
+    tshark upgrade invalidates every rendered table.
+    """
+
+    def __init__(
+        self,
+        cache_path: str = CACHE_PATH,
+        max_size: int = 1024 * 1024 * 1024,
+        enabled: bool = True,
+        rebuild: bool = False,
+    ):
+        self.__cache_path = cache_path
+        self.__max_size = max_size
+        self.enabled = enabled
+        self.__rebuild = rebuild
+        self.hits = 0
+        self.misses = 0
+
+        if self.enabled:
+            os.makedirs(self.__cache_path, exist_ok=True)
+
+    def key(self, file: str, variant: str = "") -> str:
+        """Cache key of a capture, `variant` tells apart renderings of the same file"""
+        digest = hashlib.sha256()
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(
+            f"\0{tshark_version()}\0{CACHE_VERSION}\0{variant}".encode("utf-8")
+        )
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        if not self.enabled or self.__rebuild:
+            return None
+
+        path = self.__entry_path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            # Refresh the modification time, eviction removes the least recently used
+            os.utime(path)
+            self.hits += 1
+            return entry
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+    def put(self, key: str, entry: dict) -> None:
+        if not self.enabled:
+            return
+
+        path = self.__entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits in max_size"""
+        if not self.enabled:
+            return
+
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.__cache_path):
+            for file in files:
+                if not file.endswith(".json"):
+                    continue
+                stat = os.stat(os.path.join(root, file))
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, file)))
+                total_size += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total_size <= self.__max_size:
+                break
+            os.remove(path)
+            total_size -= size
+
+    def __entry_path(self, key: str) -> str:
+        return os.path.join(self.__cache_path, key[:2], f"{key}.json")
@@ -1,13 +1,28 @@
 import json
 import os
-import re
-from subprocess import check_output
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 import pyshark
 
+from dataset.cache import CaptureCache
+from dataset.encoding import CaptureEncoding, estimate_tokens
+from dataset.stats import CaptureStats, stats_key
+from dataset.storage import DatasetStore, build_prompt, capture_rows
+from dataset.tshark import read_rows
+from dataset.windowed import CaptureWindows
+from lib import profiling
+from lib.pcap import Packet, UnsupportedCapture, read_packets
+
 
 class Dataset:
-    def __init__(self, data_path: str):
+    def __init__(
+        self,
+        data_path: str,
+        encoding: CaptureEncoding = None,
+        windows: CaptureWindows = None,
+        stats_options: dict = None,
+    ):
         self.__questions = [
             "What is the total number of packets in the trace?",
             "How many unique communicators are present in the trace?",
@@ -20,6 +35,11 @@ class Dataset:
             "What is the average bytes/s sent in the communication?",
         ]
 
+        self.__encoding = encoding or CaptureEncoding()
+        self.__windows = windows
+        # CaptureStats options, approximate mode and its error bounds
+        self.__stats_options = stats_options or {}
+
         if os.path.exists(os.path.join(os.getcwd(), data_path)):
             self.__data_path = data_path
             self.__files = self.__get_files(data_path)
@@ -27,61 +47,34 @@ class Dataset:
             raise Exception("The path is not valid")
 
     def answer_questions_for_cap(self, file: str) -> str:
-        cap = pyshark.FileCapture(os.path.join(self.__data_path, file))
-        quest_sol = {}
-
-        num_packets = 0
-        num_bytes = 0
-        ip_count = {}
-        protocols_count = {}
-        start_timestamp = 0
+        path = os.path.join(self.__data_path, file)
 
-        can_answer_ip_question = False
-
-        for packet in cap:
+        with profiling.span("stats", file=file):
             try:
-                # Get Basic info
-                if num_packets == 0:
-                    start_timestamp = float(packet.sniff_timestamp)
-
-                num_packets += 1
-                num_bytes += int(packet.length)
-
-                for layer in packet.layers:
-                    if layer.layer_name not in protocols_count:
-                        protocols_count[layer.layer_name] = 1
-                    else:
-                        protocols_count[layer.layer_name] += 1
-
-                # IP layer
-                if "ip" in packet and packet.ip.src and packet.ip.dst:
-                    can_answer_ip_question = True
-                    ip_src = packet.ip.src
-                    ip_dst = packet.ip.dst
-                elif "ipv6" in packet and packet.ipv6.src and packet.ipv6.dst:
-                    can_answer_ip_question = True
-                    ip_src = packet.ipv6.src
-                    ip_dst = packet.ipv6.dst
-                else:
-                    continue
-
-                if ip_src not in ip_count:
-                    ip_count[ip_src] = 1
-                else:
-                    ip_count[ip_src] += 1
+                stats = CaptureStats.from_packets(
+                    read_packets(path), **self.__stats_options
+                )
+            except UnsupportedCapture as e:
+                print(f"Native reader can not decode {file} ({e}), using pyshark")
+                profiling.count("pyshark_fallbacks")
+                with profiling.span("pyshark", file=file):
+                    stats = CaptureStats.from_packets(
+                        self.__pyshark_packets(path), **self.__stats_options
+                    )
+        profiling.count("packets", stats.num_packets)
 
-                if ip_src != ip_dst:
-                    if ip_dst not in ip_count:
-                        ip_count[ip_dst] = 1
-                    else:
-                        ip_count[ip_dst] += 1
+        return self.__answers(stats)
 
-            except Exception as e:
-                print(e)
+    def __answers(self, stats: CaptureStats) -> dict:
+        """Ground truth answers of the questions from the stats of a capture"""
+        quest_sol = {}
 
-        cap.close()
+        num_packets = stats.num_packets
+        num_bytes = stats.num_bytes
+        protocols_count = stats.protocols_count
+        can_answer_ip_question = stats.can_answer_ip_question
 
-        communication_time = round(float(packet.sniff_timestamp) - start_timestamp, 6)
+        communication_time = round(stats.end_timestamp - stats.start_timestamp, 6)
 
         bytes_per_second = (
             num_bytes / communication_time if communication_time > 0 else 0
@@ -93,9 +86,13 @@ class Dataset:
                     f"In the capture there are a total of {str(num_packets)} packets"
                 )
             elif i == 1:
-                if can_answer_ip_question:
+                if can_answer_ip_question and stats.approximate:
+                    quest_sol[question] = (
+                        f"There are approximately {str(stats.distinct_ips())} unique communicators in the trace (estimated)."
+                    )
+                elif can_answer_ip_question:
                     quest_sol[question] = (
-                        f"There are a total of {str(len(ip_count))} unique communicators in the trace. These are the IPs: {', '.join(ip_count.keys())}"
+                        f"There are a total of {str(stats.distinct_ips())} unique communicators in the trace. These are the IPs: {', '.join(stats.ip_count.keys())}"
                     )
                 else:
                     quest_sol[question] = (
@@ -103,9 +100,15 @@ class Dataset:
                     )
             elif i == 2:
                 if can_answer_ip_question:
-                    quest_sol[question] = (
-                        f"The IP that participates the most in the communication is the IP {max(ip_count, key=ip_count.get)} this appears in a total of {ip_count[max(ip_count, key=ip_count.get)]} communications."
-                    )
+                    top_ip, top_count = stats.top_talker()
+                    if stats.approximate:
+                        quest_sol[question] = (
+                            f"The IP that participates the most in the communication is approximately the IP {top_ip} this appears in about {top_count} communications (estimated)."
+                        )
+                    else:
+                        quest_sol[question] = (
+                            f"The IP that participates the most in the communication is the IP {top_ip} this appears in a total of {top_count} communications."
+                        )
                 else:
                     quest_sol[question] = (
                         "The used protocol in the capture does not have IP addresses. Cannot answer the question."
@@ -157,37 +160,201 @@ class Dataset:
 
         return quest_sol
 
-    def generate_dataset(self, name: str, context: str) -> None:
-        """Generate a dataset with all the questions for each file"""
+    def __pyshark_packets(self, path: str):
+        """Fallback packet source for captures the native reader can not decode"""
+        cap = pyshark.FileCapture(path, keep_packets=False)
+
+        try:
+            for packet in cap:
+                try:
+                    if "ip" in packet and packet.ip.src and packet.ip.dst:
+                        ip_src = packet.ip.src
+                        ip_dst = packet.ip.dst
+                    elif "ipv6" in packet and packet.ipv6.src and packet.ipv6.dst:
+                        ip_src = packet.ipv6.src
+                        ip_dst = packet.ipv6.dst
+                    else:
+                        ip_src = ip_dst = None
+
+                    yield Packet(
+                        float(packet.sniff_timestamp),
+                        int(packet.length),
+                        ip_src,
+                        ip_dst,
+                        tuple(layer.layer_name for layer in packet.layers),
+                    )
+                except Exception as e:
+                    print(e)
+        finally:
+            cap.close()
+
+    def generate_dataset(
+        self,
+        name: str,
+        context: str,
+        cache: CaptureCache = None,
+        workers: int = 1,
+        max_prompt_tokens: int = None,
+        output_format: str = "sqlite",
+    ) -> list:
+        """Generate a dataset with all the questions for each file.
+
+        The dataset is written to data/<name>/dataset.sqlite, with every
+        capture table stored once, or to data/<name>/dataset.jsonl with
+        the full prompt of every question when `output_format` is "jsonl".
+        Returns the (file, error) of the captures left out of it.
+        """
+        if output_format not in ("sqlite", "jsonl"):
+            raise ValueError(f"Unknown dataset format {output_format}")
         if not os.path.exists(os.path.join(os.getcwd(), f"data/{name}/")):
             os.makedirs(os.path.join(os.getcwd(), f"data/{name}/"))
 
-        # Create a json file where store the dataset
-        with open(os.path.join(os.getcwd(), f"data/{name}/dataset.jsonl"), "w") as f:
-            for file_cap in self.__files:
-                print(f"Answering questions for {file_cap}")
-                try:
-                    # Answer the question
-                    question_and_answers = self.answer_questions_for_cap(file_cap)
+        if cache is None:
+            cache = CaptureCache(enabled=False)
+
+        failures = []
+        prompt_tokens = 0
+
+        path = os.path.join(os.getcwd(), f"data/{name}/dataset.{output_format}")
+        if output_format == "sqlite":
+            store = DatasetStore.create(
+                path, context[: len(self.__questions)], self.__questions
+            )
+            f = None
+        else:
+            # Create a json file where store the dataset
+            store = None
+            f = open(path, "w")
 
-                    i = 0
+        try:
+            for file_cap, entry, error in self.__iter_artifacts(cache, workers):
+                if error:
+                    print(f"Error generating dataset for {file_cap}. ERROR: {error}")
+                    failures.append((file_cap, error))
+                    continue
 
-                    for question, answer in question_and_answers.items():
-                        prompt = f"{context[i]}\nNo.|Time|Source|Destination|Protocol|Length|Info\n {self.__cap_to_str(os.path.join(self.__data_path, file_cap))}\nQ: {question}"
+                prompts = [
+                    build_prompt(context[i], entry["table"], question)
+                    for i, question in enumerate(entry["answers"])
+                ]
 
-                        data = {
-                            "context": "You are a network analyst and you have to help answering questions about a network trace.",
-                            "prompt": prompt,
-                            "answer": answer,
-                        }
+                tokens = max(estimate_tokens(prompt) for prompt in prompts)
+                if max_prompt_tokens and tokens > max_prompt_tokens:
+                    error = f"prompts of ~{tokens} tokens exceed the budget of {max_prompt_tokens}"
+                    print(f"Skipping {file_cap}, {error}")
+                    failures.append((file_cap, error))
+                    continue
+                prompt_tokens += sum(estimate_tokens(prompt) for prompt in prompts)
 
-                        f.write(json.dumps(data) + "\n")
-                        i += 1
-                except Exception as e:
-                    print(f"Error generating dataset for {file_cap}. ERROR: {e}")
-                    import sys
+                print(f"Answering questions for {file_cap}")
+
+                if store is not None:
+                    store.add(file_cap, entry["table"], entry["answers"])
+                    continue
+
+                for data in capture_rows(
+                    file_cap, entry["table"], context, entry["answers"]
+                ):
+                    line = json.dumps(data) + "\n"
+                    f.write(line)
+                    profiling.count("bytes_written", len(line))
+        finally:
+            if store is not None:
+                store.close()
+                profiling.count("bytes_written", os.path.getsize(path))
+            else:
+                f.close()
+
+        print(f"Estimated prompt tokens in the dataset: {prompt_tokens}")
+        cache.evict()
+        print(f"Capture cache: {cache.hits} hits, {cache.misses} misses")
+
+        if failures:
+            print(f"{len(failures)} captures failed and were left out of the dataset:")
+            for file_cap, error in failures:
+                print(f"  {file_cap}: {error}")
+
+        return failures
+
+    def capture_artifacts(self, file_cap: str) -> dict:
+        """Rendered table and answers of a capture, without any caching"""
+        path = os.path.join(self.__data_path, file_cap)
+        profiling.count("files")
+        with profiling.span("capture", file=file_cap):
+            if self.__windows and self.__windows.applies(path):
+                # Too large for a packet table, summarized window by window
+                try:
+                    with profiling.span("windows", file=file_cap):
+                        stats, table = self.__windows.summarize(
+                            read_packets(path), **self.__stats_options
+                        )
+                    profiling.count("packets", stats.num_packets)
+                    return {"table": table, "answers": self.__answers(stats)}
+                except UnsupportedCapture as e:
+                    # e.g. a link type only tshark decodes, rendered as usual
+                    print(
+                        f"Native reader can not decode {file_cap} ({e}), rendering its packet table"
+                    )
+                    profiling.count("window_fallbacks")
+
+            return {
+                "table": self.__cap_to_str(path),
+                "answers": self.answer_questions_for_cap(file_cap),
+            }
+
+    def __iter_artifacts(self, cache: CaptureCache, workers: int):
+        """Yield (file, artifacts, error) for every capture in a stable order.
+
+        Cache lookups happen in this process, only the misses are computed,
+        in a process pool when more than one worker is requested.
+        """
+        entries = {}
+        for file_cap in self.__files:
+            key = None
+            if cache.enabled:
+                variant = self.__encoding.key() + stats_key(self.__stats_options)
+                if self.__windows:
+                    variant += self.__windows.key()
+                key = cache.key(os.path.join(self.__data_path, file_cap), variant)
+            entries[file_cap] = (key, cache.get(key) if key else None)
+
+        missing = [file_cap for file_cap, (_, e) in entries.items() if e is None]
+        futures = []
+        if workers > 1 and len(missing) > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            if profiling.enabled():
+                # The spans of the workers come back with their results
+                futures = [
+                    executor.submit(
+                        profiling.run_profiled, _capture_artifacts, self, file_cap
+                    )
+                    for file_cap in missing
+                ]
+                results = profiling.merged(future.result() for future in futures)
+            else:
+                futures = [
+                    executor.submit(_capture_artifacts, self, file_cap)
+                    for file_cap in missing
+                ]
+                results = (future.result() for future in futures)
+        else:
+            executor = None
+            results = map(_capture_artifacts, repeat(self), missing)
 
-                    sys.exit(1)
+        try:
+            for file_cap, (key, entry) in entries.items():
+                error = None
+                if entry is None:
+                    entry, error = next(results)
+                    if key and entry is not None:
+                        cache.put(key, entry)
+                yield file_cap, entry, error
+        finally:
+            if executor is not None:
+                # By hand, shutdown(cancel_futures=True) needs Python 3.9
+                for future in futures:
+                    future.cancel()
+                executor.shutdown()
 
     def __get_files(self, data_path: str) -> list:
         files = []
@@ -198,51 +365,28 @@ class Dataset:
                 or file.endswith(".pcapng")
             ):
                 files.append(file)
-        return files
+        # Sorted so the dataset does not depend on the directory listing order
+        return sorted(files)
 
     def __cap_to_str(self, file: str) -> str:
         try:
-            out = check_output(
-                [
-                    "tshark",
-                    "-r",
-                    file,
-                    "-T",
-                    "tabs",
-                ]
-            )
-            return self.__clean_cap_format(out.decode("utf-8"))
+            profiling.count("tshark_spawns")
+            with profiling.span("tshark", file=os.path.basename(file)):
+                # As large as the rendered table, reading the rows before
+                # rendering them times tshark apart from the formatting
+                rows = list(read_rows(file))
+            with profiling.span("format"):
+                return self.__encoding.render(rows)
         except Exception as e:
             raise Exception(f"Fail reading the file. ERROR: {e}")
 
-    def __clean_cap_format(self, cap: str) -> str:
-        # Split the string by lines
-        cap_lines = cap.strip().split("\n")
-
-        match_tabs = r"(?<!\\)\t"
-
-        table_rows = []
-
-        for line in cap_lines:
-            columns = re.split(match_tabs, line.strip())
-
-            if "\u2192" in columns:
-                # Remove it from list
-                columns.remove("\u2192")
-
-            # Format columns elements before append them to the table
-            for i, col in enumerate(columns):
-                col = col.strip().replace("\u2192", "->").replace('"', "'")
-                columns[i] = col
-
-            table_rows.append(columns)
-
-        cap_formated = ""
-
-        for row in table_rows:
-            cap_formated += " | ".join(row) + "\n"
-
-        return cap_formated
-
     def get_questions(self):
         return self.__questions
+
+
+def _capture_artifacts(dataset: Dataset, file_cap: str) -> tuple:
+    """Process pool entry point, errors are returned so one capture can not stop the run"""
+    try:
+        return dataset.capture_artifacts(file_cap), None
+    except Exception as e:
+        return None, str(e)
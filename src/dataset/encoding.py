@@ -0,0 +1,110 @@
+import json
+import re
+
+COLUMNS = ["No.", "Time", "Source", "Destination", "Protocol", "Length", "Info"]
+
+# Columns the nine questions need, Info is pruned by the compact encoding
+COMPACT_COLUMNS = ["No.", "Time", "Source", "Destination", "Protocol", "Length"]
+
+# A digit, a word or a punctuation sign, roughly how llama tokenizers split
+# capture tables (every digit of a number is a token of its own)
+_TOKEN_PATTERN = re.compile(r"\d|[^\W\d_]+|[^\w\s]|_")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of tokens of a prompt without loading a tokenizer"""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+class CaptureEncoding:
+    """How the packets of a capture are rendered into a prompt.
+
+    The full encoding is the table tshark prints. The compact one replaces
+    the endpoints with host aliases listed once (H1=145.254.160.237), prints
+    relative or delta times with `time_precision` decimals and only keeps
+    `columns`. Times keep the 6 decimals of the duration answers by default,
+    with fewer the duration can not be read from the table.
+    """
+
+    def __init__(
+        self,
+        compact: bool = False,
+        time_format: str = "relative",
+        time_precision: int = 6,
+        columns: list = None,
+    ):
+        if time_format not in ("relative", "delta"):
+            raise ValueError(f"Unknown time format {time_format}")
+
+        self.compact = compact
+        self.time_format = time_format
+        self.time_precision = time_precision
+        self.columns = list(columns or (COMPACT_COLUMNS if compact else COLUMNS))
+
+        unknown = set(self.columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns {', '.join(sorted(unknown))}")
+
+    def key(self) -> str:
+        """Identifies the rendering, part of the capture cache key"""
+        if not self.compact:
+            return "full"
+        return json.dumps(
+            ["compact", self.time_format, self.time_precision, self.columns]
+        )
+
+    def render(self, rows: list) -> str:
+        """Render the rows (one list of COLUMNS values per packet) with the header.
+
+        `rows` can be a generator, the packets are rendered as they come.
+        """
+        if not self.compact:
+            table = "".join(" | ".join(row) + "\n" for row in rows)
+            return f"{'|'.join(COLUMNS)}\n {table}"
+
+        indexes = [COLUMNS.index(column) for column in self.columns]
+        aliases = {}
+        lines = ["|".join(self.columns)]
+        first_time = previous_time = None
+
+        for row in rows:
+            row = _normalize(row)
+            values = []
+            for index in indexes:
+                value = row[index]
+                if index in (2, 3) and value:
+                    if value not in aliases:
+                        aliases[value] = f"H{len(aliases) + 1}"
+                    value = aliases[value]
+                elif index == 1:
+                    value, first_time, previous_time = self.__time(
+                        value, first_time, previous_time
+                    )
+                values.append(value)
+            lines.append("|".join(values))
+
+        if aliases:
+            hosts = ", ".join(f"{alias}={host}" for host, alias in aliases.items())
+            lines.insert(0, f"Hosts: {hosts}")
+        return "\n".join(lines) + "\n"
+
+    def __time(self, value: str, first_time, previous_time) -> tuple:
+        try:
+            current = float(value)
+        except ValueError:
+            return value, first_time, previous_time
+
+        if first_time is None:
+            first_time = previous_time = current
+        if self.time_format == "relative":
+            shown = current - first_time
+        else:
+            shown = current - previous_time
+        return f"{shown:.{self.time_precision}f}", first_time, current
+
+
+def _normalize(row: list) -> list:
+    """Fit a row to COLUMNS, extra columns are part of the Info text"""
+    if len(row) > len(COLUMNS):
+        return row[: len(COLUMNS) - 1] + [" ".join(row[len(COLUMNS) - 1 :])]
+    return row + [""] * (len(COLUMNS) - len(row))
@@ -0,0 +1,264 @@
+import threading
+import time
+from collections import deque
+
+from dataset.stats import CaptureStats
+from dataset.windowed import SUMMARY_PROTOCOLS, SYSTEM_PROMPT, _merge_rows, _row_line
+from llm_eval.ollama import OLLAMA_URL, OllamaClient
+
+# What to do with a closed window when the LLM has too many waiting
+OVERFLOW_POLICIES = ["merge", "drop"]
+
+HEADER = "Windows|Packets|Start|End|Bytes|Hosts|Top talker|Protocols|Dominant|Packets/s|Bytes/s"
+
+
+class LiveAnalyzer:
+    """Rolling statistics of a packet stream, summarized window by window.
+
+    Packets are counted, in O(1) each, into windows of `window` seconds of
+    capture time. The packet source may yield None while it is idle: the
+    open window then closes once `window` seconds have passed since it
+    opened, without waiting for the next packet. Every closed window prints the rolling stats of the last
+    `history` windows and, with a `model`, is queued to be summarized by the
+    LLM in a background thread. At most `queue_size` windows wait for it:
+    when the LLM falls behind, a closed window is merged into the last
+    waiting one, or with the "drop" overflow the oldest waiting one is
+    dropped, so the summaries keep up with the stream. `options` are the
+    CaptureStats options of every window.
+    """
+
+    def __init__(
+        self,
+        window: float = 10.0,
+        history: int = 6,
+        model: str = None,
+        ollama_url: str = OLLAMA_URL,
+        queue_size: int = 2,
+        overflow: str = "merge",
+        output=print,
+        **options,
+    ):
+        if window <= 0:
+            raise ValueError("The window duration must be positive")
+        if history < 1 or queue_size < 1:
+            raise ValueError("The history and the queue need at least one window")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}")
+
+        self.window = window
+        self.history = history
+        self.model = model
+        self.ollama_url = ollama_url
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.options = options
+        self.__output = output
+        self.__output_lock = threading.Lock()
+
+    def run(self, packets) -> dict:
+        """Analyze the packets until the stream ends or is interrupted.
+
+        Returns the counters of the run: packets, windows, summaries and the
+        windows merged or dropped by the back-pressure.
+        """
+        queue = _WindowQueue(self.queue_size, self.overflow)
+        summaries = []
+        worker = None
+        if self.model:
+            worker = threading.Thread(
+                target=self.__summarize, args=(queue, summaries), daemon=True
+            )
+            worker.start()
+
+        self.__emit(HEADER)
+        recent = deque(maxlen=self.history)
+        # Only the packet count and start of the stream are kept, not its stats
+        totals = {"packets": 0, "start": None}
+        row = None
+        opened = None
+        number = 0
+        windows = 0
+        try:
+            for packet in packets:
+                if packet is None:
+                    # An idle tick, close the window when its time is over
+                    if row is not None and time.monotonic() - opened >= self.window:
+                        windows += 1
+                        self.__close(windows, row, recent, totals, queue)
+                        row = None
+                    continue
+
+                number += 1
+                if (
+                    row is not None
+                    and packet.timestamp - row["stats"].start_timestamp >= self.window
+                ):
+                    windows += 1
+                    self.__close(windows, row, recent, totals, queue)
+                    row = None
+                if row is None:
+                    row = _new_row(number, self.options)
+                    opened = time.monotonic()
+                row["stats"].update(packet)
+        except KeyboardInterrupt:
+            pass
+
+        if row is not None:
+            windows += 1
+            self.__close(windows, row, recent, totals, queue)
+        queue.close()
+        if worker is not None:
+            worker.join()
+
+        return {
+            "packets": totals["packets"],
+            "windows": windows,
+            "summaries": len(summaries),
+            "merged": queue.merged,
+            "dropped": queue.dropped,
+        }
+
+    def __close(
+        self, number: int, row: dict, recent: deque, totals: dict, queue
+    ) -> None:
+        totals["packets"] += row["stats"].num_packets
+        if totals["start"] is None:
+            totals["start"] = row["stats"].start_timestamp
+        recent.append(row)
+        rolling = _new_row(recent[0]["first"], self.options)
+        for window in recent:
+            rolling["stats"].merge(window["stats"])
+
+        first = number - len(recent) + 1
+        line = f"{first}-{number}|{_live_line(rolling, totals['start'])}"
+        self.__emit(line)
+
+        if self.model:
+            # A copy, the row stays in the rolling history while it waits
+            window = _new_row(row["first"], self.options)
+            window["stats"].merge(row["stats"])
+            queue.put(
+                {
+                    "window": number,
+                    "windows": 1,
+                    "row": window,
+                    "start": totals["start"],
+                    "rolling": line,
+                }
+            )
+
+    def __summarize(self, queue, summaries: list) -> None:
+        client = OllamaClient(self.ollama_url)
+        while True:
+            item = queue.get()
+            if item is None:
+                return
+
+            last = item["window"] + item["windows"] - 1
+            latest = f"{item['window']}-{last}|{_live_line(item['row'], item['start'])}"
+            response, _ = client.generate(
+                self.model,
+                SYSTEM_PROMPT,
+                f"{HEADER}\n{latest}\n{item['rolling']}\n"
+                f"The first row are the latest windows of a live network trace, the second one the last {self.history} windows. "
+                "Summarize what is happening in at most two sentences: hosts, protocols, rates and anything unusual.",
+            )
+            if response.strip():
+                summaries.append(response.strip())
+                self.__emit(
+                    f"Summary of windows {item['window']}-{last}: {response.strip()}"
+                )
+
+    def __emit(self, line: str) -> None:
+        # Windows and summaries are printed from two threads
+        with self.__output_lock:
+            self.__output(line)
+
+
+class _WindowQueue:
+    """Windows waiting for the LLM, the ones over `size` are merged or dropped"""
+
+    def __init__(self, size: int, overflow: str):
+        self.__items = deque()
+        self.__size = size
+        self.__overflow = overflow
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.merged = 0
+        self.dropped = 0
+
+    def put(self, item: dict) -> None:
+        with self.__condition:
+            if len(self.__items) >= self.__size:
+                if self.__overflow == "drop":
+                    self.__items.popleft()
+                    self.dropped += 1
+                else:
+                    waiting = self.__items[-1]
+                    waiting["row"] = _merge_rows(waiting["row"], item["row"])
+                    waiting["windows"] += item["windows"]
+                    waiting["rolling"] = item["rolling"]
+                    self.merged += 1
+                    return
+            self.__items.append(item)
+            self.__condition.notify()
+
+    def get(self) -> dict:
+        """The oldest waiting window, None once closed and empty"""
+        with self.__condition:
+            while not self.__items and not self.__closed:
+                self.__condition.wait()
+            return self.__items.popleft() if self.__items else None
+
+    def close(self) -> None:
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+
+def replay_packets(packets, rate: float = 0):
+    """Yield the packets at `rate` packets per second of wall clock time.
+
+    Replays a capture file as if it was being captured, to test the live
+    analysis. A rate of 0 replays them as fast as they are read.
+    """
+    start = time.perf_counter()
+    for number, packet in enumerate(packets):
+        if rate > 0:
+            delay = start + number / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield packet
+
+
+def dominant_protocol(stats) -> str:
+    """The most used of the summary protocols, None without any or on a tie"""
+    counts = sorted(
+        (stats.protocols_count.get(protocol, 0) for protocol in SUMMARY_PROTOCOLS),
+        reverse=True,
+    )
+    if not counts[0] or counts[0] == counts[1]:
+        return None
+    return max(SUMMARY_PROTOCOLS, key=lambda p: stats.protocols_count.get(p, 0))
+
+
+def _new_row(first: int, options: dict) -> dict:
+    return {
+        "first": first,
+        "windows": 1,
+        "stats": CaptureStats(**options),
+        "summaries": [],
+    }
+
+
+def _live_line(row: dict, capture_start: float) -> str:
+    stats = row["stats"]
+    seconds = stats.end_timestamp - stats.start_timestamp
+    return "|".join(
+        [
+            _row_line(row, capture_start),
+            (dominant_protocol(stats) or "-").upper(),
+            f"{stats.num_packets / seconds:.2f}" if seconds > 0 else "-",
+            f"{stats.num_bytes / seconds:.2f}" if seconds > 0 else "-",
+        ]
+    )
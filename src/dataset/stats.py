@@ -0,0 +1,232 @@
+import json
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from subprocess import check_output
+
+from lib.pcap import packets_end, read_packets, read_packets_at
+from lib.sketches import HyperLogLog, SpaceSaving
+
+
+class CaptureStats:
+    """Counters the questions are answered from.
+
+    Stats of consecutive parts of a capture merge into the stats of the
+    whole, the order of the IP and protocol counters the answers depend on
+    included, so a capture can be processed in chunks or windows. `offset`
+    is where the packets counted so far end in the file, update_from reads
+    only what was appended since.
+
+    In `approximate` mode the per IP counters, that grow with the number of
+    addresses, are replaced by a HyperLogLog of relative error
+    `distinct_error` and a SpaceSaving sketch whose counts are off by at most
+    `top_error` times the number of IP packets.
+    """
+
+    def __init__(
+        self,
+        approximate: bool = False,
+        distinct_error: float = 0.01,
+        top_error: float = 0.001,
+    ):
+        self.approximate = approximate
+        self.distinct = self.talkers = None
+        if approximate:
+            self.distinct = HyperLogLog(distinct_error)
+            self.talkers = SpaceSaving(math.ceil(1 / top_error))
+
+        self.num_packets = 0
+        self.num_bytes = 0
+        self.ip_count = {}
+        self.protocols_count = {}
+        self.start_timestamp = 0
+        self.end_timestamp = 0
+        self.can_answer_ip_question = False
+        self.offset = 0
+
+    @classmethod
+    def from_packets(cls, packets, **options) -> "CaptureStats":
+        stats = cls(**options)
+        for packet in packets:
+            stats.update(packet)
+        return stats
+
+    def update(self, packet) -> None:
+        """Count one more packet, following the ones counted so far"""
+        # Get Basic info
+        if self.num_packets == 0:
+            self.start_timestamp = packet.timestamp
+        self.end_timestamp = packet.timestamp
+
+        self.num_packets += 1
+        self.num_bytes += packet.length
+
+        protocols_count = self.protocols_count
+        for layer in packet.layers:
+            if layer not in protocols_count:
+                protocols_count[layer] = 1
+            else:
+                protocols_count[layer] += 1
+
+        # IP layer
+        if not packet.src or not packet.dst:
+            return
+        self.can_answer_ip_question = True
+
+        if self.approximate:
+            self.distinct.add(packet.src)
+            self.talkers.add(packet.src)
+            if packet.src != packet.dst:
+                self.distinct.add(packet.dst)
+                self.talkers.add(packet.dst)
+            return
+
+        ip_count = self.ip_count
+        if packet.src not in ip_count:
+            ip_count[packet.src] = 1
+        else:
+            ip_count[packet.src] += 1
+
+        if packet.src != packet.dst:
+            if packet.dst not in ip_count:
+                ip_count[packet.dst] = 1
+            else:
+                ip_count[packet.dst] += 1
+
+    def merge(self, other: "CaptureStats") -> "CaptureStats":
+        """Add the stats of the part of the capture following this one"""
+        if not other.num_packets:
+            return self
+        if not self.num_packets:
+            self.start_timestamp = other.start_timestamp
+
+        self.num_packets += other.num_packets
+        self.num_bytes += other.num_bytes
+        for ip, count in other.ip_count.items():
+            self.ip_count[ip] = self.ip_count.get(ip, 0) + count
+        for protocol, count in other.protocols_count.items():
+            self.protocols_count[protocol] = (
+                self.protocols_count.get(protocol, 0) + count
+            )
+        if self.approximate:
+            self.distinct.merge(other.distinct)
+            self.talkers.merge(other.talkers)
+        self.end_timestamp = other.end_timestamp
+        self.can_answer_ip_question |= other.can_answer_ip_question
+        self.offset = other.offset
+        return self
+
+    def distinct_ips(self) -> int:
+        if self.approximate:
+            return self.distinct.count()
+        return len(self.ip_count)
+
+    def top_talker(self) -> tuple:
+        """The IP in most packets and that number of packets, None without IPs"""
+        if self.approximate:
+            top = self.talkers.top(1)
+            return top[0][:2] if top else None
+        if not self.ip_count:
+            return None
+        ip = max(self.ip_count, key=self.ip_count.get)
+        return ip, self.ip_count[ip]
+
+    def update_from(self, path: str) -> int:
+        """Count the packets of `path` after `offset`, returns how many were read.
+
+        Raises ValueError when the file is smaller than the offset, a ring
+        buffer that rotated to a new file has to be counted from scratch.
+        """
+        if os.path.getsize(path) < self.offset:
+            raise ValueError(f"{path} is smaller than the processed offset")
+
+        before = self.num_packets
+        for offset, packet in read_packets_at(path, self.offset):
+            self.update(packet)
+            self.offset = offset
+        return self.num_packets - before
+
+    def to_dict(self) -> dict:
+        data = {
+            "num_packets": self.num_packets,
+            "num_bytes": self.num_bytes,
+            "ip_count": self.ip_count,
+            "protocols_count": self.protocols_count,
+            "start_timestamp": self.start_timestamp,
+            "end_timestamp": self.end_timestamp,
+            "can_answer_ip_question": self.can_answer_ip_question,
+            "offset": self.offset,
+        }
+        if self.approximate:
+            data["distinct"] = self.distinct.to_dict()
+            data["talkers"] = self.talkers.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CaptureStats":
+        stats = cls()
+        for name, value in data.items():
+            if name in ("ip_count", "protocols_count"):
+                value = dict(value)
+            elif name == "distinct":
+                stats.approximate = True
+                value = HyperLogLog.from_dict(value)
+            elif name == "talkers":
+                value = SpaceSaving.from_dict(value)
+            setattr(stats, name, value)
+        return stats
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CaptureStats) and self.to_dict() == other.to_dict()
+
+
+def stats_key(options: dict) -> str:
+    """Identifies the stats options, part of the capture cache key"""
+    return json.dumps(options, sort_keys=True) if options else ""
+
+
+def split_capture_stats(
+    path: str,
+    packets_per_chunk: int,
+    workers: int = os.cpu_count() or 1,
+    **options,
+) -> CaptureStats:
+    """Stats of a capture split with editcap, the chunks counted in parallel.
+
+    The offset of the stats is the end of the packets counted, so update_from
+    continues with the ones appended to the capture since.
+    """
+    with tempfile.TemporaryDirectory() as tmp_path:
+        check_output(
+            [
+                "editcap",
+                "-c",
+                str(packets_per_chunk),
+                path,
+                os.path.join(tmp_path, "chunk" + os.path.splitext(path)[1]),
+            ]
+        )
+        # editcap numbers the chunks with zero padded indexes
+        chunks = [
+            os.path.join(tmp_path, chunk) for chunk in sorted(os.listdir(tmp_path))
+        ]
+
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(_file_stats, chunks, repeat(options)))
+        else:
+            parts = list(map(_file_stats, chunks, repeat(options)))
+
+    stats = CaptureStats(**options)
+    for part in parts:
+        stats.merge(part)
+    # Offsets of the chunks do not point into the original capture, the
+    # counted packets end after as many records of it
+    stats.offset = packets_end(path, stats.num_packets)
+    return stats
+
+
+def _file_stats(path: str, options: dict) -> CaptureStats:
+    return CaptureStats.from_packets(read_packets(path), **options)
@@ -0,0 +1,168 @@
+import json
+import os
+import sqlite3
+
+SYSTEM_CONTEXT = "You are a network analyst and you have to help answering questions about a network trace."
+
+
+def build_prompt(context: str, table: str, question: str) -> str:
+    return f"{context}\n{table}\nQ: {question}"
+
+
+def capture_rows(file_cap: str, table: str, contexts: list, answers: dict):
+    """Dataset rows of the questions of a capture, `answers` maps question to answer"""
+    for i, (question, answer) in enumerate(answers.items()):
+        yield {
+            "id": f"{file_cap}#{i}",
+            "question": i,
+            "context": SYSTEM_CONTEXT,
+            "prompt": build_prompt(contexts[i], table, question),
+            "answer": answer,
+        }
+
+
+class DatasetStore:
+    """SQLite dataset keeping the table of every capture once.
+
+    The few-shot contexts and the questions are shared by all the captures
+    and stored in the meta table, the answers reference the capture they
+    belong to. Prompts are only built when the rows are read, and give the
+    same rows as the JSONL datasets.
+    """
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No dataset in {path}")
+        self.__connection = sqlite3.connect(path)
+        self.__meta = {
+            key: json.loads(value)
+            for key, value in self.__connection.execute("SELECT key, value FROM meta")
+        }
+
+    @classmethod
+    def create(cls, path: str, contexts: list, questions: list) -> "DatasetStore":
+        """Empty dataset at path, replacing the one there"""
+        if os.path.exists(path):
+            os.remove(path)
+
+        connection = sqlite3.connect(path)
+        connection.executescript(
+            "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "CREATE TABLE captures ("
+            "id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, capture_table TEXT NOT NULL);"
+            "CREATE TABLE answers ("
+            "capture_id INTEGER NOT NULL REFERENCES captures (id), "
+            "question INTEGER NOT NULL, answer TEXT NOT NULL, "
+            "PRIMARY KEY (capture_id, question));"
+        )
+        connection.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("context", json.dumps(SYSTEM_CONTEXT)),
+                ("contexts", json.dumps(list(contexts))),
+                ("questions", json.dumps(list(questions))),
+            ],
+        )
+        connection.commit()
+        connection.close()
+        return cls(path)
+
+    def add(self, file_cap: str, table: str, answers: dict) -> None:
+        """Store a capture table and the answers of its questions, in question order"""
+        questions = self.__meta["questions"]
+        if list(answers) != questions[: len(answers)]:
+            raise ValueError(f"The questions of {file_cap} are not the dataset ones")
+
+        with self.__connection:
+            capture_id = self.__connection.execute(
+                "INSERT INTO captures (name, capture_table) VALUES (?, ?)",
+                (file_cap, table),
+            ).lastrowid
+            self.__connection.executemany(
+                "INSERT INTO answers VALUES (?, ?, ?)",
+                [(capture_id, i, answer) for i, answer in enumerate(answers.values())],
+            )
+
+    def rows(self, prompts: bool = True, parts: bool = False):
+        """Yield the dataset rows in order, without prompt if `prompts` is False.
+
+        With `parts` the rows also have the "parts" their prompt is built
+        from: the few-shot example, the capture table and the question.
+        Capture tables are read one at a time, as the rows of a capture are
+        reached, so memory does not grow with the dataset.
+        """
+        contexts = self.__meta["contexts"]
+        questions = self.__meta["questions"]
+        table_of = self.__connection.cursor()
+        current_id, table = None, None
+
+        for capture_id, name, question, answer in self.__connection.execute(
+            "SELECT captures.id, captures.name, answers.question, answers.answer "
+            "FROM answers JOIN captures ON captures.id = answers.capture_id "
+            "ORDER BY captures.id, answers.question"
+        ):
+            row = {
+                "id": f"{name}#{question}",
+                "question": question,
+                "context": self.__meta["context"],
+            }
+            if (prompts or parts) and capture_id != current_id:
+                current_id = capture_id
+                (table,) = table_of.execute(
+                    "SELECT capture_table FROM captures WHERE id = ?",
+                    (capture_id,),
+                ).fetchone()
+            if prompts:
+                row["prompt"] = build_prompt(
+                    contexts[question], table, questions[question]
+                )
+            if parts:
+                row["parts"] = {
+                    "example": contexts[question],
+                    "table": table,
+                    "question": questions[question],
+                }
+            row["answer"] = answer
+            yield row
+
+    def __len__(self) -> int:
+        return self.__connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def export_jsonl(self, output_path: str) -> int:
+        """Write the dataset as JSONL, one line per question, returns the rows"""
+        count = 0
+        with open(output_path, "w") as f:
+            for row in self.rows():
+                f.write(json.dumps(row) + "\n")
+                count += 1
+        return count
+
+    def close(self) -> None:
+        self.__connection.close()
+
+
+def iter_dataset(path: str, prompts: bool = True, parts: bool = False):
+    """Rows of a .sqlite or JSONL dataset, one at a time.
+
+    Only the rows of the SQLite datasets have `parts`, JSONL rows are read as
+    they were written.
+    """
+    if path.endswith(".sqlite"):
+        store = DatasetStore(path)
+        try:
+            yield from store.rows(prompts, parts)
+        finally:
+            store.close()
+        return
+
+    with open(path, "r") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def dataset_file(name: str) -> str:
+    """Path of the dataset of a prompting technique, the SQLite one if it exists"""
+    path = os.path.join("data", name, "dataset.sqlite")
+    if os.path.exists(path):
+        return path
+    return os.path.join("data", name, "dataset.jsonl")
@@ -0,0 +1,87 @@
+import re
+import subprocess
+import tempfile
+
+from dataset.cache import tshark_version
+
+# Column fields of the No.|Time|Source|Destination|Protocol|Length|Info table.
+# Wireshark 4.2 renamed them after the column format instead of its title,
+# e.g. _ws.col.packet_length for the COL_PACKET_LENGTH format of Length.
+COLUMN_FIELDS = [
+    "_ws.col.No.",
+    "_ws.col.Time",
+    "_ws.col.Source",
+    "_ws.col.Destination",
+    "_ws.col.Protocol",
+    "_ws.col.Length",
+    "_ws.col.Info",
+]
+COLUMN_FIELDS_4_2 = [
+    "_ws.col.number",
+    "_ws.col.cls_time",
+    "_ws.col.def_src",
+    "_ws.col.def_dst",
+    "_ws.col.protocol",
+    "_ws.col.packet_length",
+    "_ws.col.info",
+]
+
+# tshark escapes the tabs inside a value, only the others separate fields
+_SEPARATOR = re.compile(r"(?<!\\)\t")
+
+
+def column_fields(version: str = None) -> list:
+    """Field names of the table columns for a `tshark --version` line"""
+    match = re.search(r"(\d+)\.(\d+)", version or tshark_version())
+    if match and (int(match.group(1)), int(match.group(2))) >= (4, 2):
+        return COLUMN_FIELDS_4_2
+    return COLUMN_FIELDS
+
+
+def read_rows(capture: str = "-", stdin=None):
+    """Yield the table row of every packet as tshark prints it.
+
+    tshark only extracts the table columns and its output is read from the
+    pipe a line at a time, so memory does not grow with the capture. With
+    the default "-" the capture is read from `stdin`, a pipe or file object.
+    """
+    command = ["tshark", "-r", capture, "-T", "fields", "-E", "separator=/t"]
+    for field in column_fields():
+        command += ["-e", field]
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            command,
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            encoding="utf-8",
+            errors="replace",
+        )
+        try:
+            for line in process.stdout:
+                yield clean_row(line)
+        except BaseException:
+            # The consumer stopped early or the line could not be parsed
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            process.wait()
+
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(
+                process.returncode, command, stderr=stderr.read().decode("utf-8")
+            )
+
+
+def clean_row(line: str) -> list:
+    """Columns of a tshark output line, with ASCII arrows and single quotes"""
+    columns = _SEPARATOR.split(line.strip())
+
+    if "→" in columns:
+        # `-T tabs` prints the arrow between source and destination as a column
+        columns.remove("→")
+
+    return [column.strip().replace("→", "->").replace('"', "'") for column in columns]
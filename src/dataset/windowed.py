@@ -0,0 +1,229 @@
+import json
+from functools import partial
+
+from dataset.encoding import CaptureEncoding
+from dataset.stats import CaptureStats
+from lib.concurrency import ordered_map
+from lib.pcap import UnsupportedCapture, count_packets
+from llm_eval.ollama import OLLAMA_URL, OllamaClient
+
+SYSTEM_PROMPT = "You are a network analyst and you have to help answering questions about a network trace."
+
+# Protocols the questions ask about, shown per window
+SUMMARY_PROTOCOLS = ["tcp", "udp", "icmp", "icmpv6"]
+
+
+class CaptureWindows:
+    """Map-reduce over the windows of captures too large for a single prompt.
+
+    A capture with more than `max_packets` packets is streamed in windows of
+    `size` packets, or of `duration` seconds. The stats of every window are
+    exact and merged into the stats of the whole capture, and the capture is
+    rendered as a table of at most `rows` rows, consecutive windows being
+    merged when there are more. With a `model` every window is also
+    summarized by the LLM, `concurrency` windows at a time, and the summaries
+    are reduced into a single one.
+    """
+
+    def __init__(
+        self,
+        size: int = 1000,
+        duration: float = None,
+        max_packets: int = 125,
+        rows: int = 32,
+        model: str = None,
+        ollama_url: str = OLLAMA_URL,
+        concurrency: int = 1,
+    ):
+        if size < 1 or rows < 2:
+            raise ValueError("Windows need at least one packet and two rows")
+        if duration is not None and duration <= 0:
+            raise ValueError("The window duration must be positive")
+
+        self.size = size
+        self.duration = duration
+        self.max_packets = max_packets
+        self.rows = rows
+        self.model = model
+        self.ollama_url = ollama_url
+        self.concurrency = concurrency
+        self.__client = None
+
+    def key(self) -> str:
+        """Identifies the windowing, part of the capture cache key"""
+        return json.dumps(
+            [self.size, self.duration, self.max_packets, self.rows, self.model]
+        )
+
+    def applies(self, path: str) -> bool:
+        """Whether the capture is too large to be rendered packet by packet"""
+        try:
+            return count_packets(path, self.max_packets) > self.max_packets
+        except UnsupportedCapture:
+            # Only the native reader can stream large captures
+            return False
+
+    def iter_windows(self, packets):
+        """Yield (number of the first packet, packets) for every window"""
+        window = []
+        first = 1
+        start = None
+
+        for number, packet in enumerate(packets, start=1):
+            if window and (
+                len(window) >= self.size
+                if self.duration is None
+                else packet.timestamp - start >= self.duration
+            ):
+                yield first, window
+                window = []
+            if not window:
+                first = number
+                start = packet.timestamp
+            window.append(packet)
+
+        if window:
+            yield first, window
+
+    def summarize(self, packets, **options) -> tuple:
+        """Stats of the whole capture and the summary that replaces its table.
+
+        `options` are the CaptureStats options of every window.
+        """
+        total = CaptureStats(**options)
+        rows = []
+        windows = 0
+        # Windows per row, doubled every time the rows are merged pairwise
+        span = 1
+
+        for (first, stats), summary in ordered_map(
+            partial(self.__map_window, options=options),
+            self.iter_windows(packets),
+            self.concurrency,
+        ):
+            windows += 1
+            total.merge(stats)
+            row = {
+                "first": first,
+                "windows": 1,
+                "stats": stats,
+                "summaries": [summary] if summary else [],
+            }
+            if rows and rows[-1]["windows"] < span:
+                rows[-1] = _merge_rows(rows[-1], row)
+            else:
+                rows.append(row)
+            if len(rows) > self.rows:
+                rows = [_merge_rows(*rows[i : i + 2]) for i in range(0, len(rows), 2)]
+                span *= 2
+
+        unit = (
+            f"{self.duration} seconds"
+            if self.duration is not None
+            else f"{self.size} packets"
+        )
+        lines = [
+            f"Capture of {total.num_packets} packets summarized in {windows} windows of {unit}",
+            "Window|Packets|Start|End|Bytes|Hosts|Top talker|Protocols",
+        ]
+        for i, row in enumerate(rows, start=1):
+            lines.append(f"{i}|{_row_line(row, total.start_timestamp)}")
+
+        if self.model:
+            summaries = self.__reduce(
+                [summary for row in rows for summary in row["summaries"]]
+            )
+            if summaries:
+                lines.append(f"Summary: {summaries}")
+
+        return total, "\n".join(lines) + "\n"
+
+    def __map_window(self, window: tuple, options: dict) -> tuple:
+        first, packets = window
+        stats = CaptureStats.from_packets(packets, **options)
+
+        summary = None
+        if self.model:
+            table = CaptureEncoding(compact=True).render(
+                [
+                    [
+                        str(number),
+                        f"{packet.timestamp:.6f}",
+                        packet.src or "",
+                        packet.dst or "",
+                        packet.layers[-1].upper() if packet.layers else "",
+                        str(packet.length),
+                        "",
+                    ]
+                    for number, packet in enumerate(packets, start=first)
+                ]
+            )
+            summary = self.__generate(
+                f"{table}\nSummarize this part of a network trace in at most three sentences: hosts, protocols and anything unusual."
+            )
+        return (first, stats), summary
+
+    def __reduce(self, summaries: list) -> str:
+        """Combine the window summaries level by level, `rows` at a time"""
+        while len(summaries) > 1:
+            groups = [
+                summaries[i : i + self.rows]
+                for i in range(0, len(summaries), self.rows)
+            ]
+            summaries = list(
+                ordered_map(
+                    lambda group: self.__generate(
+                        "Summaries of consecutive parts of a network trace:\n"
+                        + "\n".join(f"- {summary}" for summary in group)
+                        + "\nCombine them into a single summary of at most three sentences."
+                    ),
+                    groups,
+                    self.concurrency,
+                )
+            )
+        return summaries[0] if summaries else ""
+
+    def __generate(self, prompt: str) -> str:
+        if self.__client is None:
+            self.__client = OllamaClient(self.ollama_url, self.concurrency)
+        response, _ = self.__client.generate(self.model, SYSTEM_PROMPT, prompt)
+        return response.strip()
+
+    def __getstate__(self):
+        # Sent to the dataset worker processes, each one opens its own session
+        state = self.__dict__.copy()
+        state["_CaptureWindows__client"] = None
+        return state
+
+
+def _merge_rows(first: dict, second: dict = None) -> dict:
+    if second is None:
+        return first
+    return {
+        "first": first["first"],
+        "windows": first["windows"] + second["windows"],
+        "stats": first["stats"].merge(second["stats"]),
+        "summaries": first["summaries"] + second["summaries"],
+    }
+
+
+def _row_line(row: dict, capture_start: float) -> str:
+    stats = row["stats"]
+    top_talker = stats.top_talker()
+    protocols = ", ".join(
+        f"{protocol} {stats.protocols_count[protocol]}"
+        for protocol in SUMMARY_PROTOCOLS
+        if stats.protocols_count.get(protocol)
+    )
+    last = row["first"] + stats.num_packets - 1
+    return "|".join(
+        [
+            f"{row['first']}-{last}",
+            f"{stats.start_timestamp - capture_start:.6f}",
+            f"{stats.end_timestamp - capture_start:.6f}",
+            str(stats.num_bytes),
+            str(stats.distinct_ips()),
+            f"{top_talker[0]} ({top_talker[1]})" if top_talker else "-",
+            protocols or "-",
+        ]
+    )
@@ -1,41 +1,137 @@
+import errno
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 import pyshark
 
+from lib import profiling
+from lib.pcap import UnsupportedCapture, count_packets
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, the captures are hardlinked or copied
+    fcntl = None
+
 DATASET_PATH = os.path.join(os.getcwd(), "data/raw")
 
+# ioctl request to clone the extents of a file (reflink) on btrfs/xfs
+FICLONE = 0x40049409
+
 
-def clean_raw_data(data_path: str = DATASET_PATH) -> None:
+def clean_raw_data(
+    data_path: str = DATASET_PATH,
+    min_packets: int = 1,
+    max_packets: int = 125,
+    workers: int = os.cpu_count() or 1,
+) -> list:
+    """Link the captures with `min_packets` to `max_packets` packets to data/cleaned.
+
+    Returns the (file, error) of the captures that could not be read or linked.
+    """
     # Create new folder for cleaned data
     try:
         os.mkdir(os.path.join(os.getcwd(), "data/cleaned"))
     except Exception as e:
         print(f"Error creating folder: {e}")
 
-    for file in os.listdir(data_path):
+    captures = []
+    for file in sorted(os.listdir(data_path)):
+        if file.startswith("."):
+            # Scraper manifest and partial downloads
+            continue
         if file.endswith(".cap") or file.endswith(".pcap") or file.endswith(".pcapng"):
+            captures.append(file)
+        else:
+            print(f"File {file} is not a pcap file")
+
+    count = partial(_count_capture, data_path=data_path, limit=max_packets)
+    profiling.count("files", len(captures))
+    with profiling.span("count_packets", files=len(captures)):
+        if workers > 1 and len(captures) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                counts = list(executor.map(count, captures))
+        else:
+            counts = list(map(count, captures))
+
+    failures = []
+    for file, (cap_len, error) in zip(captures, counts):
+        if error:
+            print(f"Error with file {file}: {error}")
+            failures.append((file, error))
+            continue
+
+        # Check the number of packets and if is a network capture
+        if cap_len < min_packets:
+            print(f"File {file} has less than {min_packets} packets. Skipping...")
+            continue
+        if cap_len > max_packets:
+            print(f"File {file} has more than {max_packets} packets. Skipping...")
+            continue
+
+        try:
+            # Link file to new folder, the raw capture is never modified in place
+            _link_or_copy(
+                os.path.join(data_path, file),
+                os.path.join(os.getcwd(), "data/cleaned", file),
+            )
+        except Exception as e:
+            print(f"Error with file {file}: {e}")
+            failures.append((file, str(e)))
+
+    if failures:
+        print(f"{len(failures)} captures failed and were not cleaned:")
+        for file, error in failures:
+            print(f"  {file}: {error}")
+    return failures
+
+
+def _count_capture(file: str, data_path: str, limit: int) -> tuple:
+    """Number of packets of a capture, counting stops after `limit` packets"""
+    path = os.path.join(data_path, file)
+    try:
+        try:
+            return count_packets(path, limit), None
+        except UnsupportedCapture:
+            # Formats the block header reader does not know, let tshark read them
+            cap = pyshark.FileCapture(path, keep_packets=False)
             try:
-                cap = pyshark.FileCapture(os.path.join(data_path, file))
-                cap.load_packets()
-                cap_len = len(cap)
+                cap_len = 0
+                for _ in cap:
+                    cap_len += 1
+                    if cap_len > limit:
+                        break
+            finally:
                 cap.close()
+            return cap_len, None
+    except Exception as e:
+        return 0, str(e)
 
-                # Check the number of packets and if is a network capture
-                if cap_len < 1:
-                    print(f"File {file} has less than 1 packets. Skipping...")
-                    continue
-                if cap_len > 125:
-                    print(f"File {file} has more than 125 packets. Skipping...")
-                    continue
-
-                # Copy file to new folder
-                shutil.copyfile(
-                    os.path.join(data_path, file),
-                    os.path.join(os.getcwd(), "data/cleaned", file),
-                )
-
-            except Exception as e:
-                print(f"Error with file {file}: {e}")
-        else:
-            print(f"File {file} is not a pcap file")
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hardlink src to dst, or reflink it where hardlinks fail, copying as last resort.
+
+    A reflink can not cross devices either, across them the file is copied.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    try:
+        os.link(src, dst)
+        return
+    except OSError as e:
+        cross_device = e.errno == errno.EXDEV
+
+    if fcntl is not None and not cross_device:
+        try:
+            with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+                fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+            return
+        except OSError:
+            # Not supported or failed, the empty dst is replaced by a copy
+            if os.path.lexists(dst):
+                os.remove(dst)
+
+    shutil.copyfile(src, dst)
@@ -0,0 +1,29 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def ordered_map(function, iterable, workers: int = 1, window: int = None):
+    """Like map() but running up to `workers` calls at the same time in threads.
+
+    Results are yielded in input order, and at most `window` items (twice the
+    number of workers by default) are in flight, so the input can be an
+    arbitrarily long generator.
+    """
+    if workers <= 1:
+        yield from map(function, iterable)
+        return
+
+    window = window or 2 * workers
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in iterable:
+                pending.append(executor.submit(function, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
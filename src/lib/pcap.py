@@ -0,0 +1,507 @@
+import mmap
+import os
+import socket
+import struct
+import time
+from collections import namedtuple
+
+# Minimal per-packet summary, the only fields the dataset statistics need
+Packet = namedtuple("Packet", ["timestamp", "length", "src", "dst", "layers"])
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+PCAP_MAGIC_MICRO = 0xA1B2C3D4
+PCAP_MAGIC_NANO = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+IP_PROTOCOLS = {
+    1: "icmp",
+    2: "igmp",
+    6: "tcp",
+    17: "udp",
+    47: "gre",
+    50: "esp",
+    58: "icmpv6",
+    132: "sctp",
+}
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+IPV6_FRAGMENT_HEADER = 44
+IPV6_AUTH_HEADER = 51
+
+SUPPORTED_LINKTYPES = (
+    LINKTYPE_NULL,
+    LINKTYPE_ETHERNET,
+    LINKTYPE_RAW,
+    LINKTYPE_LOOP,
+    LINKTYPE_LINUX_SLL,
+    LINKTYPE_IPV4,
+    LINKTYPE_IPV6,
+    LINKTYPE_LINUX_SLL2,
+)
+
+_U16 = struct.Struct("!H")
+
+
+class UnsupportedCapture(Exception):
+    """The file format or link type can not be decoded by the native reader"""
+
+
+def read_packets(path: str, start: int = 0):
+    """Stream a pcap/pcapng file as Packet summaries in a single pass.
+
+    The file is memory-mapped and only the link, network and transport headers
+    are decoded, so memory use does not grow with the number of packets.
+    Raises UnsupportedCapture for formats or link types this reader can not
+    handle, callers are expected to fall back to pyshark in that case.
+    """
+    for _, packet in read_packets_at(path, start):
+        yield packet
+
+
+def read_packets_at(path: str, start: int = 0, section: dict = None):
+    """As read_packets, yielding (offset, packet) pairs.
+
+    The offset is where the record of the packet ends, reading again from it
+    with `start` continues with the packets appended to the file since. A
+    truncated last record, still being written, is left for that next read.
+    A pcapng is walked from its first block to find its section and
+    interfaces, unless `section` is given: the read fills it with where it
+    stopped and the section it was in, and the next read with the same dict
+    resumes there.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            decoder = _Decoder()
+            for linktype, timestamp, length, offset, caplen, end in _iter_records(
+                buf, start, section
+            ):
+                src, dst, layers = decoder.decode(linktype, buf, offset, caplen)
+                yield end, Packet(timestamp, length, src, dst, layers)
+
+
+def count_packets(path: str, limit: int = None) -> int:
+    """Count the packet records of a pcap/pcapng file from the block headers.
+
+    Nothing is decoded, and counting stops once `limit` is exceeded, so the
+    result is at most limit + 1. Raises UnsupportedCapture for unknown formats.
+    """
+    count = 0
+    for _ in _record_ends(path):
+        count += 1
+        if limit is not None and count > limit:
+            break
+    return count
+
+
+def packets_end(path: str, count: int) -> int:
+    """Offset where the first `count` packet records of a pcap/pcapng file end.
+
+    Found from the block headers as count_packets, reading again from it with
+    read_packets_at continues with the packets after those.
+    """
+    end = 0
+    if count <= 0:
+        return end
+    for number, end in enumerate(_record_ends(path), start=1):
+        if number >= count:
+            break
+    return end
+
+
+def read_stream(stream):
+    """Stream the packets of a pcap written to a pipe, e.g. by tcpdump -w -.
+
+    Records are read one at a time from the binary file object as they
+    arrive, so this works on stdin. Only the pcap format can be streamed,
+    pcapng is rejected with UnsupportedCapture.
+    """
+    header = _read_exactly(stream, 24)
+    if header is None:
+        return
+
+    if struct.unpack_from("<I", header, 0)[0] == PCAPNG_SHB:
+        raise UnsupportedCapture(
+            "pcapng streams are not supported, write the stream as pcap (dumpcap -P)"
+        )
+    for endian in ("<", ">"):
+        magic = struct.unpack_from(endian + "I", header, 0)[0]
+        if magic in (PCAP_MAGIC_MICRO, PCAP_MAGIC_NANO):
+            break
+    else:
+        raise UnsupportedCapture("Unknown capture file format")
+
+    linktype = struct.unpack_from(endian + "I", header, 20)[0] & 0x0FFFFFFF
+    if linktype not in SUPPORTED_LINKTYPES:
+        raise UnsupportedCapture(f"Unsupported link type {linktype}")
+
+    record_header = struct.Struct(endian + "IIII")
+    divisor = 1_000_000_000 if magic == PCAP_MAGIC_NANO else 1_000_000
+    decoder = _Decoder()
+    while True:
+        record = _read_exactly(stream, 16)
+        if record is None:
+            return
+        ts_sec, ts_frac, caplen, length = record_header.unpack(record)
+        frame = _read_exactly(stream, caplen)
+        if frame is None:
+            # The writer stopped in the middle of a record
+            return
+        src, dst, layers = decoder.decode(linktype, frame, 0, caplen)
+        yield Packet(ts_sec + ts_frac / divisor, length, src, dst, layers)
+
+
+def follow_packets(
+    path: str, poll: float = 1.0, idle_timeout: float = None, ticks: bool = False
+):
+    """As read_packets, then keep yielding the packets appended to the file.
+
+    Like tail -f, the file is read again from the last complete record every
+    `poll` seconds, until `idle_timeout` seconds pass without new packets,
+    never by default. A file that shrank was rotated and is read from the
+    start. With `ticks`, None is yielded after every poll without new
+    packets, so the reader can act while the capture is idle.
+    """
+    offset = 0
+    section = {}
+    idle = 0.0
+    while True:
+        read = False
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < offset:
+            offset = 0
+            section = {}
+        # Wait for the global header, or the first blocks of a pcapng
+        if size >= 24 or offset:
+            for offset, packet in read_packets_at(path, offset, section):
+                read = True
+                yield packet
+
+        idle = 0.0 if read else idle + poll
+        if idle_timeout is not None and idle >= idle_timeout:
+            return
+        if ticks and not read:
+            yield None
+        time.sleep(poll)
+
+
+def _read_exactly(stream, size: int) -> bytes:
+    """`size` bytes of the stream, None when it ends before"""
+    data = stream.read(size)
+    while data is not None and 0 < len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            return None
+        data += more
+    if size and not data:
+        return None
+    return data
+
+
+def _record_ends(path: str):
+    """Yield the offset where every packet record ends, from the block headers"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if len(buf) < 4:
+                raise UnsupportedCapture("File too short to be a capture")
+
+            if struct.unpack_from("<I", buf, 0)[0] == PCAPNG_SHB:
+                yield from _iter_pcapng_offsets(buf)
+                return
+            for endian in ("<", ">"):
+                magic = struct.unpack_from(endian + "I", buf, 0)[0]
+                if magic in (PCAP_MAGIC_MICRO, PCAP_MAGIC_NANO):
+                    yield from _iter_pcap_offsets(buf, endian)
+                    return
+            raise UnsupportedCapture("Unknown capture file format")
+
+
+def _iter_pcap_offsets(buf, endian: str):
+    record_header = struct.Struct(endian + "8xI4x")
+    size = len(buf)
+    offset = 24
+
+    while offset + 16 <= size:
+        caplen = record_header.unpack_from(buf, offset)[0]
+        offset += 16 + caplen
+        if offset > size:
+            break
+        yield offset
+
+
+def _iter_pcapng_offsets(buf):
+    size = len(buf)
+    offset = 0
+    endian = "<"
+
+    while offset + 12 <= size:
+        block_type = struct.unpack_from(endian + "I", buf, offset)[0]
+        if block_type == PCAPNG_SHB:
+            if struct.unpack_from(">I", buf, offset + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+                endian = ">"
+            else:
+                endian = "<"
+
+        block_length = struct.unpack_from(endian + "I", buf, offset + 4)[0]
+        if block_length < 12 or offset + block_length > size:
+            break
+        offset += block_length
+        if block_type in (PCAPNG_EPB, PCAPNG_PB, PCAPNG_SPB):
+            yield offset
+
+
+def _iter_records(buf, start: int = 0, section: dict = None):
+    if len(buf) < 4:
+        raise UnsupportedCapture("File too short to be a capture")
+
+    magic = struct.unpack_from("<I", buf, 0)[0]
+    if magic == PCAPNG_SHB:
+        return _iter_pcapng(buf, start, section)
+    for endian in ("<", ">"):
+        magic = struct.unpack_from(endian + "I", buf, 0)[0]
+        if magic in (PCAP_MAGIC_MICRO, PCAP_MAGIC_NANO):
+            return _iter_pcap(buf, endian, magic == PCAP_MAGIC_NANO, start)
+    raise UnsupportedCapture("Unknown capture file format")
+
+
+def _iter_pcap(buf, endian: str, nano: bool, start: int = 0):
+    if len(buf) < 24:
+        raise UnsupportedCapture("Truncated pcap global header")
+
+    linktype = struct.unpack_from(endian + "I", buf, 20)[0] & 0x0FFFFFFF
+    if linktype not in SUPPORTED_LINKTYPES:
+        raise UnsupportedCapture(f"Unsupported link type {linktype}")
+
+    record_header = struct.Struct(endian + "IIII")
+    divisor = 1_000_000_000 if nano else 1_000_000
+    size = len(buf)
+    offset = max(start, 24)
+
+    while offset + 16 <= size:
+        ts_sec, ts_frac, caplen, length = record_header.unpack_from(buf, offset)
+        offset += 16
+        if offset + caplen > size:
+            # Truncated last record, as tshark we stop reading here
+            break
+        yield linktype, ts_sec + ts_frac / divisor, length, offset, caplen, (
+            offset + caplen
+        )
+        offset += caplen
+
+
+def _iter_pcapng(buf, start: int = 0, section: dict = None):
+    size = len(buf)
+    offset = 0
+    endian = "<"
+    interfaces = []
+    if section:
+        # Resume where the last read stopped, in the same section
+        offset = section["offset"]
+        endian = section["endian"]
+        interfaces = section["interfaces"]
+
+    while offset + 12 <= size:
+        block_type = struct.unpack_from(endian + "I", buf, offset)[0]
+
+        if block_type == PCAPNG_SHB:
+            # A new section may change the byte order and resets the interfaces
+            if struct.unpack_from("<I", buf, offset + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+                endian = "<"
+            elif (
+                struct.unpack_from(">I", buf, offset + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC
+            ):
+                endian = ">"
+            else:
+                raise UnsupportedCapture("Invalid pcapng byte order magic")
+            interfaces = []
+
+        block_length = struct.unpack_from(endian + "I", buf, offset + 4)[0]
+        if block_length < 12 or offset + block_length > size:
+            break
+        body = offset + 8
+
+        if block_type == PCAPNG_IDB:
+            interfaces.append(_parse_idb(buf, endian, body, offset + block_length - 4))
+        elif offset < start:
+            # Already read, only the section and interface blocks matter
+            pass
+        elif block_type == PCAPNG_EPB or block_type == PCAPNG_PB:
+            if block_type == PCAPNG_EPB:
+                iface, ts_high, ts_low, caplen, length = struct.unpack_from(
+                    endian + "IIIII", buf, body
+                )
+            else:
+                iface, _, ts_high, ts_low, caplen, length = struct.unpack_from(
+                    endian + "HHIIII", buf, body
+                )
+            try:
+                linktype, divisor, ts_offset = interfaces[iface]
+            except IndexError:
+                raise UnsupportedCapture(f"Packet for unknown interface {iface}")
+            ticks = (ts_high << 32) | ts_low
+            timestamp = ts_offset + ticks // divisor + (ticks % divisor) / divisor
+            yield linktype, timestamp, length, body + 20, caplen, (
+                offset + block_length
+            )
+        elif block_type == PCAPNG_SPB:
+            # Simple packet blocks carry no timestamp, let pyshark deal with them
+            raise UnsupportedCapture("Simple packet blocks are not supported")
+
+        offset += block_length
+
+    if section is not None:
+        # The blocks before the offset are walked, the next read starts there
+        section.update(offset=offset, endian=endian, interfaces=interfaces)
+
+
+def _parse_idb(buf, endian: str, start: int, end: int) -> tuple:
+    linktype = struct.unpack_from(endian + "H", buf, start)[0]
+    if linktype not in SUPPORTED_LINKTYPES:
+        raise UnsupportedCapture(f"Unsupported link type {linktype}")
+
+    divisor = 1_000_000
+    ts_offset = 0
+    offset = start + 8
+
+    # Walk the options looking for if_tsresol (9) and if_tsoffset (14)
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", buf, offset)
+        if code == 0:
+            break
+        value = offset + 4
+        if code == 9 and length >= 1:
+            resolution = buf[value]
+            if resolution & 0x80:
+                divisor = 2 ** (resolution & 0x7F)
+            else:
+                divisor = 10**resolution
+        elif code == 14 and length >= 8:
+            ts_offset = struct.unpack_from(endian + "q", buf, value)[0]
+        offset = value + ((length + 3) & ~3)
+
+    return linktype, divisor, ts_offset
+
+
+class _Decoder:
+    """Header-only decoder, caches address strings because hosts repeat a lot"""
+
+    def __init__(self):
+        self.__addresses = {}
+
+    def decode(self, linktype: int, buf, offset: int, caplen: int) -> tuple:
+        end = offset + caplen
+
+        if linktype == LINKTYPE_ETHERNET:
+            return self.__ethernet(buf, offset, end)
+        if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            return self.__ip(buf, offset, end, ("raw",))
+        if linktype == LINKTYPE_NULL or linktype == LINKTYPE_LOOP:
+            return self.__ip(buf, offset + 4, end, ("null",))
+        if linktype == LINKTYPE_LINUX_SLL:
+            if offset + 16 > end:
+                return None, None, ("sll",)
+            ethertype = _U16.unpack_from(buf, offset + 14)[0]
+            return self.__ethertype(buf, ethertype, offset + 16, end, ("sll",))
+        if linktype == LINKTYPE_LINUX_SLL2:
+            if offset + 20 > end:
+                return None, None, ("sll",)
+            ethertype = _U16.unpack_from(buf, offset)[0]
+            return self.__ethertype(buf, ethertype, offset + 20, end, ("sll",))
+        raise UnsupportedCapture(f"Unsupported link type {linktype}")
+
+    def __ethernet(self, buf, offset: int, end: int) -> tuple:
+        if offset + 14 > end:
+            return None, None, ("eth",)
+        ethertype = _U16.unpack_from(buf, offset + 12)[0]
+        offset += 14
+        layers = ("eth",)
+        while ethertype in ETHERTYPE_VLAN and offset + 4 <= end:
+            ethertype = _U16.unpack_from(buf, offset + 2)[0]
+            offset += 4
+            layers += ("vlan",)
+        if ethertype < 0x0600:
+            # 802.3 frame, the field is a length and an LLC header follows
+            return None, None, layers + ("llc",)
+        return self.__ethertype(buf, ethertype, offset, end, layers)
+
+    def __ethertype(self, buf, ethertype: int, offset: int, end: int, layers):
+        if ethertype == ETHERTYPE_IPV4 or ethertype == ETHERTYPE_IPV6:
+            return self.__ip(buf, offset, end, layers)
+        if ethertype == ETHERTYPE_ARP:
+            return None, None, layers + ("arp",)
+        return None, None, layers
+
+    def __ip(self, buf, offset: int, end: int, layers) -> tuple:
+        if offset >= end:
+            return None, None, layers
+        version = buf[offset] >> 4
+
+        if version == 4:
+            if offset + 20 > end:
+                return None, None, layers
+            header_length = (buf[offset] & 0x0F) * 4
+            fragment_offset = _U16.unpack_from(buf, offset + 6)[0] & 0x1FFF
+            protocol = buf[offset + 9]
+            src = self.__address(buf[offset + 12 : offset + 16], socket.AF_INET)
+            dst = self.__address(buf[offset + 16 : offset + 20], socket.AF_INET)
+            layers += ("ip",)
+            # Only the first fragment carries the transport header
+            if fragment_offset == 0 and offset + header_length <= end:
+                layers += self.__transport(protocol)
+            return src, dst, layers
+
+        if version == 6:
+            if offset + 40 > end:
+                return None, None, layers
+            next_header = buf[offset + 6]
+            src = self.__address(buf[offset + 8 : offset + 24], socket.AF_INET6)
+            dst = self.__address(buf[offset + 24 : offset + 40], socket.AF_INET6)
+            layers += ("ipv6",)
+            offset += 40
+            while offset + 8 <= end:
+                if next_header in IPV6_EXTENSION_HEADERS:
+                    header_length = (buf[offset + 1] + 1) * 8
+                elif next_header == IPV6_AUTH_HEADER:
+                    header_length = (buf[offset + 1] + 2) * 4
+                elif next_header == IPV6_FRAGMENT_HEADER:
+                    if _U16.unpack_from(buf, offset + 2)[0] >> 3:
+                        return src, dst, layers
+                    header_length = 8
+                else:
+                    break
+                next_header = buf[offset]
+                offset += header_length
+            return src, dst, layers + self.__transport(next_header)
+
+        return None, None, layers
+
+    def __transport(self, protocol: int) -> tuple:
+        name = IP_PROTOCOLS.get(protocol)
+        return (name,) if name else ()
+
+    def __address(self, raw: bytes, family: int) -> str:
+        address = self.__addresses.get(raw)
+        if address is None:
+            address = socket.inet_ntop(family, raw)
+            self.__addresses[raw] = address
+        return address
@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# The active profiler, None unless the CLI runs with --profile
+_profiler = None
+
+_NO_SPAN = nullcontext()
+
+
+class Profiler:
+    """Nested span timings and counters of a run.
+
+    Spans are recorded per thread with their nesting depth, timestamps come
+    from the monotonic clock, which is shared by the worker processes, so
+    their spans can be merged into the parent's trace.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter_ns()
+        self.events = []
+        self.counters = {}
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def span(self, name: str, **args):
+        return _Span(self, name, args)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, events: list, counters: dict) -> None:
+        """Add the events and counters recorded by another process"""
+        with self.__lock:
+            self.events.extend(events)
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def export(self, path: str) -> None:
+        """Write the spans as JSON lines, or as a Chrome trace for *.json paths"""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        events = sorted(self.events, key=lambda event: event["start"])
+        with open(path, "w") as f:
+            if path.endswith(".json"):
+                trace = [
+                    {
+                        "name": event["name"],
+                        "ph": "X",
+                        "ts": (event["start"] - self.start) / 1000,
+                        "dur": event["duration"] / 1000,
+                        "pid": event["pid"],
+                        "tid": event["tid"],
+                        "args": event["args"],
+                    }
+                    for event in events
+                ]
+                trace.extend(
+                    {
+                        "name": name,
+                        "ph": "C",
+                        "ts": (time.perf_counter_ns() - self.start) / 1000,
+                        "pid": os.getpid(),
+                        "args": {name: value},
+                    }
+                    for name, value in self.counters.items()
+                )
+                json.dump({"traceEvents": trace}, f)
+            else:
+                for event in events:
+                    f.write(
+                        json.dumps(
+                            {
+                                "name": event["name"],
+                                "start": (event["start"] - self.start) / 1e9,
+                                "duration": event["duration"] / 1e9,
+                                "depth": event["depth"],
+                                "pid": event["pid"],
+                                "tid": event["tid"],
+                                "args": event["args"],
+                            }
+                        )
+                        + "\n"
+                    )
+                f.write(json.dumps({"counters": self.counters}) + "\n")
+
+    def summary(self) -> str:
+        """Table of the calls and time of every span name, and the counters"""
+        spans = {}
+        for event in self.events:
+            calls, total, longest = spans.get(event["name"], (0, 0, 0))
+            spans[event["name"]] = (
+                calls + 1,
+                total + event["duration"],
+                max(longest, event["duration"]),
+            )
+
+        lines = [
+            f"{'Span':<32} {'Calls':>8} {'Total (s)':>11} {'Mean (s)':>10} {'Max (s)':>10}"
+        ]
+        for name, (calls, total, longest) in sorted(
+            spans.items(), key=lambda item: item[1][1], reverse=True
+        ):
+            lines.append(
+                f"{name:<32} {calls:>8} {total / 1e9:>11.3f} {total / calls / 1e9:>10.4f} {longest / 1e9:>10.4f}"
+            )
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'Counter':<32} {'Value':>8}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<32} {value:>8}")
+        return "\n".join(lines)
+
+    def _stack(self) -> list:
+        if not hasattr(self.__local, "stack"):
+            self.__local.stack = []
+        return self.__local.stack
+
+    def _record(self, event: dict) -> None:
+        with self.__lock:
+            self.events.append(event)
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler: Profiler, name: str, args: dict):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.profiler._stack().append(self.name)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start
+        stack = self.profiler._stack()
+        stack.pop()
+        self.profiler._record(
+            {
+                "name": self.name,
+                "start": self.start,
+                "duration": duration,
+                "depth": len(stack),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": self.args,
+            }
+        )
+        return False
+
+
+def enable() -> Profiler:
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable() -> None:
+    global _profiler
+    _profiler = None
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def active() -> Profiler:
+    """The active profiler, None when profiling is off"""
+    return _profiler
+
+
+def span(name: str, **args):
+    """Time the block as `name`, a shared no-op context when profiling is off"""
+    if _profiler is None:
+        return _NO_SPAN
+    return _profiler.span(name, **args)
+
+
+def count(name: str, value: int = 1) -> None:
+    if _profiler is not None:
+        _profiler.count(name, value)
+
+
+def run_profiled(function, *args):
+    """Call function in a worker process under a fresh profiler.
+
+    Returns (result, events, counters) for the parent to merge.
+    """
+    profiler = enable()
+    try:
+        return function(*args), profiler.events, profiler.counters
+    finally:
+        disable()
+
+
+def merged(results):
+    """Merge the spans of run_profiled results as they arrive, yielding the results"""
+    for result, events, counters in results:
+        if _profiler is not None:
+            _profiler.merge(events, counters)
+        yield result
@@ -0,0 +1,152 @@
+import base64
+import heapq
+import math
+from hashlib import blake2b
+
+
+class HyperLogLog:
+    """Distinct count estimate using 2**precision one byte registers.
+
+    The precision is chosen for a relative standard `error`, 0.01 needs
+    16 KiB whatever the number of distinct values. Sketches with the same
+    precision merge into the sketch of the union.
+    """
+
+    def __init__(self, error: float = 0.01):
+        if not 0 < error < 1:
+            raise ValueError("The error must be between 0 and 1")
+
+        self.precision = min(max(math.ceil(math.log2((1.04 / error) ** 2)), 4), 18)
+        self.registers = bytearray(1 << self.precision)
+
+    def add(self, value: str) -> None:
+        hashed = int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = (
+            alpha * size * size / sum(2.0**-register for register in self.registers)
+        )
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Only sketches with the same precision can be merged")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(bytes(self.registers)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        sketch = cls.__new__(cls)
+        sketch.precision = data["precision"]
+        sketch.registers = bytearray(base64.b64decode(data["registers"]))
+        return sketch
+
+
+class SpaceSaving:
+    """Heavy hitters keeping at most `capacity` counters.
+
+    A count overestimates the real one by at most its error, which is bounded
+    by total / capacity, so a capacity of 1 / error finds every item above
+    error * total.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        if capacity < 1:
+            raise ValueError("The capacity must be at least 1")
+
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # Min-heap of (count, item), entries are refreshed lazily on eviction
+        self.__heap = []
+
+    def add(self, item: str, count: int = 1, error: int = 0) -> None:
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+            self.errors[item] += error
+            return
+
+        if len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = error
+            heapq.heappush(self.__heap, (count, item))
+            return
+
+        heap = self.__heap
+        while heap[0][0] != counts[heap[0][1]]:
+            heapq.heapreplace(heap, (counts[heap[0][1]], heap[0][1]))
+        minimum, victim = heap[0]
+        del counts[victim]
+        del self.errors[victim]
+
+        counts[item] = minimum + count
+        self.errors[item] = minimum + error
+        heapq.heapreplace(heap, (minimum + count, item))
+
+    def top(self, n: int = 1) -> list:
+        """The n most frequent items as (item, count, error)"""
+        return [
+            (item, count, self.errors[item])
+            for item, count in sorted(
+                self.counts.items(), key=lambda entry: entry[1], reverse=True
+            )[:n]
+        ]
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Merge into the sketch of both streams, keeping the error bound.
+
+        An item missing from a full sketch may have been counted up to its
+        minimum count before eviction, so that minimum is added to its count
+        and error. The `capacity` largest counts are kept, their error stays
+        below the total of both streams / capacity.
+        """
+        mine, theirs = self.__minimum(), other.__minimum()
+        counts = {}
+        errors = {}
+        for item in list(self.counts) + [
+            i for i in other.counts if i not in self.counts
+        ]:
+            counts[item] = self.counts.get(item, mine) + other.counts.get(item, theirs)
+            errors[item] = self.errors.get(item, mine) + other.errors.get(item, theirs)
+
+        kept = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self.counts = {item: counts[item] for item in kept}
+        self.errors = {item: errors[item] for item in kept}
+        self.__heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self.__heap)
+        return self
+
+    def __minimum(self) -> int:
+        # Evicted items were counted at most this many times, none while not full
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "counts": self.counts, "errors": self.errors}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpaceSaving":
+        sketch = cls(data["capacity"])
+        for item, count in data["counts"].items():
+            sketch.add(item, count, data["errors"][item])
+        return sketch
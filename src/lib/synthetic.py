@@ -0,0 +1,114 @@
+import random
+import socket
+import struct
+
+# Default share of packets of every protocol, "arp" packets carry no IP
+PROTOCOL_MIX = {"tcp": 0.6, "udp": 0.3, "icmp": 0.05, "icmpv6": 0.03, "arp": 0.02}
+
+_IP_PROTOCOLS = {"tcp": 6, "udp": 17, "icmp": 1, "icmpv6": 58}
+
+
+def write_synthetic_capture(
+    path: str,
+    packets: int,
+    mix: dict = None,
+    hosts: int = 64,
+    rate: float = 1000.0,
+    seed: int = 0,
+) -> None:
+    """Write a pcap of `packets` Ethernet frames with the given protocol mix.
+
+    Endpoints are drawn from `hosts` IPv4 addresses (IPv6 for icmpv6) and
+    packets are `rate` per second on average, the same seed always gives the
+    same file. Frames are written as they are generated, so memory does not
+    grow with the size of the capture.
+    """
+    mix = mix or PROTOCOL_MIX
+    unknown = set(mix) - set(PROTOCOL_MIX)
+    if unknown:
+        raise ValueError(f"Unknown protocols {', '.join(sorted(unknown))}")
+
+    rng = random.Random(seed)
+    protocols = list(mix)
+    weights = [mix[protocol] for protocol in protocols]
+    ipv4 = [
+        socket.inet_aton(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+        for i in range(1, hosts + 1)
+    ]
+    ipv6 = [
+        socket.inet_pton(socket.AF_INET6, f"fd00::{i:x}") for i in range(1, hosts + 1)
+    ]
+    record_header = struct.Struct("<IIII")
+    timestamp = 1_700_000_000.0
+
+    with open(path, "wb", buffering=1024 * 1024) as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+
+        chunk = 4096
+        for start in range(0, packets, chunk):
+            count = min(chunk, packets - start)
+            frames = []
+            for protocol in rng.choices(protocols, weights, k=count):
+                src, dst = rng.sample(range(hosts), 2) if hosts > 1 else (0, 0)
+                payload = bytes(rng.randrange(0, 64))
+                if protocol == "arp":
+                    frame = _ethernet(0x0806, bytes(28))
+                elif protocol == "icmpv6":
+                    frame = _ethernet(
+                        0x86DD, _ipv6(ipv6[src], ipv6[dst], 58, bytes(8) + payload)
+                    )
+                else:
+                    frame = _ethernet(
+                        0x0800,
+                        _ipv4(
+                            ipv4[src],
+                            ipv4[dst],
+                            _IP_PROTOCOLS[protocol],
+                            _transport(protocol, rng) + payload,
+                        ),
+                    )
+
+                timestamp += rng.expovariate(rate)
+                sec = int(timestamp)
+                frames.append(
+                    record_header.pack(
+                        sec, int((timestamp - sec) * 1_000_000), len(frame), len(frame)
+                    )
+                    + frame
+                )
+            f.write(b"".join(frames))
+
+
+def _transport(protocol: str, rng: random.Random) -> bytes:
+    ports = struct.pack(">HH", rng.randrange(1024, 65536), rng.choice((53, 80, 443)))
+    if protocol == "tcp":
+        return ports + bytes(8) + b"\x50\x10" + bytes(6)
+    if protocol == "udp":
+        return ports + bytes(4)
+    return bytes(8)
+
+
+def _ethernet(ethertype: int, payload: bytes) -> bytes:
+    return (
+        b"\x02\x00\x00\x00\x00\x01\x02\x00\x00\x00\x00\x02"
+        + struct.pack(">H", ethertype)
+        + payload
+    )
+
+
+def _ipv4(src: bytes, dst: bytes, protocol: int, payload: bytes) -> bytes:
+    return (
+        struct.pack(">BBHHHBBH", 0x45, 0, 20 + len(payload), 0, 0, 64, protocol, 0)
+        + src
+        + dst
+        + payload
+    )
+
+
+def _ipv6(src: bytes, dst: bytes, next_header: int, payload: bytes) -> bytes:
+    return (
+        struct.pack(">IHBB", 6 << 28, len(payload), next_header, 64)
+        + src
+        + dst
+        + payload
+    )
@@ -0,0 +1,2 @@
+# Defined here so it can be read without importing requests, see llm_eval.ollama
+OLLAMA_URL = "http://localhost:11434"
@@ -0,0 +1,213 @@
+import ipaddress
+import json
+import re
+
+_IPV4 = re.compile(r"(?<![\w.])(?:\d{1,3}\.){3}\d{1,3}(?!\.?\w)")
+_IPV6 = re.compile(r"(?<![\w:])[0-9a-fA-F]{0,4}(?::[0-9a-fA-F]{0,4}){2,7}(?![\w:])")
+# Thousands separators are accepted, "1,234" is a single number
+_NUMBER = re.compile(r"(?<![\w.])\d{1,3}(?:,\d{3})+(?:\.\d+)?|(?<![\w.,])\d+(?:\.\d+)?")
+_PROTOCOL = re.compile(r"\b(ICMPv6|ICMP|TCP|UDP)\b", re.IGNORECASE)
+# Numbers in other units or spelled out can not be compared as they are
+_SCALED = re.compile(
+    r"\b(?:hundred|thousand|million|billion|[kmg]i?b|kbps|mbps|ms|minutes?|hours?)\b"
+    r"|\d\s*[kKmMgG]\b",
+    re.IGNORECASE,
+)
+# Real answers the rules leave to the judge model
+_UNDECIDABLE = re.compile(r"Cannot answer|not used any|approximately|estimated")
+
+# Absolute tolerance of the integer answers, the average size is truncated
+_INTEGER_TOLERANCE = {0: 0, 1: 0, 2: 0, 3: 0, 4: 1}
+
+JUDGE_CONTEXT = "You are a model used to evaluate if the answers of other model are well answered. Every answer is numbered, compare it with its real answer and grade it with is_correct Yes or No and a punctuation from 0 to 100 with how good is the question answered. Grade every answer."
+
+JUDGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "grades": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "answer": {"type": "integer"},
+                    "is_correct": {"type": "string", "enum": ["Yes", "No"]},
+                    "punctuation": {"type": "integer", "minimum": 0, "maximum": 100},
+                },
+                "required": ["answer", "is_correct", "punctuation"],
+            },
+        }
+    },
+    "required": ["grades"],
+}
+
+
+class Grader:
+    """Deterministic grading of the answers with values that can be compared.
+
+    The numbers, IPs and protocols of a generated answer are extracted and
+    compared with the ones of the real answer of its question, floats with
+    `relative_tolerance` or `absolute_tolerance`, whichever is larger.
+    `grade` returns None when the rules can not decide, those answers are
+    left to the judge model.
+    """
+
+    def __init__(
+        self, relative_tolerance: float = 0.01, absolute_tolerance: float = 0.01
+    ):
+        self.__relative_tolerance = relative_tolerance
+        self.__absolute_tolerance = absolute_tolerance
+
+    def grade(self, question: int, generated: str, answer: str) -> dict:
+        """Evaluation of the generated answer, None if it is ambiguous"""
+        if question is None or not generated or not answer:
+            return None
+        if _UNDECIDABLE.search(answer) or _SCALED.search(generated):
+            return None
+
+        if question == 1:
+            correct = self.__grade_communicators(generated, answer)
+        elif question == 2:
+            correct = self.__grade_top_talker(generated, answer)
+        elif question == 5:
+            correct = _grade_protocol(generated, answer)
+        elif question in _INTEGER_TOLERANCE:
+            correct = self.__grade_numbers(
+                generated, answer, _INTEGER_TOLERANCE[question]
+            )
+        elif question in (6, 7, 8):
+            correct = self.__grade_numbers(generated, answer)
+        else:
+            correct = None
+
+        if correct is None:
+            return None
+        return {"is_correct": "Yes" if correct else "No", "punctuation": 100 * correct}
+
+    def __grade_communicators(self, generated: str, answer: str):
+        expected_ips = set(extract_ips(answer))
+        generated_ips = set(extract_ips(generated))
+        verdicts = [self.__grade_numbers(generated, answer.split(".")[0], 0)]
+        if generated_ips:
+            verdicts.append(generated_ips == expected_ips)
+        return _combine(verdicts)
+
+    def __grade_top_talker(self, generated: str, answer: str):
+        generated_ips = extract_ips(generated)
+        if not generated_ips:
+            return None
+        # The first IP named is the one given as the answer
+        return _combine(
+            [
+                generated_ips[0] == extract_ips(answer)[0],
+                self.__grade_numbers(generated, answer, 0),
+            ]
+        )
+
+    def __grade_numbers(self, generated: str, answer: str, tolerance: float = None):
+        """True if every number of the answer is the expected one, False if none is"""
+        expected = extract_numbers(answer)
+        numbers = extract_numbers(generated)
+        if len(expected) != 1 or not numbers:
+            return None
+
+        expected = expected[0]
+        if tolerance is None:
+            tolerance = max(
+                self.__absolute_tolerance, self.__relative_tolerance * abs(expected)
+            )
+        matches = [abs(number - expected) <= tolerance for number in numbers]
+        if all(matches):
+            return True
+        if not any(matches):
+            return False
+        # The expected number is there, but along with others
+        return None
+
+
+def _grade_protocol(generated: str, answer: str):
+    expected = extract_protocols(answer)
+    protocols = set(extract_protocols(generated))
+    if len(expected) != 1 or not protocols:
+        return None
+    if protocols == set(expected):
+        return True
+    if expected[0] not in protocols:
+        return False
+    return None
+
+
+def _combine(verdicts: list):
+    """Agreeing verdicts, None if they disagree or there are none"""
+    verdicts = [verdict for verdict in verdicts if verdict is not None]
+    if verdicts and all(verdicts):
+        return True
+    if verdicts and not any(verdicts):
+        return False
+    return None
+
+
+def extract_ips(text: str) -> list:
+    """IPv4 and IPv6 addresses of a text, in order and normalized"""
+    ips = []
+    for match in sorted(
+        [*_IPV4.finditer(text), *_IPV6.finditer(text)], key=lambda m: m.start()
+    ):
+        try:
+            ips.append(str(ipaddress.ip_address(match.group())))
+        except ValueError:
+            continue
+    return ips
+
+
+def extract_numbers(text: str) -> list:
+    """Numbers of a text, leaving out the ones that are part of an IP"""
+    text = _IPV4.sub(_blank_ip, text)
+    text = _IPV6.sub(_blank_ip, text)
+    return [float(number.replace(",", "")) for number in _NUMBER.findall(text)]
+
+
+def _blank_ip(match) -> str:
+    try:
+        ipaddress.ip_address(match.group())
+    except ValueError:
+        return match.group()
+    return " "
+
+
+def extract_protocols(text: str) -> list:
+    return [
+        "ICMPv6" if protocol.upper() == "ICMPV6" else protocol.upper()
+        for protocol in _PROTOCOL.findall(text)
+    ]
+
+
+def judge_prompt(answers: list) -> str:
+    """Prompt grading several (generated answer, real answer) pairs in one call"""
+    return "\n\n".join(
+        f"Answer {i}:\nModel to evaluate answer: {generated}\nReal answer:\n{real}"
+        for i, (generated, real) in enumerate(answers)
+    )
+
+
+def parse_judgement(output_text: str, size: int) -> dict:
+    """Evaluations of a judge_prompt reply by answer number, invalid ones left out"""
+    try:
+        grades = json.loads(output_text)["grades"]
+    except (ValueError, TypeError, KeyError):
+        return {}
+
+    evaluations = {}
+    for grade in grades if isinstance(grades, list) else []:
+        try:
+            index = int(grade["answer"])
+            punctuation = int(grade["punctuation"])
+            is_correct = grade["is_correct"]
+        except (ValueError, TypeError, KeyError):
+            continue
+        if (
+            0 <= index < size
+            and is_correct in ("Yes", "No")
+            and 0 <= punctuation <= 100
+        ):
+            evaluations[index] = {"is_correct": is_correct, "punctuation": punctuation}
+    return evaluations
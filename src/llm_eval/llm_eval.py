@@ -1,130 +1,436 @@
+import hashlib
 import json
 import os
 import re
+import time
+from collections import OrderedDict
 
 import plotly.express as px
 import plotly.graph_objects as go
 import requests
 
+from dataset.storage import dataset_file, iter_dataset
+from lib import profiling
+from lib.concurrency import ordered_map
+from llm_eval.grader import JUDGE_CONTEXT, JUDGE_SCHEMA, judge_prompt, parse_judgement
+from llm_eval.ollama import OLLAMA_URL, OllamaClient
+from llm_eval.response_cache import ResponseCache
+from llm_eval.shared_prefix import (
+    ANSWERS_SCHEMA,
+    INFERENCE_MODES,
+    batched_prompt,
+    capture_groups,
+    parse_answers,
+    shared_prompts,
+)
+
+# Tries of a generation that fails, waiting RETRY_DELAY seconds doubled each time
+GENERATE_TRIES = 3
+RETRY_DELAY = 1.0
+
 
 class LLM_Evaluator:
     def __init__(
         self,
         model_to_eval: str = "llama2",
         evaluator_model: str = "llama3",
-        dataset_path: str = "data/zero_shot/dataset.jsonl",
+        dataset_path: str = None,
+        ollama_url: str = OLLAMA_URL,
+        concurrency: int = 1,
+        response_cache: ResponseCache = None,
+        stream: bool = False,
+        grader=None,
+        judge_batch: int = 0,
+        keep_alive=None,
+        inference: str = "independent",
     ):
+        if inference not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode {inference}")
+
         self.__model_to_eval = model_to_eval
         self.__evaluator_model = evaluator_model
-        self.__dataset = self.__load_dataset(dataset_path)
+        self.__dataset_path = dataset_path or dataset_file("zero_shot")
+        self.__concurrency = concurrency
+        self.__ollama = OllamaClient(url=ollama_url, pool_size=concurrency)
+        self.__ollama_checked = False
+        self.__response_cache = response_cache or ResponseCache(enabled=False)
+        self.__stream = stream
+        self.__grader = grader
+        self.__judge_batch = judge_batch
+        self.__keep_alive = keep_alive
+        self.__inference = inference
 
     def answer_questions(
-        self, output_path: str = "data/evaluation/generated_output.jsonl"
+        self,
+        output_path: str = "data/evaluation/generated_output.jsonl",
+        resume: bool = True,
     ):
         # Check if the directory exists
         os.makedirs("data/evaluation", exist_ok=True)
 
-        # Generate the output of the model to evaluate
-        with open(output_path, "a") as f:
-            for data in self.__dataset:
-                try:
-                    output_text = ""
+        # Skip the questions already answered by this model in a previous run
+        completed = set()
+        if resume:
+            completed = _completed_keys(output_path, self.__answer_key)
+        skipped = 0
+
+        # The questions of a capture answered together need the prompt parts
+        parts = self.__inference != "independent"
+
+        def pending():
+            nonlocal skipped
+            for data in self.__iter_dataset(parts=parts):
+                key = self.__answer_key(data)
+                if key in completed:
+                    skipped += 1
+                else:
+                    yield data
+
+        if parts:
+            # Datasets the prompts can not be shared of are rejected up front
+            first = next(capture_groups(self.__iter_dataset(parts=True)), None)
+            if first:
+                shared_prompts(first)
+
+        self.__check_ollama()
+
+        # Generate the output of the model to evaluate, up to `concurrency`
+        # requests in flight and written back in dataset order
+        if self.__inference == "independent":
+            results = (
+                [row]
+                for row in ordered_map(
+                    self.__answer_question, pending(), self.__concurrency
+                )
+            )
+        else:
+            # The questions of a capture are answered together
+            results = ordered_map(
+                self.__answer_capture, capture_groups(pending()), self.__concurrency
+            )
 
-                    # Generate the output using the model to evaluate
-                    while not output_text:
-                        output_text = self.__generate_response(
-                            context=data["context"],
-                            question=data["prompt"],
-                            model=self.__model_to_eval,
-                        )
+        answered = 0
+        start = time.perf_counter()
+        with open(output_path, "a" if resume else "w") as f:
+            for rows in results:
+                for row in rows:
+                    if row is not None:
+                        answered += 1
+                        # Dump the generated output to a file
+                        line = json.dumps(row) + "\n"
+                        f.write(line)
+                        profiling.count("bytes_written", len(line))
+            f.close()
+        seconds = time.perf_counter() - start
 
-                    # Dump the generated output to a file
-                    f.write(
-                        json.dumps(
-                            {"prompt": data["prompt"], "generated_output": output_text}
-                        )
-                        + "\n"
+        print(f"{skipped} questions were already answered")
+        print(
+            f"{answered} questions answered in {seconds:.2f} s with {self.__inference} inference"
+            + (f", {seconds / answered:.3f} s per question" if answered else "")
+        )
+
+        self.__print_cache_stats()
+
+    def __answer_question(self, data: dict):
+        try:
+            # Generate the output using the model to evaluate
+            output_text, metrics = self.__generate_retrying(
+                context=data["context"],
+                question=data["prompt"],
+                model=self.__model_to_eval,
+                stream=self.__stream,
+            )
+            if not output_text:
+                print(
+                    f"No answer for {data.get('id') or data['prompt'][-60:]} after {GENERATE_TRIES} tries, skipping"
+                )
+                return None
+
+            return self.__answer_row(data, output_text, metrics)
+        except Exception as error:
+            print(
+                f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
+            )
+
+    def __answer_capture(self, rows: list) -> list:
+        """Answer the questions of a capture evaluating their shared prefix once.
+
+        In "context" inference the prefix is prefilled once and every
+        question continues its context tokens, in "batched" inference all
+        the questions are asked in one request and the answers split from
+        its structured reply. Questions left without answer are asked on
+        their own.
+        """
+        try:
+            prefix, questions = shared_prompts(rows)
+            system = rows[0]["context"]
+
+            with profiling.span(
+                "answer_capture", inference=self.__inference, questions=len(rows)
+            ):
+                if self.__inference == "batched":
+                    output_text, metrics = self.__generate_response(
+                        context=system,
+                        question=batched_prompt(prefix, questions),
+                        model=self.__model_to_eval,
+                        format=ANSWERS_SCHEMA,
                     )
-                except Exception as error:
-                    print(
-                        f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
+                    answers = parse_answers(output_text, len(rows))
+                    # The latency of the request is shared by its questions
+                    if metrics.get("latency") is not None:
+                        metrics = {**metrics, "latency": metrics["latency"] / len(rows)}
+                    metrics = {**metrics, "inference": "batched", "batch": len(rows)}
+                    return [
+                        (
+                            self.__answer_row(row, answers[i], metrics)
+                            if i in answers
+                            else self.__answer_question(row)
+                        )
+                        for i, row in enumerate(rows)
+                    ]
+
+                prefill = _Prefill(self.__ollama, self.__model_to_eval, system, prefix)
+                answered = []
+                for row, question in zip(rows, questions):
+                    output_text, metrics = self.__generate_response(
+                        context="",
+                        question=question,
+                        model=self.__model_to_eval,
+                        stream=self.__stream,
+                        prefill=prefill,
                     )
-            f.close()
+                    if not output_text:
+                        answered.append(self.__answer_question(row))
+                        continue
+                    metrics = {**metrics, "inference": "context"}
+                    prefill_latency = prefill.metrics.get("latency")
+                    if prefill_latency is not None:
+                        # Prefill time, shared by the questions of the capture
+                        metrics["prefill_latency"] = prefill_latency / len(rows)
+                    answered.append(self.__answer_row(row, output_text, metrics))
+                return answered
+        except Exception as error:
+            # e.g. Ollama went away, the questions of the capture are skipped
+            print(
+                f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
+            )
+            return [None for _ in rows]
+
+    def __answer_row(self, data: dict, output_text: str, metrics: dict) -> dict:
+        return {
+            "key": self.__answer_key(data),
+            "id": data.get("id"),
+            "question": data.get("question"),
+            "prompt": data["prompt"],
+            "generated_output": output_text,
+            "metrics": metrics,
+        }
+
+    def __answer_key(self, data: dict) -> str:
+        return _answer_key(self.__model_to_eval, data, self.__inference)
 
     def evaluate_model(
-        self, generated_output_path: str = "data/evaluation/generated_output.jsonl"
+        self,
+        generated_output_path: str = "data/evaluation/generated_output.jsonl",
+        resume: bool = True,
     ):
-        # Load the generated output
-        generated_output = self.__load_dataset(generated_output_path)
+        # Stream the generated output joined to the dataset rows it answers
+        generated_output = self.__iter_jsonl(generated_output_path)
 
         # Delete the extension of the generated output path
         generated_output_path = generated_output_path.split("/")[-1].split(".")[0]
+        evaluation_path = f"data/evaluation/evaluation_{generated_output_path}.jsonl"
+
+        completed = _completed_keys(evaluation_path) if resume else set()
+        skipped = 0
+
+        def pending():
+            nonlocal skipped
+            for generated_answer, data in _join_rows(
+                generated_output,
+                self.__iter_dataset(prompts=False),
+                lookup=self.__dataset_row,
+            ):
+                key = _row_key(
+                    self.__evaluator_model,
+                    generated_answer.get("key") or generated_answer.get("prompt"),
+                    generated_answer.get("generated_output"),
+                )
+                if key in completed:
+                    skipped += 1
+                elif data is None:
+                    print(f"No dataset row for {_join_key(generated_answer)}, skipping")
+                else:
+                    yield key, generated_answer, data
+
+        self.__check_ollama()
+
+        graded = {"rules": 0, "judge": 0}
+        with open(evaluation_path, "a" if resume else "w") as f:
+            for rows in ordered_map(
+                self.__evaluate_batch,
+                self.__batches(pending()),
+                self.__concurrency,
+            ):
+                for row in rows:
+                    if row is not None:
+                        graded[row["grader"]] += 1
+                        # Dump the evaluation to a file
+                        line = json.dumps(row) + "\n"
+                        f.write(line)
+                        profiling.count("bytes_written", len(line))
+            f.close()
 
-        with open(
-            f"data/evaluation/evaluation_{generated_output_path}.jsonl", "a"
-        ) as f:
-            for i, generated_answer in enumerate(generated_output):
-                try:
-                    # Get the prompt and the generated answer
-                    generated_answer = generated_answer["generated_output"]
+        print(f"{skipped} answers were already evaluated")
+        print(
+            f"{graded['rules']} answers were graded by the rules and {graded['judge']} by the judge model"
+        )
 
-                    # Get the real answer
-                    real_answer = self.__dataset[i]["answer"]
+        self.__print_cache_stats()
+
+    def __batches(self, items):
+        """Group the answers to evaluate in units of work.
+
+        Answers the rule grader decides make a unit of their own, which needs
+        no request. The ambiguous ones are grouped `judge_batch` at a time to
+        be graded by the judge model in a single call, so the evaluations are
+        not always written in dataset order.
+        """
+        batch = []
+        for item in items:
+            evaluation = None
+            if self.__grader is not None:
+                _, generated_row, data = item
+                evaluation = self.__grader.grade(
+                    data.get("question"),
+                    generated_row.get("generated_output"),
+                    data.get("answer"),
+                )
 
-                    # Evaluate the generated answer with the evaluator model
+            if evaluation is not None:
+                profiling.count("rule_graded")
+                yield [(item, evaluation)]
+                continue
+
+            batch.append((item, None))
+            if len(batch) >= max(self.__judge_batch, 1):
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def __evaluate_batch(self, units: list) -> list:
+        # A unit is either one answer graded by the rules or only ambiguous ones
+        ambiguous = [item for item, evaluation in units if evaluation is None]
+        judged = {}
+        if ambiguous and self.__judge_batch:
+            judged = self.__judge_answers(ambiguous)
+
+        rows = []
+        for item, evaluation in units:
+            if evaluation is not None:
+                rows.append(_evaluation_row(item, evaluation, "rules"))
+            elif len(rows) in judged:
+                rows.append(_evaluation_row(item, judged[len(rows)], "judge"))
+            else:
+                # Answers missing from the batched reply get a call of their own
+                rows.append(self.__evaluate_answer(item))
+        return rows
 
-                    context = r'You are a model used to evaluate if this answer of other model is well answered, you ONLY can answer with this json format: {"is_correct": "Yes" or "No", "punctuation": <Number from 0 to 100 with how good is the question answered>}. Every other format answer will be considered as wrong.'
+    def __judge_answers(self, items: list) -> dict:
+        """Grade several answers in one call constrained to the JUDGE_SCHEMA format.
 
-                    input_text = f"Model to evaluate answer: {generated_answer}\nReal answer:\n{real_answer}"
+        Returns the evaluations by position in `items`, the ones the judge did
+        not grade properly are left out.
+        """
+        judged = {}
+        try:
+            question = judge_prompt(
+                [
+                    (generated_row["generated_output"], data["answer"])
+                    for _, generated_row, data in items
+                ]
+            )
+            for number_of_tries in range(3):
+                output_text, _ = self.__generate_response(
+                    context=JUDGE_CONTEXT,
+                    question=question,
+                    model=self.__evaluator_model,
+                    use_cache=number_of_tries == 0,
+                    format=JUDGE_SCHEMA,
+                )
+                judged = parse_judgement(output_text, len(items))
+                if judged:
+                    break
+                print("Output text format is not like the expected, trying again.")
+                profiling.count("judge_retries")
+        except Exception as error:
+            # e.g. a row without generated output, the answers are evaluated
+            # one at a time and only the broken ones skipped
+            print(
+                f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
+            )
+        return judged
 
-                    output_text = ""
-                    number_of_tries = 0
+    def __evaluate_answer(self, item: tuple):
+        key, generated_row, data = item
+        try:
+            # Get the prompt and the generated answer
+            generated_answer = generated_row["generated_output"]
 
-                    while not output_text:
-                        output_text = self.__generate_response(
-                            context=context,
-                            question=input_text,
-                            model=self.__evaluator_model,
-                        )
+            # Get the real answer
+            real_answer = data["answer"]
 
-                        # If output text is not like the expected, try again
-                        if not re.match(
-                            r'{"is_correct": "(Yes|No)", "punctuation": \d{1,3}}',
-                            output_text,
-                        ):
-                            output_text = ""
-                            print(
-                                "Output text format is not like the expected, trying again."
-                            )
-                            number_of_tries += 1
-                            if number_of_tries > 10:
-                                print(
-                                    "The model to evaluate the answer is not working properly, writing default answer and note and going to next question."
-                                )
-                                output_text = '{"is_correct": "No", "punctuation": 0, "note": "Model to evaluate the answer is not working properly"}'
-
-                    # Convert the output text to a dictionary
-                    final_output = json.loads(output_text)
-
-                    # Dump the evaluation to a file
-                    f.write(
-                        json.dumps(
-                            {
-                                "prompt": input_text,
-                                "evaluation": final_output,
-                            }
-                        )
-                        + "\n"
-                    )
-                except Exception as error:
+            # Evaluate the generated answer with the evaluator model
+
+            context = r'You are a model used to evaluate if this answer of other model is well answered, you ONLY can answer with this json format: {"is_correct": "Yes" or "No", "punctuation": <Number from 0 to 100 with how good is the question answered>}. Every other format answer will be considered as wrong.'
+
+            input_text = f"Model to evaluate answer: {generated_answer}\nReal answer:\n{real_answer}"
+
+            output_text = ""
+            number_of_tries = 0
+
+            while not output_text:
+                output_text, _ = self.__generate_retrying(
+                    context=context,
+                    question=input_text,
+                    model=self.__evaluator_model,
+                    # Retries must not get the same malformed cached reply
+                    use_cache=number_of_tries == 0,
+                )
+                if not output_text:
                     print(
-                        f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
+                        f"No evaluation for {generated_row.get('id') or key} after {GENERATE_TRIES} tries, skipping"
                     )
-            f.close()
+                    return None
+
+                # If output text is not like the expected, try again
+                if not re.match(
+                    r'{"is_correct": "(Yes|No)", "punctuation": \d{1,3}}',
+                    output_text,
+                ):
+                    output_text = ""
+                    print("Output text format is not like the expected, trying again.")
+                    number_of_tries += 1
+                    profiling.count("judge_retries")
+                    if number_of_tries > 10:
+                        print(
+                            "The model to evaluate the answer is not working properly, writing default answer and note and going to next question."
+                        )
+                        output_text = '{"is_correct": "No", "punctuation": 0, "note": "Model to evaluate the answer is not working properly"}'
+
+            # Convert the output text to a dictionary
+            final_output = json.loads(output_text)
+
+            return _evaluation_row(item, final_output, "judge")
+        except Exception as error:
+            print(
+                f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
+            )
 
     def generate_report(self, evaluation_input: str):
         # Load the generated output
-        generated_output = self.__load_dataset(evaluation_input)
+        generated_output = self.__iter_jsonl(evaluation_input)
 
         data_per_question = {}
 
@@ -134,6 +440,8 @@ class LLM_Evaluator:
                 "problematic_eval": 0,
                 "total": 0,
                 "total_punct": 0,
+                "latencies": [],
+                "tokens_per_second": [],
             }
 
         for i, generated_answer in enumerate(generated_output):
@@ -144,17 +452,33 @@ class LLM_Evaluator:
                 # Get the punctuation
                 punctuation = evaluation["punctuation"]
 
+                # Older evaluations do not store the question, those are in order
+                question = generated_answer.get("question")
+                if question is None:
+                    question = i % 9
+
                 # Update the data_per_question dictionary
-                data_per_question[f"question{i % 9}"]["total"] += 1
+                data_per_question[f"question{question}"]["total"] += 1
 
                 if evaluation["is_correct"] == "Yes":
-                    data_per_question[f"question{i % 9}"]["correct"] += 1
+                    data_per_question[f"question{question}"]["correct"] += 1
 
-                data_per_question[f"question{i % 9}"]["total_punct"] += punctuation
+                data_per_question[f"question{question}"]["total_punct"] += punctuation
 
                 # If evaluation has a note, increment the problematic_eval counter
                 if "note" in evaluation:
-                    data_per_question[f"question{i % 9}"]["problematic_eval"] += 1
+                    data_per_question[f"question{question}"]["problematic_eval"] += 1
+
+                # Cached generations did not hit the model, their timing is meaningless
+                metrics = generated_answer.get("metrics") or {}
+                if metrics.get("latency") is not None and not metrics.get("cached"):
+                    data_per_question[f"question{question}"]["latencies"].append(
+                        metrics["latency"]
+                    )
+                    if metrics.get("tokens_per_second"):
+                        data_per_question[f"question{question}"][
+                            "tokens_per_second"
+                        ].append(metrics["tokens_per_second"])
 
             except Exception as error:
                 print(
@@ -205,11 +529,12 @@ class LLM_Evaluator:
                 total_problematic_eval,
             ],
             names=["Correct", "Incorrect", "Problematic evaluations"],
-            title=f"Correct and incorrect answers: {type_of_dataset.replace("_", " ")} {model_name}",
+            title=f"Correct and incorrect answers: {type_of_dataset.replace('_', ' ')} {model_name}",
         )
 
-        fig.write_image(
-            f"data/evaluation/charts/{model_name}/{type_of_dataset}/correct_incorrect_pie_chart.png"
+        self.__write_image(
+            fig,
+            f"data/evaluation/charts/{model_name}/{type_of_dataset}/correct_incorrect_pie_chart.png",
         )
 
         print("----------------")
@@ -257,8 +582,9 @@ class LLM_Evaluator:
             title=f"Correct and incorrect answers by question: {type_of_dataset.replace('_', ' ')} {model_name}",
         )
 
-        fig.write_image(
-            f"data/evaluation/charts/{model_name}/{type_of_dataset}/correct_incorrect_bar_chart.png"
+        self.__write_image(
+            fig,
+            f"data/evaluation/charts/{model_name}/{type_of_dataset}/correct_incorrect_bar_chart.png",
         )
 
         # Generate radar chart with the total punctuation by question, take in account that the maximum punctuation that has to be the maximum value of the radar chart is 29700
@@ -283,56 +609,325 @@ class LLM_Evaluator:
             title=f"Total punctuation by question: {type_of_dataset.replace('_', ' ')} {model_name}",
         )
 
-        fig.write_image(
-            f"data/evaluation/charts/{model_name}/{type_of_dataset}/total_punctuation_radar_chart.png"
+        self.__write_image(
+            fig,
+            f"data/evaluation/charts/{model_name}/{type_of_dataset}/total_punctuation_radar_chart.png",
+        )
+
+        if not any(data["latencies"] for data in data_per_question.values()):
+            return
+
+        # Generate latency and throughput charts when the generations recorded metrics
+
+        latencies = [
+            latency
+            for data in data_per_question.values()
+            for latency in data["latencies"]
+        ]
+        throughputs = [
+            tokens
+            for data in data_per_question.values()
+            for tokens in data["tokens_per_second"]
+        ]
+
+        print("----------------")
+        print("Speed report")
+        print("----------------")
+        print(f"Average latency: {round(sum(latencies) / len(latencies), 3)} s")
+        if throughputs:
+            print(
+                f"Average throughput: {round(sum(throughputs) / len(throughputs), 2)} tokens/s"
+            )
+
+        fig = go.Figure()
+
+        for i, data in enumerate(data_per_question.values()):
+            fig.add_trace(go.Box(y=data["latencies"], name=f"Question {i + 1}"))
+
+        fig.update_layout(
+            showlegend=False,
+            yaxis_title="Seconds",
+            title=f"Generation latency by question: {type_of_dataset.replace('_', ' ')} {model_name}",
+        )
+
+        self.__write_image(
+            fig,
+            f"data/evaluation/charts/{model_name}/{type_of_dataset}/latency_box_chart.png",
+        )
+
+        fig = go.Figure(
+            data=[
+                go.Bar(
+                    x=[f"Question {i + 1}" for i in range(9)],
+                    y=[
+                        (
+                            sum(data["tokens_per_second"])
+                            / len(data["tokens_per_second"])
+                            if data["tokens_per_second"]
+                            else 0
+                        )
+                        for data in data_per_question.values()
+                    ],
+                )
+            ]
+        )
+
+        fig.update_layout(
+            yaxis_title="Tokens/s",
+            title=f"Generation throughput by question: {type_of_dataset.replace('_', ' ')} {model_name}",
+        )
+
+        self.__write_image(
+            fig,
+            f"data/evaluation/charts/{model_name}/{type_of_dataset}/throughput_bar_chart.png",
         )
 
-    def __load_dataset(self, dataset_path: str):
-        dataset = []
+    def __write_image(self, fig, path: str) -> None:
+        with profiling.span("chart_export", path=path):
+            fig.write_image(path)
+
+    def __iter_jsonl(self, dataset_path: str):
+        """Yield the rows of a JSONL file one at a time"""
         try:
             with open(os.path.join(os.getcwd(), dataset_path), "r") as f:
                 for line in f:
-                    dataset.append(json.loads(line))
+                    yield json.loads(line)
         except Exception as error:
             print(
                 f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
             )
-        return dataset
+
+    def __iter_dataset(self, prompts: bool = True, parts: bool = False):
+        """Yield the rows of the dataset, JSONL or SQLite, one at a time"""
+        try:
+            yield from iter_dataset(
+                os.path.join(os.getcwd(), self.__dataset_path), prompts, parts
+            )
+        except Exception as error:
+            print(
+                f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
+            )
+
+    def __dataset_row(self, key: str) -> dict:
+        """Joined dataset row of a key, scanning the dataset from the start"""
+        profiling.count("join_lookups")
+        for row in self.__iter_dataset(prompts=False):
+            if _join_key(row) == key:
+                return _join_data(row)
+        return None
+
+    def __print_cache_stats(self) -> None:
+        if self.__response_cache.enabled:
+            print(
+                f"Response cache: {self.__response_cache.hits} hits, {self.__response_cache.misses} misses"
+            )
+
+    def __check_ollama(self) -> None:
+        # Check only once per evaluator that the Ollama API is running
+        if not self.__ollama_checked:
+            self.__ollama.wait_until_running()
+            self.__ollama_checked = True
+
+    def __generate_retrying(self, **kwargs) -> tuple:
+        """Generate a response, trying again with backoff when the request fails.
+
+        Returns an empty response after GENERATE_TRIES failed requests.
+        """
+        for number_of_tries in range(GENERATE_TRIES):
+            if number_of_tries:
+                profiling.count("generate_retries")
+                time.sleep(RETRY_DELAY * 2 ** (number_of_tries - 1))
+            output_text, metrics = self.__generate_response(**kwargs)
+            if output_text:
+                break
+        return output_text, metrics
 
     def __generate_response(
         self,
         context: str,
         question: str,
         model: str,
-        url: str = "http://localhost:11434/api/generate",
-    ) -> str:
+        use_cache: bool = True,
+        stream: bool = False,
+        format: dict = None,
+        prefill: "_Prefill" = None,
+    ) -> tuple:
         response_text = ""
-        # Check if the Ollama API is running
-        if requests.get("http://localhost:11434").text != "Ollama is running":
-            print("Ollama is not running, please start the Ollama API to continue.")
-            # Block the execution of the program until user press a key
-            input("Press any key to continue...")
+        metrics = {}
         try:
-            # Generate the output using HTTP Ollama API
-            data = {
-                "model": model,
-                "system": context,
-                "prompt": question,
-                "stream": False,
-                "options": {
-                    "temperature": 0,
-                },
-            }
-
-            response = requests.post(url, data=json.dumps(data))
+            options = {"temperature": 0}
+
+            # Deterministic generations are served from the response cache
+            key = None
+            if self.__response_cache.enabled:
+                payload = {
+                    "model": model,
+                    "system": context,
+                    "prompt": question,
+                    "options": options,
+                }
+                if format is not None:
+                    payload["format"] = format
+                if prefill is not None:
+                    payload["prefix"] = [prefill.system, prefill.prompt]
+                key = self.__response_cache.key(
+                    payload, self.__ollama.model_digest(model)
+                )
+                if use_cache:
+                    cached = self.__response_cache.get(key)
+                    if cached:
+                        profiling.count("response_cache_hits")
+                        return cached["response"], {**cached["metrics"], "cached": True}
+
+            context_tokens = None
+            if prefill is not None:
+                context_tokens = prefill.tokens(self.__keep_alive)
+                if not context_tokens:
+                    raise RuntimeError("The shared prefix could not be prefilled")
 
-            if response.status_code == 200:
-                response_text = json.loads(response.text)["response"]
-            else:
-                print(f"Error: {response.status_code}")
+            # Generate the output using HTTP Ollama API
+            response_text, metrics = self.__ollama.generate(
+                model=model,
+                system=context,
+                prompt=question,
+                options=options,
+                stream=stream,
+                format=format,
+                keep_alive=self.__keep_alive,
+                context=context_tokens,
+            )
 
+            if key and response_text:
+                self.__response_cache.put(
+                    key, {"response": response_text, "metrics": metrics}
+                )
+        except requests.ConnectionError:
+            # Ollama went away, retrying will not help
+            raise
         except Exception as error:
             print(
                 f"{error.__class__.__name__}[{error.__traceback__.tb_lineno}]: {error}"
             )
-        return response_text
+        return response_text, metrics
+
+
+class _Prefill:
+    """Shared prompt prefix of a capture, evaluated the first time it is needed"""
+
+    def __init__(self, ollama: OllamaClient, model: str, system: str, prompt: str):
+        self.system = system
+        self.prompt = prompt
+        self.metrics = {}
+        self.__ollama = ollama
+        self.__model = model
+        self.__tokens = None
+
+    def tokens(self, keep_alive=None) -> list:
+        if self.__tokens is None:
+            self.__tokens, self.metrics = self.__ollama.prefill(
+                self.__model, self.system, self.prompt, keep_alive=keep_alive
+            )
+        return self.__tokens
+
+
+def _evaluation_row(item: tuple, evaluation: dict, grader: str) -> dict:
+    key, generated_row, data = item
+    return {
+        "key": key,
+        "id": generated_row.get("id"),
+        "question": generated_row.get("question", data.get("question")),
+        "prompt": f"Model to evaluate answer: {generated_row['generated_output']}\nReal answer:\n{data['answer']}",
+        "evaluation": evaluation,
+        "grader": grader,
+        "metrics": generated_row.get("metrics"),
+    }
+
+
+def _row_key(*parts) -> str:
+    """Stable hash identifying a unit of LLM work, e.g. (model, prompt)"""
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def _answer_key(model: str, data: dict, inference: str = "independent") -> str:
+    """Key of the answer of a dataset row, or of a row written without key"""
+    # Answers of other inference modes are not the same work
+    if inference == "independent":
+        return _row_key(model, data.get("id"), data["prompt"])
+    return _row_key(model, data.get("id"), data["prompt"], inference)
+
+
+def _completed_keys(output_path: str, legacy_key=None) -> set:
+    """Keys of the rows already written to an output file.
+
+    Rows written before keys were stored are identified with `legacy_key`
+    when given. A run interrupted while writing can leave a partial last
+    line, it is truncated so the rows appended by the resumed run stay valid.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, "r+b") as f:
+        valid_size = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid_size += len(line)
+            try:
+                row = json.loads(line)
+                key = row.get("key") or (legacy_key and legacy_key(row))
+            except (ValueError, KeyError):
+                continue
+            if key:
+                completed.add(key)
+        f.truncate(valid_size)
+
+    return completed
+
+
+def _join_key(row: dict) -> str:
+    """Dataset rows are identified by id, rows of older datasets by their prompt"""
+    return row.get("id") or _row_key(row.get("prompt"))
+
+
+def _join_data(row: dict) -> dict:
+    # Only what the evaluation needs is kept from the dataset row
+    return {"answer": row.get("answer"), "question": row.get("question")}
+
+
+def _join_rows(generated_rows, dataset_rows, lookup=None, window: int = 10000):
+    """Pair every generated row with its dataset row in a single streaming pass.
+
+    Both files are written in dataset order, so this is a merge join: dataset
+    rows are read ahead until the wanted key shows up, and the rows passed on
+    the way are kept aside for generated rows that come later. At most
+    `window` rows are read ahead for a key and kept aside, the oldest ones
+    dropped first, so a key missing from the dataset can not buffer the rest
+    of it. Keys not found within the window are looked up with `lookup(key)`
+    when given, e.g. a scan of the dataset. Yields (generated_row,
+    dataset_row or None).
+    """
+    passed = OrderedDict()
+    dataset_rows = iter(dataset_rows)
+
+    for generated in generated_rows:
+        key = _join_key(generated)
+        data = passed.pop(key, None)
+
+        read = 0
+        while data is None and read < window:
+            row = next(dataset_rows, None)
+            if row is None:
+                break
+            read += 1
+            row_key = _join_key(row)
+            if row_key == key:
+                data = _join_data(row)
+            else:
+                passed[row_key] = _join_data(row)
+                if len(passed) > window:
+                    passed.popitem(last=False)
+
+        if data is None and lookup is not None:
+            data = lookup(key)
+        yield generated, data
@@ -0,0 +1,189 @@
+import json
+import math
+import os
+import tempfile
+import time
+
+from dataset.storage import capture_rows
+from lib import profiling
+from llm_eval.grader import Grader
+from llm_eval.llm_eval import LLM_Evaluator
+from llm_eval.response_cache import ResponseCache
+
+STAGES = ["answer", "evaluate"]
+
+_QUESTIONS = [
+    "What is the total number of packets in the trace?",
+    "How many unique communicators are present in the trace?",
+    "What is the IP that participates the most in communications in the trace?",
+    "What is the total size of transmitted bytes?",
+    "What is the average size of packets in bytes?",
+    "Which protocol predominates in the capture: TCP, UDP, ICMP or ICMPv6?",
+    "How long does the communication last in seconds?",
+    "What is the average of packets sent per second?",
+    "What is the average bytes/s sent in the communication?",
+]
+
+
+def run_load_test(
+    ollama_url: str,
+    concurrencies: list,
+    stages: list = None,
+    dataset_path: str = None,
+    captures: int = 20,
+    packets: int = 125,
+    repeat: int = 1,
+    cache: bool = False,
+    **evaluator_options,
+) -> list:
+    """Drive answer_questions and evaluate_model at every concurrency.
+
+    Runs in a temporary folder, on `dataset_path` or on a synthetic dataset
+    of `captures` captures of `packets` rows. With `cache` the `repeat`
+    runs at a concurrency share a response cache, so the repeated ones
+    measure its hits. Answers are graded like in run-matrix, by the rules
+    and the judge 8 at a time, unless `evaluator_options` set the `grader`
+    and `judge_batch`. Returns a result per
+    concurrency, stage and run, with the throughput in questions per second
+    and the latency percentiles of the Ollama calls.
+    """
+    stages = stages or STAGES
+    evaluator_options.setdefault("grader", Grader())
+    evaluator_options.setdefault("judge_batch", 8)
+    cwd = os.getcwd()
+    dataset_path = os.path.abspath(dataset_path) if dataset_path else None
+    profiler = profiling.active()
+    own_profiler = profiler is None
+    if own_profiler:
+        profiler = profiling.enable()
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            if dataset_path is None:
+                dataset_path = os.path.join(workdir, "dataset.jsonl")
+                write_synthetic_dataset(dataset_path, captures, packets)
+
+            for concurrency in concurrencies:
+                response_cache = ResponseCache(
+                    cache_path=os.path.join(workdir, f"responses_{concurrency}.sqlite"),
+                    enabled=cache,
+                )
+                evaluator = LLM_Evaluator(
+                    model_to_eval="llama2",
+                    dataset_path=dataset_path,
+                    ollama_url=ollama_url,
+                    concurrency=concurrency,
+                    response_cache=response_cache,
+                    **evaluator_options,
+                )
+                output_path = "data/evaluation/generated_output_llama2.jsonl"
+                for run in range(1, repeat + 1):
+                    for stage in stages:
+                        mark = len(profiler.events)
+                        counters = dict(profiler.counters)
+                        start = time.perf_counter()
+                        if stage == "answer":
+                            evaluator.answer_questions(output_path, resume=False)
+                        else:
+                            evaluator.evaluate_model(output_path, resume=False)
+                        seconds = time.perf_counter() - start
+
+                        results.append(
+                            _result(
+                                stage,
+                                concurrency,
+                                run,
+                                seconds,
+                                _rows(stage, output_path),
+                                profiler.events[mark:],
+                                {
+                                    name: value - counters.get(name, 0)
+                                    for name, value in profiler.counters.items()
+                                },
+                            )
+                        )
+                response_cache.close()
+    finally:
+        os.chdir(cwd)
+        if own_profiler:
+            profiling.disable()
+
+    return results
+
+
+def write_synthetic_dataset(path: str, captures: int, packets: int) -> None:
+    """JSONL dataset of made up capture tables, for runs with no real dataset"""
+    with open(path, "w") as f:
+        for capture in range(captures):
+            table = "No.|Time|Source|Destination|Protocol|Length|Info\n " + "\n".join(
+                f"{n} | {n * 0.01:.6f} | 10.0.{capture % 256}.{n % 250} | 10.1.0.{n % 7} | TCP | 60 | 1234 -> 80 [ACK] Seq={n} Ack=1 Win=512 Len=0"
+                for n in range(1, packets + 1)
+            )
+            answers = {
+                question: f"In the capture there are a total of {packets} packets"
+                for question in _QUESTIONS
+            }
+            for row in capture_rows(
+                f"synthetic{capture}.pcap", table, len(_QUESTIONS) * [""], answers
+            ):
+                f.write(json.dumps(row) + "\n")
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile, None without values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def format_results(results: list) -> str:
+    lines = [
+        f"{'Stage':<9} {'Conc.':>5} {'Run':>3} {'Rows':>6} {'Seconds':>8} {'Rows/s':>8} "
+        f"{'Calls':>6} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'Errors':>6} {'Cached':>6}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result['stage']:<9} {result['concurrency']:>5} {result['run']:>3} "
+            f"{result['rows']:>6} {result['seconds']:>8.2f} {result['throughput']:>8.2f} "
+            f"{result['calls']:>6} {_seconds(result['p50']):>8} {_seconds(result['p95']):>8} "
+            f"{_seconds(result['p99']):>8} {result['errors']:>6} {result['cache_hits']:>6}"
+        )
+    return "\n".join(lines)
+
+
+def _result(stage, concurrency, run, seconds, rows, events, counters) -> dict:
+    latencies = [
+        event["duration"] / 1e9
+        for event in events
+        if event["name"] in ("ollama.generate", "ollama.prefill")
+    ]
+    return {
+        "stage": stage,
+        "concurrency": concurrency,
+        "run": run,
+        "rows": rows,
+        "seconds": round(seconds, 6),
+        "throughput": round(rows / seconds, 3) if seconds > 0 else None,
+        "calls": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "errors": counters.get("llm_errors", 0),
+        "retries": counters.get("judge_retries", 0),
+        "cache_hits": counters.get("response_cache_hits", 0),
+    }
+
+
+def _rows(stage: str, output_path: str) -> int:
+    if stage == "evaluate":
+        name = output_path.split("/")[-1].split(".")[0]
+        output_path = f"data/evaluation/evaluation_{name}.jsonl"
+    with open(output_path, "r") as f:
+        return sum(1 for _ in f)
+
+
+def _seconds(value) -> str:
+    return "-" if value is None else f"{value:.3f}"
@@ -0,0 +1,121 @@
+import os
+import time
+
+from dataset.storage import dataset_file
+from lib import profiling
+from llm_eval.llm_eval import LLM_Evaluator
+from llm_eval.ollama import OLLAMA_URL, OllamaClient
+from llm_eval.report import EVALUATION_PATH, generate_full_report
+from llm_eval.response_cache import ResponseCache
+
+PHASES = ["load", "answer", "judge", "report"]
+
+
+def run_matrix(
+    models: list,
+    techniques: list,
+    evaluator_model: str = "llama3",
+    keep_alive="30m",
+    ollama_url: str = OLLAMA_URL,
+    concurrency: int = 1,
+    response_cache: ResponseCache = None,
+    resume: bool = True,
+    grader=None,
+    judge_batch: int = 0,
+    report: bool = True,
+    inference: str = "independent",
+) -> dict:
+    """Answer and evaluate every model x technique pair in a single process.
+
+    The work is grouped by model: each model answers the dataset of every
+    technique while it is loaded, then the judge model evaluates all the
+    outputs in a phase of its own, so every model is loaded once. Models
+    stay in memory for `keep_alive` while in use and are unloaded when their
+    work is done. The output of a pair is written to
+    data/evaluation/<technique>_<model>.jsonl, with the inference mode after
+    the technique when it is not "independent", so the modes are reported
+    side by side. Returns the wall time of every
+    phase in seconds, model loads are timed apart from the answer and judge
+    phases.
+    """
+    client = OllamaClient(url=ollama_url)
+    client.wait_until_running()
+    timings = dict.fromkeys(PHASES, 0.0)
+
+    def evaluator(model: str, dataset_path: str = None) -> LLM_Evaluator:
+        return LLM_Evaluator(
+            model_to_eval=model,
+            evaluator_model=evaluator_model,
+            dataset_path=dataset_path,
+            ollama_url=ollama_url,
+            concurrency=concurrency,
+            response_cache=response_cache,
+            grader=grader,
+            judge_batch=judge_batch,
+            keep_alive=keep_alive,
+            inference=inference,
+        )
+
+    def load(model: str) -> None:
+        with profiling.span("matrix.load", model=model):
+            start = time.perf_counter()
+            client.keep_alive(model, keep_alive)
+            seconds = time.perf_counter() - start
+        timings["load"] += seconds
+        print(f"Loaded {model} in {seconds:.2f} s")
+
+    datasets = {}
+    for technique in techniques:
+        dataset_path = dataset_file(technique)
+        if os.path.exists(dataset_path):
+            datasets[technique] = dataset_path
+        else:
+            print(f"No dataset for {technique} in {dataset_path}, skipping")
+
+    outputs = []
+    for model in models:
+        load(model)
+        try:
+            with profiling.span("matrix.answer", model=model):
+                start = time.perf_counter()
+                for technique, dataset_path in datasets.items():
+                    print(f"Answering {technique} questions with {model}")
+                    run = (
+                        technique
+                        if inference == "independent"
+                        else f"{technique}-{inference}"
+                    )
+                    output_path = f"{EVALUATION_PATH}/{run}_{model}.jsonl"
+                    evaluator(model, dataset_path).answer_questions(
+                        output_path=output_path, resume=resume
+                    )
+                    outputs.append((model, technique, output_path))
+                timings["answer"] += time.perf_counter() - start
+        finally:
+            # Unloaded even when the phase fails, it would hold the memory
+            client.keep_alive(model, 0)
+
+    if outputs:
+        load(evaluator_model)
+        try:
+            with profiling.span("matrix.judge", model=evaluator_model):
+                start = time.perf_counter()
+                for model, technique, output_path in outputs:
+                    print(f"Evaluating {output_path}")
+                    evaluator(model, datasets[technique]).evaluate_model(
+                        generated_output_path=output_path, resume=resume
+                    )
+                timings["judge"] += time.perf_counter() - start
+        finally:
+            client.keep_alive(evaluator_model, 0)
+
+    if report:
+        with profiling.span("matrix.report"):
+            start = time.perf_counter()
+            generate_full_report(EVALUATION_PATH)
+            timings["report"] += time.perf_counter() - start
+
+    print("Wall time per phase")
+    for phase in PHASES:
+        print(f"  {phase:<8} {timings[phase]:10.2f} s")
+    return timings
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JUDGE_REPLY = '{"is_correct": "Yes", "punctuation": 100}'
+
+
+class MockOllama:
+    """Stand-in for the Ollama HTTP API, to test and load test without a model.
+
+    Serves `/`, `/api/tags` and `/api/generate`, streaming or not. Every
+    generation waits a latency drawn from `latency` plus the prompt at
+    `prompt_tokens_per_second` and the reply at `tokens_per_second`, and
+    fails with an HTTP 500 with probability `error_rate`. The judge gets the
+    `judge_replies` in turn, malformed ones exercise its retries, and
+    requests with a JSON schema `format` get a reply following it. The
+    prompts of the generate requests are kept in `prompts`, the (model,
+    keep_alive) of the requests only loading or unloading a model in `loads`.
+    """
+
+    def __init__(
+        self,
+        latency: str = "constant:0.05",
+        tokens_per_second: float = 100.0,
+        prompt_tokens_per_second: float = 20000.0,
+        error_rate: float = 0.0,
+        judge_replies: list = None,
+        models: tuple = ("llama2", "llama3", "mistral"),
+        seed: int = 0,
+    ):
+        self.__latency = parse_latency(latency)
+        self.__tokens_per_second = tokens_per_second
+        self.__prompt_tokens_per_second = prompt_tokens_per_second
+        self.__error_rate = error_rate
+        self.__judge_replies = list(judge_replies or [JUDGE_REPLY])
+        self.__judged = 0
+        self.__models = models
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.requests = 0
+        self.prompts = []
+        self.loads = []
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in a background thread, returns the URL, port 0 picks a free one"""
+        self.__server = ThreadingHTTPServer((host, port), _Handler)
+        self.__server.daemon_threads = True
+        self.__server.mock = self
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.__server.server_port}"
+
+    def serve_forever(self, host: str = "127.0.0.1", port: int = 11434) -> None:
+        self.__server = ThreadingHTTPServer((host, port), _Handler)
+        self.__server.daemon_threads = True
+        self.__server.mock = self
+        self.__server.serve_forever()
+
+    def stop(self) -> None:
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def tags(self) -> dict:
+        return {
+            "models": [
+                {
+                    "name": f"{model}:latest",
+                    "model": f"{model}:latest",
+                    "digest": hashlib.sha256(model.encode("utf-8")).hexdigest(),
+                }
+                for model in self.__models
+            ]
+        }
+
+    def load(self, request: dict) -> None:
+        """Record a request that only loads or unloads a model"""
+        with self.__lock:
+            self.loads.append((request.get("model"), request.get("keep_alive")))
+
+    def plan(self, request: dict) -> tuple:
+        """Reply of a generate request, returns (status, response, prefill s, token s)"""
+        with self.__lock:
+            self.requests += 1
+            self.prompts.append(request.get("prompt", ""))
+            if self.__random.random() < self.__error_rate:
+                return 500, "", 0.0, 0.0
+            latency = self.__latency(self.__random)
+            response = self.__reply(request)
+
+        prompt_tokens = _tokens(request.get("prompt", ""))
+        prefill = latency + prompt_tokens / self.__prompt_tokens_per_second
+        return 200, response, prefill, 1 / self.__tokens_per_second
+
+    def __reply(self, request: dict) -> str:
+        prompt = request.get("prompt", "")
+        schema = request.get("format")
+        if isinstance(schema, dict) and "grades" in schema.get("properties", {}):
+            answers = len(re.findall(r"^Answer \d+:", prompt, re.MULTILINE))
+            return json.dumps(
+                {
+                    "grades": [
+                        {"answer": i, "is_correct": "Yes", "punctuation": 100}
+                        for i in range(answers)
+                    ]
+                }
+            )
+        if isinstance(schema, dict) and "answers" in schema.get("properties", {}):
+            questions = len(re.findall(r"^Question \d+:", prompt, re.MULTILINE))
+            return json.dumps(
+                {
+                    "answers": [
+                        {"question": i, "answer": f"Mock answer {i}"}
+                        for i in range(questions)
+                    ]
+                }
+            )
+        if "evaluate" in (request.get("system") or ""):
+            reply = self.__judge_replies[self.__judged % len(self.__judge_replies)]
+            self.__judged += 1
+            return reply
+        question = prompt.strip().split("\n")[-1]
+        return f"Mock answer to {question[-60:]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path == "/api/tags":
+            self.__send(json.dumps(self.server.mock.tags()))
+        else:
+            self.__send("Ollama is running", "text/plain")
+
+    def do_POST(self) -> None:
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path != "/api/generate":
+            self.__send(json.dumps({"error": "not found"}), status=404)
+            return
+        if "prompt" not in request:
+            # Only loads or unloads the model
+            self.server.mock.load(request)
+            self.__send(json.dumps({"model": request.get("model"), "done": True}))
+            return
+
+        status, response, prefill, token_time = self.server.mock.plan(request)
+        if status != 200:
+            self.__send(json.dumps({"error": "mock failure"}), status=status)
+            return
+
+        tokens = _split_tokens(response)
+        num_predict = (request.get("options") or {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            # -1 is Ollama's unlimited
+            tokens = tokens[:num_predict]
+        final = {
+            "model": request.get("model"),
+            "done": True,
+            "context": list(range(len(request.get("context") or []) + len(tokens) + 1)),
+            "prompt_eval_count": _tokens(request.get("prompt", "")),
+            "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) * token_time * 1e9),
+        }
+
+        time.sleep(prefill)
+        if not request.get("stream", True):
+            time.sleep(len(tokens) * token_time)
+            self.__send(json.dumps({**final, "response": "".join(tokens)}))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            self.__chunk(
+                {"model": request.get("model"), "response": token, "done": False}
+            )
+            time.sleep(token_time)
+        self.__chunk({**final, "response": ""})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def __chunk(self, data: dict) -> None:
+        body = (json.dumps(data) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(body), body))
+
+    def __send(self, body: str, content_type: str = "application/json", status=200):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def parse_latency(spec: str):
+    """Sampler of a latency distribution in seconds.
+
+    "constant:S", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA", the
+    lognormal one gives the long tail of real servers.
+    """
+    name, _, values = spec.partition(":")
+    try:
+        values = [float(value) for value in values.split(",") if value]
+    except ValueError:
+        raise ValueError(f"Invalid latency {spec}")
+
+    if name == "constant" and len(values) == 1:
+        return lambda rng: values[0]
+    if name == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if name == "lognormal" and len(values) == 2 and values[0] > 0:
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0, sigma)
+    raise ValueError(f"Invalid latency {spec}")
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1 if text else 0
+
+
+def _split_tokens(text: str) -> list:
+    return [text[i : i + 4] for i in range(0, len(text), 4)]
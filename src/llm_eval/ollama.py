@@ -0,0 +1,186 @@
+import json
+import sys
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lib import profiling
+from llm_eval import OLLAMA_URL
+
+
+class OllamaClient:
+    """Thin client of the Ollama HTTP API sharing one pooled session"""
+
+    def __init__(self, url: str = OLLAMA_URL, pool_size: int = 1):
+        self.__url = url.rstrip("/")
+        self.__session = requests.Session()
+
+        # Keep as many connections alive as requests can be in flight
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+        self.__digests = {}
+
+    def wait_until_running(self) -> None:
+        """Block until the Ollama API answers, asking the user to start it"""
+        while True:
+            try:
+                if self.__session.get(self.__url).text == "Ollama is running":
+                    return
+            except requests.ConnectionError:
+                pass
+            if not sys.stdin.isatty():
+                # Nobody can start it, e.g. on CI
+                raise ConnectionError(f"Ollama is not running at {self.__url}")
+            print("Ollama is not running, please start the Ollama API to continue.")
+            # Block the execution of the program until user press a key
+            input("Press any key to continue...")
+
+    def model_digest(self, model: str) -> str:
+        """Digest of the local model weights, empty if the model is unknown"""
+        if model not in self.__digests:
+            response = self.__session.get(f"{self.__url}/api/tags")
+            response.raise_for_status()
+            for info in response.json().get("models", []):
+                name = info["name"]
+                self.__digests[name] = info.get("digest", "")
+                # Models requested without tag resolve to the latest one
+                if name.endswith(":latest"):
+                    self.__digests[name[: -len(":latest")]] = info.get("digest", "")
+            self.__digests.setdefault(model, "")
+        return self.__digests[model]
+
+    def keep_alive(self, model: str, duration) -> None:
+        """Load `model` and keep it in memory for `duration`, 0 unloads it.
+
+        The duration is in seconds or an Ollama duration string like "30m".
+        """
+        response = self.__session.post(
+            f"{self.__url}/api/generate",
+            data=json.dumps({"model": model, "keep_alive": duration}),
+        )
+        if response.status_code != 200:
+            print(f"Error: {response.status_code}")
+
+    def generate(
+        self,
+        model: str,
+        system: str,
+        prompt: str,
+        options: dict = None,
+        stream: bool = False,
+        format: dict = None,
+        keep_alive=None,
+        context: list = None,
+    ) -> tuple:
+        """Generate a completion, returns (response, metrics).
+
+        With `stream` the chunked response is read incrementally, which also
+        measures the time to the first token. `format` is a JSON schema the
+        response is constrained to and `keep_alive` how long the model stays
+        loaded after the call. `context` are the tokens returned by prefill,
+        the prompt continues them. The response is an empty string on HTTP
+        errors.
+        """
+        data = {
+            "model": model,
+            "system": system,
+            "prompt": prompt,
+            "stream": stream,
+            "options": options if options is not None else {"temperature": 0},
+        }
+        if format is not None:
+            data["format"] = format
+        if keep_alive is not None:
+            data["keep_alive"] = keep_alive
+        if context is not None:
+            data["context"] = context
+
+        profiling.count("llm_calls")
+        with profiling.span("ollama.generate", model=model):
+            response_text, metrics, _ = self.__post_generate(data, stream)
+        if metrics.get("eval_count"):
+            profiling.count("llm_tokens", metrics["eval_count"])
+        return response_text, metrics
+
+    def prefill(
+        self,
+        model: str,
+        system: str,
+        prompt: str,
+        options: dict = None,
+        keep_alive=None,
+    ) -> tuple:
+        """Evaluate a prompt once, returns (context tokens, metrics).
+
+        Nothing is generated, so the returned context ends with the prompt
+        and can be continued by any number of generate calls without
+        evaluating the prompt again. The context is empty on HTTP errors.
+        """
+        data = {
+            "model": model,
+            "system": system,
+            "prompt": prompt,
+            "stream": False,
+            "options": {**(options or {"temperature": 0}), "num_predict": 0},
+        }
+        if keep_alive is not None:
+            data["keep_alive"] = keep_alive
+
+        profiling.count("llm_calls")
+        profiling.count("prefills")
+        with profiling.span("ollama.prefill", model=model):
+            _, metrics, final = self.__post_generate(data, False)
+        return final.get("context") or [], metrics
+
+    def __post_generate(self, data: dict, stream: bool) -> tuple:
+        start = time.perf_counter()
+        response = self.__session.post(
+            f"{self.__url}/api/generate", data=json.dumps(data), stream=stream
+        )
+
+        if response.status_code != 200:
+            print(f"Error: {response.status_code}")
+            profiling.count("llm_errors")
+            response.close()
+            return "", {}, {}
+
+        if not stream:
+            final = json.loads(response.text)
+            return final["response"], _metrics(final, start, None), final
+
+        parts = []
+        first_token = None
+        final = {}
+        with response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("response"):
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    parts.append(chunk["response"])
+                if chunk.get("done"):
+                    final = chunk
+        return "".join(parts), _metrics(final, start, first_token), final
+
+
+def _metrics(final: dict, start: float, first_token: float) -> dict:
+    """Latency and token counts of a generation, Ollama durations are in ns"""
+    metrics = {
+        "latency": round(time.perf_counter() - start, 6),
+        "time_to_first_token": (
+            round(first_token - start, 6) if first_token is not None else None
+        ),
+        "prompt_eval_count": final.get("prompt_eval_count"),
+        "eval_count": final.get("eval_count"),
+        "eval_duration": final.get("eval_duration"),
+        "tokens_per_second": None,
+    }
+    if final.get("eval_count") and final.get("eval_duration"):
+        metrics["tokens_per_second"] = round(
+            final["eval_count"] / final["eval_duration"] * 1e9, 2
+        )
+    return metrics
@@ -0,0 +1,252 @@
+import glob
+import json
+import os
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from lib import profiling
+
+EVALUATION_PATH = "data/evaluation"
+
+
+def load_evaluations(evaluation_path: str = EVALUATION_PATH) -> pd.DataFrame:
+    """Load every evaluation_<technique>_<model>.jsonl into a single frame"""
+    frames = []
+
+    for path in sorted(glob.glob(os.path.join(evaluation_path, "evaluation_*.jsonl"))):
+        name = os.path.basename(path).split(".")[0].split("_")
+        with open(path, "r") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        if not rows:
+            continue
+
+        frame = pd.json_normalize(rows)
+        frame["model"] = name[-1]
+        frame["technique"] = "_".join(name[1:-1])
+        # Older evaluations do not store the question, those are in order
+        position = pd.Series(range(len(frame)), index=frame.index) % 9
+        if "question" in frame:
+            frame["question"] = frame["question"].fillna(position)
+        else:
+            frame["question"] = position
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame()
+
+    evaluations = pd.concat(frames, ignore_index=True)
+    evaluations["question"] = evaluations["question"].astype(int)
+    evaluations["correct"] = evaluations["evaluation.is_correct"] == "Yes"
+    evaluations["punctuation"] = pd.to_numeric(
+        evaluations["evaluation.punctuation"], errors="coerce"
+    )
+    evaluations["problematic"] = (
+        evaluations["evaluation.note"].notna()
+        if "evaluation.note" in evaluations
+        else False
+    )
+
+    # Cached generations did not hit the model, their timing is meaningless
+    for column in ("latency", "tokens_per_second"):
+        values = evaluations.get(f"metrics.{column}")
+        if values is None:
+            evaluations[column] = float("nan")
+            continue
+        evaluations[column] = pd.to_numeric(values, errors="coerce")
+        if "metrics.cached" in evaluations:
+            evaluations.loc[evaluations["metrics.cached"].eq(True), column] = None
+
+    return evaluations
+
+
+def aggregate(evaluations: pd.DataFrame) -> pd.DataFrame:
+    """Per model x technique x question aggregates"""
+    return (
+        evaluations.groupby(["model", "technique", "question"])
+        .agg(
+            total=("correct", "size"),
+            correct=("correct", "sum"),
+            problematic_eval=("problematic", "sum"),
+            average_punct=("punctuation", "mean"),
+            latency=("latency", "mean"),
+            tokens_per_second=("tokens_per_second", "mean"),
+        )
+        .reset_index()
+    )
+
+
+def summarize_runs(evaluations: pd.DataFrame, per_question: pd.DataFrame):
+    """Per model x technique totals, accuracy and average punctuation"""
+    per_run = (
+        per_question.groupby(["model", "technique"])
+        .agg(
+            total=("total", "sum"),
+            correct=("correct", "sum"),
+            problematic_eval=("problematic_eval", "sum"),
+        )
+        .reset_index()
+    )
+    per_run["accuracy"] = (per_run["correct"] / per_run["total"] * 100).round(2)
+    # The mean of every evaluation, not of the question means
+    punctuation = (
+        evaluations.groupby(["model", "technique"])["punctuation"]
+        .mean()
+        .round(2)
+        .rename("average_punct")
+        .reset_index()
+    )
+    return per_run.merge(punctuation, on=["model", "technique"], how="left")
+
+
+def generate_full_report(evaluation_path: str = EVALUATION_PATH) -> None:
+    """Report every evaluation run at once, with cross-model comparisons"""
+    evaluations = load_evaluations(evaluation_path)
+    if evaluations.empty:
+        print(f"No evaluation files found in {evaluation_path}")
+        return
+
+    per_question = aggregate(evaluations)
+    per_run = summarize_runs(evaluations, per_question)
+
+    print("----------------")
+    print("General report")
+    print("----------------")
+    print(per_run.to_string(index=False))
+
+    charts_path = os.path.join(evaluation_path, "charts")
+    os.makedirs(charts_path, exist_ok=True)
+    per_question.to_csv(os.path.join(charts_path, "summary.csv"), index=False)
+
+    figures = {}
+
+    for (model, technique), run in per_question.groupby(["model", "technique"]):
+        figures.update(_run_figures(run, model, technique, charts_path))
+
+    per_run["run"] = per_run["technique"].str.replace("_", " ")
+    figures[os.path.join(charts_path, "accuracy_by_model_bar_chart.png")] = px.bar(
+        per_run,
+        x="model",
+        y="accuracy",
+        color="run",
+        barmode="group",
+        title="Correct answers (%) by model and prompting technique",
+    )
+
+    per_question["accuracy"] = per_question["correct"] / per_question["total"] * 100
+    per_question["run"] = per_question["model"] + " " + per_question["technique"]
+    heatmap = per_question.pivot(index="run", columns="question", values="accuracy")
+    figures[os.path.join(charts_path, "accuracy_by_question_heatmap.png")] = go.Figure(
+        data=go.Heatmap(
+            z=heatmap.values,
+            x=[f"Question {i + 1}" for i in heatmap.columns],
+            y=heatmap.index,
+            zmin=0,
+            zmax=100,
+        ),
+        layout=dict(title="Correct answers (%) by question"),
+    )
+
+    speed = (
+        evaluations.groupby(["model", "technique"])[["latency", "tokens_per_second"]]
+        .mean()
+        .dropna(how="all")
+        .reset_index()
+    )
+    if not speed.empty:
+        speed["run"] = speed["technique"].str.replace("_", " ")
+        figures[os.path.join(charts_path, "latency_by_model_bar_chart.png")] = px.bar(
+            speed,
+            x="model",
+            y="latency",
+            color="run",
+            barmode="group",
+            title="Average generation latency (s) by model and prompting technique",
+        )
+        figures[os.path.join(charts_path, "throughput_by_model_bar_chart.png")] = (
+            px.bar(
+                speed,
+                x="model",
+                y="tokens_per_second",
+                color="run",
+                barmode="group",
+                title="Average throughput (tokens/s) by model and prompting technique",
+            )
+        )
+
+    _write_images(figures)
+    print(f"{len(figures)} charts written to {charts_path}")
+
+
+def _run_figures(run: pd.DataFrame, model: str, technique: str, charts_path: str):
+    """The charts of a single evaluation run, as LLM_Evaluator.generate_report.
+
+    They go in the folder of its charts, named full_report_<chart>.png so
+    they do not overwrite them.
+    """
+    path = os.path.join(charts_path, model, technique)
+    os.makedirs(path, exist_ok=True)
+
+    name = f"{technique.replace('_', ' ')} {model}"
+    questions = [f"Question {i + 1}" for i in run["question"]]
+    total = run["total"].sum()
+    correct = run["correct"].sum()
+    problematic = run["problematic_eval"].sum()
+
+    figures = {
+        os.path.join(path, "full_report_correct_incorrect_pie_chart.png"): px.pie(
+            values=[correct, total - correct - problematic, problematic],
+            names=["Correct", "Incorrect", "Problematic evaluations"],
+            title=f"Correct and incorrect answers: {name}",
+        ),
+        os.path.join(path, "full_report_correct_incorrect_bar_chart.png"): go.Figure(
+            data=[
+                go.Bar(name="Correct", x=questions, y=run["correct"]),
+                go.Bar(name="Incorrect", x=questions, y=run["total"] - run["correct"]),
+            ],
+            layout=dict(
+                barmode="group",
+                title=f"Correct and incorrect answers by question: {name}",
+            ),
+        ),
+        os.path.join(path, "full_report_total_punctuation_radar_chart.png"): go.Figure(
+            data=[
+                go.Scatterpolar(
+                    r=run["average_punct"],
+                    theta=questions,
+                    fill="toself",
+                    name="Total punctuation",
+                )
+            ],
+            layout=dict(
+                polar=dict(radialaxis=dict(visible=True, range=[0, 100])),
+                showlegend=False,
+                title=f"Total punctuation by question: {name}",
+            ),
+        ),
+    }
+
+    if run["latency"].notna().any():
+        figures[os.path.join(path, "full_report_latency_bar_chart.png")] = go.Figure(
+            data=[go.Bar(x=questions, y=run["latency"])],
+            layout=dict(
+                yaxis_title="Seconds",
+                title=f"Average generation latency by question: {name}",
+            ),
+        )
+
+    return figures
+
+
+def _write_images(figures: dict) -> None:
+    """Export all the figures reusing a single kaleido session"""
+    profiling.count("charts", len(figures))
+    with profiling.span("chart_export", charts=len(figures)):
+        if hasattr(pio, "write_images"):
+            pio.write_images(list(figures.values()), list(figures.keys()))
+        else:
+            # Older plotly keeps the kaleido process alive between calls
+            for path, figure in figures.items():
+                figure.write_image(path)
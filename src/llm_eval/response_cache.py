@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+RESPONSE_CACHE_PATH = os.path.join(os.getcwd(), "data/cache/responses.sqlite")
+
+# Part of every key, bumped when the stored value changes so older entries
+# are never read. Version 2 stores {"response", "metrics"} instead of the text
+CACHE_VERSION = 2
+
+
+class ResponseCache:
+    """SQLite store of Ollama completions.
+
+    All the generations use temperature 0, so the same payload sent to the
+    same model weights (identified by the model digest) gives the same answer
+    and can be served from disk. Entries are evicted least recently used
+    first once the stored responses exceed `max_size` bytes.
+    """
+
+    def __init__(
+        self,
+        cache_path: str = RESPONSE_CACHE_PATH,
+        max_size: int = 256 * 1024 * 1024,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.__max_size = max_size
+        self.__lock = threading.Lock()
+        self.__connection = None
+
+        if self.enabled:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            # Shared by the generation threads, access is serialized with the lock
+            self.__connection = sqlite3.connect(
+                cache_path, check_same_thread=False, isolation_level=None
+            )
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used "
+                "ON responses (last_used)"
+            )
+
+    def key(self, payload: dict, model_digest: str) -> str:
+        canonical = json.dumps([CACHE_VERSION, payload, model_digest], sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.__connection.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, response) -> None:
+        if not self.enabled:
+            return
+
+        value = json.dumps(response)
+        with self.__lock:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+
+    def evict(self) -> None:
+        """Delete the least recently used responses until max_size is respected"""
+        if not self.enabled:
+            return
+
+        with self.__lock:
+            total_size = self.__connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+            if total_size <= self.__max_size:
+                return
+
+            to_delete = []
+            for key, size in self.__connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_used"
+            ):
+                if total_size <= self.__max_size:
+                    break
+                to_delete.append((key,))
+                total_size -= size
+            self.__connection.executemany(
+                "DELETE FROM responses WHERE key = ?", to_delete
+            )
+
+    def close(self) -> None:
+        if self.__connection is not None:
+            self.evict()
+            self.__connection.close()
+            self.__connection = None
@@ -0,0 +1,95 @@
+import json
+import os
+
+# Ways of answering the questions of a capture
+INFERENCE_MODES = ["independent", "context", "batched"]
+
+ANSWERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "answers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "integer"},
+                    "answer": {"type": "string"},
+                },
+                "required": ["question", "answer"],
+            },
+        }
+    },
+    "required": ["answers"],
+}
+
+
+def capture_groups(rows):
+    """Group consecutive dataset rows of the same capture, rows without id alone"""
+    group, capture = [], None
+    for row in rows:
+        row_capture = row["id"].rsplit("#", 1)[0] if row.get("id") else None
+        if group and (row_capture is None or row_capture != capture):
+            yield group
+            group = []
+        group.append(row)
+        capture = row_capture
+    if group:
+        yield group
+
+
+def shared_prompts(rows: list) -> tuple:
+    """Split the prompts of a capture into their shared prefix and the rest.
+
+    Rows read with their prompt "parts" are asked with the capture table
+    first, so the whole table is shared even by few-shot prompts, which
+    start with an example of their own question. Without parts only zero
+    shot prompts can be split, they differ in the question line alone.
+    """
+    if all("parts" in row for row in rows):
+        questions = [
+            (
+                f"{row['parts']['example']}\nQ: {row['parts']['question']}"
+                if row["parts"]["example"]
+                else f"Q: {row['parts']['question']}"
+            )
+            for row in rows
+        ]
+        return f"\n{rows[0]['parts']['table']}\n", questions
+
+    prompts = [row["prompt"] for row in rows]
+    common = os.path.commonprefix(prompts)
+    end = common.rfind("\n") + 1
+    questions = [prompt[end:] for prompt in prompts]
+    if any("\n" in question for question in questions):
+        raise ValueError(
+            "Few-shot prompts only share their capture table in a SQLite dataset, "
+            "answer this one with independent inference"
+        )
+    return prompts[0][:end], questions
+
+
+def batched_prompt(prefix: str, questions: list) -> str:
+    """One prompt asking all the questions after their shared prefix"""
+    numbered = "\n\n".join(
+        f"Question {i}:\n{question}" for i, question in enumerate(questions)
+    )
+    return f"{prefix}Answer each of these {len(questions)} questions:\n\n{numbered}"
+
+
+def parse_answers(output_text: str, size: int) -> dict:
+    """Answers of a batched_prompt reply by question number, invalid ones left out"""
+    try:
+        answers = json.loads(output_text)["answers"]
+    except (ValueError, TypeError, KeyError):
+        return {}
+
+    parsed = {}
+    for answer in answers if isinstance(answers, list) else []:
+        try:
+            index = int(answer["question"])
+            text = answer["answer"]
+        except (ValueError, TypeError, KeyError):
+            continue
+        if 0 <= index < size and isinstance(text, str) and text.strip():
+            parsed[index] = text
+    return parsed
@@ -1,12 +1,30 @@
+import json
 import os
+import tempfile
 
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from lib import profiling
+from lib.concurrency import ordered_map
+
+RAW_PATH = os.path.join(os.getcwd(), "data/raw/")
+
+# Validators of every downloaded capture, used for conditional requests
+MANIFEST_FILE = ".manifest.json"
 
 
 class Scraper:
-    def __init__(self):
+    def __init__(self, workers: int = 8):
         self.download_urls = self.__get_download_urls()
+        self.__workers = workers
+
+        # Downloads get the mode open() would give them, mkstemp uses 0600.
+        # The umask can only be read by setting it, before the download threads
+        umask = os.umask(0)
+        os.umask(umask)
+        self.__file_mode = 0o666 & ~umask
 
     def __get_download_urls(self):
         response = requests.get("https://wiki.wireshark.org/SampleCaptures")
@@ -34,16 +52,93 @@ class Scraper:
 
         return capture_downloads
 
-    def download_captures(self):
-        if not os.path.exists(os.path.join(os.getcwd(), "data/raw/")):
-            os.makedirs(os.path.join(os.getcwd(), "data/raw/"))
+    def download_captures(self, output_path: str = RAW_PATH):
+        os.makedirs(output_path, exist_ok=True)
+
+        manifest = self.__load_manifest(output_path)
+
+        # One session shared by the workers so connections to the wiki are reused
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(self.__workers, 1))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        try:
+            for download, entry in ordered_map(
+                lambda download: (
+                    download,
+                    self.__download(
+                        session, download, output_path, manifest.get(download)
+                    ),
+                ),
+                self.download_urls,
+                self.__workers,
+            ):
+                if entry:
+                    manifest[download] = entry
+        finally:
+            session.close()
+            self.__save_manifest(output_path, manifest)
+
+    def __download(self, session, download: str, output_path: str, entry: dict):
+        """Download a capture unless the copy on disk is still current.
+
+        Returns the manifest entry of the capture, the previous one when the
+        download fails.
+        """
+        filename = download.split("/")[-1]
+        path = os.path.join(output_path, filename)
+
+        headers = {}
+        if entry and os.path.exists(path) and os.path.getsize(path) == entry["size"]:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            with profiling.span("download", file=filename), session.get(
+                download, headers=headers, stream=True, timeout=60
+            ) as response:
+                if response.status_code == 304:
+                    print(f"{filename} is up to date")
+                    return entry
+                response.raise_for_status()
 
-        for download in self.download_urls:
-            try:
-                response = requests.get(download)
-                filename = download.split("/")[-1]
                 print("Downloading " + filename)
-                with open(os.path.join(os.getcwd(), "data/raw/", filename), "wb") as f:
-                    f.write(response.content)
-            except Exception as e:
-                print(f"Error downloading {download}. ERROR: {e}")
+                # Stream to a temporary file, a failed download never leaves a partial capture
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=output_path, prefix=f".{filename}.", suffix=".part"
+                )
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        for chunk in response.iter_content(chunk_size=1024 * 1024):
+                            f.write(chunk)
+                            profiling.count("bytes_downloaded", len(chunk))
+                    os.chmod(tmp_path, self.__file_mode)
+                    os.replace(tmp_path, path)
+                except Exception:
+                    os.unlink(tmp_path)
+                    raise
+
+                return {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "size": os.path.getsize(path),
+                }
+        except Exception as e:
+            print(f"Error downloading {download}. ERROR: {e}")
+            return entry
+
+    def __load_manifest(self, output_path: str) -> dict:
+        try:
+            with open(os.path.join(output_path, MANIFEST_FILE), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def __save_manifest(self, output_path: str, manifest: dict) -> None:
+        tmp_path = os.path.join(output_path, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(output_path, MANIFEST_FILE))
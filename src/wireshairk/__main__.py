@@ -1,39 +1,126 @@
+import json
 import os
+import sys
 
 import click
 
-from dataset.dataset import Dataset
-from lib.clean_raw_data import clean_raw_data
-from llm_eval.llm_eval import LLM_Evaluator
-from scraper.scraper import Scraper
+from lib import profiling
+from llm_eval import OLLAMA_URL
+from llm_eval.shared_prefix import INFERENCE_MODES
+
+# Every command imports its own dependencies when it runs, so starting the CLI
+# or asking for --help does not pay for pyshark, plotly or pandas.
 
 
 @click.group()
-def wireshairk():
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Time every stage of the command and print a summary at exit",
+)
+@click.option(
+    "--profile_output",
+    default="data/profile.jsonl",
+    show_default=True,
+    help="Where the spans are written, as a Chrome trace if the file ends in .json",
+)
+@click.pass_context
+def wireshairk(ctx, profile, profile_output):
     click.echo("--------------------")
     click.echo("     Wireshairk")
     click.echo("--------------------")
 
+    if profile:
+        profiler = profiling.enable()
+        command_span = profiler.span(ctx.invoked_subcommand or "wireshairk")
+        command_span.__enter__()
+
+        def report():
+            command_span.__exit__(None, None, None)
+            profiler.export(profile_output)
+            click.echo(profiler.summary())
+            click.echo(f"Profile written to {profile_output}")
+
+        ctx.call_on_close(report)
+
 
 @wireshairk.command()
-def scrape():
+@click.option(
+    "--workers", default=8, show_default=True, help="Number of parallel downloads"
+)
+def scrape(workers):
+    from scraper.scraper import Scraper
+
     click.echo("Scraping")
-    scraper = Scraper()
+    scraper = Scraper(workers=workers)
     scraper.download_captures()
 
 
 @wireshairk.command()
-def clean_raw():
+@click.option(
+    "--min_packets",
+    default=1,
+    show_default=True,
+    help="Captures with fewer packets are skipped",
+)
+@click.option(
+    "--max_packets",
+    default=125,
+    show_default=True,
+    help="Captures with more packets are skipped",
+)
+@click.option(
+    "--workers",
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="Number of processes used to count the packets",
+)
+def clean_raw(min_packets, max_packets, workers):
+    from lib.clean_raw_data import clean_raw_data
+
     click.echo("Cleaning raw data")
-    clean_raw_data()
+    failures = clean_raw_data(
+        min_packets=min_packets, max_packets=max_packets, workers=workers
+    )
+    if failures:
+        raise click.ClickException(f"{len(failures)} captures could not be cleaned")
 
 
 @wireshairk.command()
-def scrape_and_clean():
+@click.option(
+    "--workers", default=8, show_default=True, help="Number of parallel downloads"
+)
+@click.option(
+    "--min_packets",
+    default=1,
+    show_default=True,
+    help="Captures with fewer packets are skipped",
+)
+@click.option(
+    "--max_packets",
+    default=125,
+    show_default=True,
+    help="Captures with more packets are skipped",
+)
+@click.option(
+    "--clean_workers",
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="Number of processes used to count the packets",
+)
+def scrape_and_clean(workers, min_packets, max_packets, clean_workers):
+    from lib.clean_raw_data import clean_raw_data
+    from scraper.scraper import Scraper
+
     click.echo("Scraping and cleaning raw data")
-    scraper = Scraper()
+    scraper = Scraper(workers=workers)
     scraper.download_captures()
-    clean_raw_data()
+    failures = clean_raw_data(
+        min_packets=min_packets, max_packets=max_packets, workers=clean_workers
+    )
+    if failures:
+        raise click.ClickException(f"{len(failures)} captures could not be cleaned")
 
 
 @wireshairk.command()
@@ -54,9 +141,191 @@ def scrape_and_clean():
     default=False,
     help="Generate chain-of-thought dataset",
 )
-def generate_dataset(data_path, zero_shot, one_shot, chain_of_thought):
+@click.option(
+    "--cache_path", default="data/cache/", help="Path to the capture cache folder"
+)
+@click.option(
+    "--cache_max_size",
+    default=1024,
+    show_default=True,
+    help="Maximum size of the capture cache in MB",
+)
+@click.option(
+    "--no_cache", is_flag=True, default=False, help="Do not use the capture cache"
+)
+@click.option(
+    "--rebuild",
+    is_flag=True,
+    default=False,
+    help="Recompute every capture and refresh its cache entry",
+)
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    help="Number of processes used to analyze the captures",
+)
+@click.option(
+    "--encoding",
+    type=click.Choice(["full", "compact"]),
+    default="full",
+    show_default=True,
+    help="Render captures as the tshark table or with host aliases and fewer columns",
+)
+@click.option(
+    "--time_format",
+    type=click.Choice(["relative", "delta"]),
+    default="relative",
+    show_default=True,
+    help="Time column of the compact encoding",
+)
+@click.option(
+    "--time_precision",
+    default=6,
+    show_default=True,
+    help="Decimals of the time column of the compact encoding",
+)
+@click.option(
+    "--columns",
+    default=None,
+    help="Comma separated columns of the compact encoding (default: all but Info)",
+)
+@click.option(
+    "--max_prompt_tokens",
+    default=None,
+    type=int,
+    help="Skip captures whose prompts exceed this estimated number of tokens",
+)
+@click.option(
+    "--windowed",
+    is_flag=True,
+    default=False,
+    help="Summarize captures larger than --window_above window by window",
+)
+@click.option(
+    "--window_above",
+    default=125,
+    show_default=True,
+    help="Captures with more packets are summarized in windows",
+)
+@click.option(
+    "--window_size", default=1000, show_default=True, help="Packets per window"
+)
+@click.option(
+    "--window_duration",
+    default=None,
+    type=float,
+    help="Seconds per window, instead of a fixed number of packets",
+)
+@click.option(
+    "--window_rows",
+    default=32,
+    show_default=True,
+    help="Maximum rows of the window table, consecutive windows are merged",
+)
+@click.option(
+    "--window_model",
+    default=None,
+    help="Model used to summarize every window and reduce the summaries",
+)
+@click.option("--ollama_url", default=OLLAMA_URL, help="URL of the Ollama API")
+@click.option(
+    "--concurrency",
+    default=1,
+    show_default=True,
+    help="Number of windows summarized at the same time",
+)
+@click.option(
+    "--approximate",
+    is_flag=True,
+    default=False,
+    help="Estimate the unique communicators and top talker in bounded memory",
+)
+@click.option(
+    "--distinct_error",
+    default=0.01,
+    show_default=True,
+    help="Relative error of the unique communicators estimate",
+)
+@click.option(
+    "--top_error",
+    default=0.001,
+    show_default=True,
+    help="Top talker count error, as a fraction of the IP packets",
+)
+@click.option(
+    "--output_format",
+    type=click.Choice(["sqlite", "jsonl"]),
+    default="sqlite",
+    show_default=True,
+    help="Store every capture table once, or write the full prompt of every question",
+)
+def generate_dataset(
+    data_path,
+    zero_shot,
+    one_shot,
+    chain_of_thought,
+    cache_path,
+    cache_max_size,
+    no_cache,
+    rebuild,
+    workers,
+    encoding,
+    time_format,
+    time_precision,
+    columns,
+    max_prompt_tokens,
+    windowed,
+    window_above,
+    window_size,
+    window_duration,
+    window_rows,
+    window_model,
+    ollama_url,
+    concurrency,
+    approximate,
+    distinct_error,
+    top_error,
+    output_format,
+):
+    from dataset.cache import CaptureCache
+    from dataset.dataset import Dataset
+    from dataset.encoding import CaptureEncoding
+    from dataset.windowed import CaptureWindows
+
     click.echo("Generating dataset")
-    dataset = Dataset(os.path.join(os.getcwd(), data_path))
+    try:
+        capture_encoding = CaptureEncoding(
+            compact=encoding == "compact",
+            time_format=time_format,
+            time_precision=time_precision,
+            columns=columns.split(",") if columns else None,
+        )
+        capture_windows = None
+        if windowed:
+            capture_windows = CaptureWindows(
+                size=window_size,
+                duration=window_duration,
+                max_packets=window_above,
+                rows=window_rows,
+                model=window_model,
+                ollama_url=ollama_url,
+                concurrency=concurrency,
+            )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    dataset = Dataset(
+        os.path.join(os.getcwd(), data_path),
+        encoding=capture_encoding,
+        windows=capture_windows,
+        stats_options=_stats_options(approximate, distinct_error, top_error),
+    )
+    cache = CaptureCache(
+        cache_path=os.path.join(os.getcwd(), cache_path),
+        max_size=cache_max_size * 1024 * 1024,
+        enabled=not no_cache,
+        rebuild=rebuild,
+    )
     capture_example = "No.|Time|Source|Destination|Protocol|Length|Port src.|Port dst.|Info\n 1 | 0.000000 | 145.254.160.237 | 65.208.228.223 | TCP | 62 | 3372 -> 80 [SYN] Seq=0 Win=8760 Len=0 MSS=1460 SACK_PERM\n2 | 0.911310 | 65.208.228.223 | 145.254.160.237 | TCP | 62 | 80 -> 3372 [SYN, ACK] Seq=0 Ack=1 Win=5840 Len=0 MSS=1380 SACK_PERM\n3 | 0.911310 | 145.254.160.237 | 65.208.228.223 | TCP | 54 | 3372 -> 80 [ACK] Seq=1 Ack=1 Win=9660 Len=0\n4 | 0.911310 | 145.254.160.237 | 65.208.228.223 | HTTP | 533 | GET /download.html HTTP/1.1\n5 | 1.472116 | 145.254.160.237 | 145.253.2.203 | DNS | 89 Standard query 0x0023 A pagead2.googlesyndication.com"
     questions = dataset.get_questions()
 
@@ -64,7 +333,7 @@ def generate_dataset(data_path, zero_shot, one_shot, chain_of_thought):
         click.echo("##############################")
         click.echo("Generating one shot dataset")
         click.echo("##############################")
-        dataset.generate_dataset(
+        failures = dataset.generate_dataset(
             "one_shot",
             [
                 f"{capture_example}\nQ: {questions[0]}\nA: In the capture there are a total of 5 packets",
@@ -77,12 +346,16 @@ def generate_dataset(data_path, zero_shot, one_shot, chain_of_thought):
                 f"{capture_example}\nQ: {questions[7]}\nA: The average of packets sent per second is 3.39.",
                 f"{capture_example}\nQ: {questions[8]}\nA: The average bytes/s sent in the communication is 543.43 bytes per second.",
             ],
+            cache=cache,
+            workers=workers,
+            max_prompt_tokens=max_prompt_tokens,
+            output_format=output_format,
         )
     elif chain_of_thought:
         click.echo("##############################")
         click.echo("Generating Chain-of-Thought dataset")
         click.echo("##############################")
-        dataset.generate_dataset(
+        failures = dataset.generate_dataset(
             "chain_of_thought",
             [
                 f"{capture_example}\nQ: {questions[0]}\nA: The last row of the capture No column is 5. So the total number of packets in the trace is 5",
@@ -95,31 +368,128 @@ def generate_dataset(data_path, zero_shot, one_shot, chain_of_thought):
                 f"{capture_example}\nQ: {questions[7]}\nA: The last packet has a time of 1.472116 seconds and the first packet has a time of 0.000000 seconds. So the communication lasts 1.472116-0.000000=1.472116 seconds. The total number of packets in the trace is 5. So the average of packets sent per second is (5)packets/(1.472116)seconds=(3.39)packets per second.",
                 f"{capture_example}\nQ: {questions[8]}\nA: The last packet has a time of 1.472116 seconds and the first packet has a time of 0.000000 seconds. So the communication lasts 1.472116-0.000000=1.472116 seconds. The total size of transmitted bytes is 62+62+54+533+89=800 bytes. So the average bytes per second sent in the communication is (800)bytes/(1.472116)seconds=(543.43)bytes/second",
             ],
+            cache=cache,
+            workers=workers,
+            max_prompt_tokens=max_prompt_tokens,
+            output_format=output_format,
         )
     else:
         click.echo("##############################")
         click.echo("Generating zero shot dataset")
         click.echo("##############################")
-        dataset.generate_dataset(
+        failures = dataset.generate_dataset(
             "zero_shot",
             10 * [""],
+            cache=cache,
+            workers=workers,
+            max_prompt_tokens=max_prompt_tokens,
+            output_format=output_format,
         )
 
+    if failures:
+        raise click.ClickException(
+            f"{len(failures)} captures were left out of the dataset"
+        )
+
+
+@wireshairk.command()
+@click.argument("dataset_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--output",
+    default=None,
+    help="JSONL file to write, by default next to the dataset",
+)
+def export_dataset(dataset_path, output):
+    """Write a SQLite dataset as JSONL, with the full prompt of every question"""
+    from dataset.storage import DatasetStore
+
+    output = output or os.path.splitext(dataset_path)[0] + ".jsonl"
+    store = DatasetStore(dataset_path)
+    try:
+        rows = store.export_jsonl(output)
+    finally:
+        store.close()
+    click.echo(f"{rows} rows written to {output}")
+
 
 @wireshairk.command()
 @click.option("--model", default="llama2", help="Model to evaluate")
 @click.option(
-    "--dataset_path", default="data/zero_shot/dataset.jsonl", help="Path to the dataset"
+    "--dataset_path",
+    default=None,
+    help="Path to the dataset (default: data/zero_shot/dataset.sqlite, or the .jsonl one)",
 )
 @click.option(
     "--output_path",
     default="data/evaluation/generated_output_llama2.jsonl",
     help="Path to the generated output file",
 )
-def answer_questions(model, dataset_path, output_path):
+@click.option(
+    "--concurrency",
+    default=1,
+    show_default=True,
+    help="Maximum number of generation requests in flight",
+)
+@click.option("--ollama_url", default=OLLAMA_URL, help="URL of the Ollama API")
+@click.option(
+    "--resume/--restart",
+    default=True,
+    show_default=True,
+    help="Skip the work already in the output file or start it from scratch",
+)
+@click.option(
+    "--no_cache", is_flag=True, default=False, help="Do not use the response cache"
+)
+@click.option(
+    "--cache_path",
+    default="data/cache/responses.sqlite",
+    help="Path to the response cache database",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Stream the generations to measure the time to first token",
+)
+@click.option(
+    "--inference",
+    type=click.Choice(INFERENCE_MODES),
+    default="independent",
+    show_default=True,
+    help="Ask every question on its own, continue the prefilled capture prefix (context) or ask all the questions of a capture at once (batched)",
+)
+def answer_questions(
+    model,
+    dataset_path,
+    output_path,
+    concurrency,
+    ollama_url,
+    resume,
+    no_cache,
+    cache_path,
+    stream,
+    inference,
+):
+    from llm_eval.llm_eval import LLM_Evaluator
+    from llm_eval.response_cache import ResponseCache
+
     click.echo(f"Answering questions for model: {model}")
-    evaluator = LLM_Evaluator(model_to_eval=model, dataset_path=dataset_path)
-    evaluator.answer_questions(output_path=output_path)
+    response_cache = ResponseCache(cache_path=cache_path, enabled=not no_cache)
+    evaluator = LLM_Evaluator(
+        model_to_eval=model,
+        dataset_path=dataset_path,
+        ollama_url=ollama_url,
+        concurrency=concurrency,
+        response_cache=response_cache,
+        stream=stream,
+        inference=inference,
+    )
+    try:
+        evaluator.answer_questions(output_path=output_path, resume=resume)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        response_cache.close()
 
 
 @wireshairk.command()
@@ -128,24 +498,627 @@ def answer_questions(model, dataset_path, output_path):
     default="data/evaluation/generated_output_llama2.jsonl",
     help="Path to the generated output file",
 )
-def evaluate(generated_output):
+@click.option(
+    "--concurrency",
+    default=1,
+    show_default=True,
+    help="Maximum number of judge requests in flight",
+)
+@click.option("--ollama_url", default=OLLAMA_URL, help="URL of the Ollama API")
+@click.option(
+    "--resume/--restart",
+    default=True,
+    show_default=True,
+    help="Skip the work already in the output file or start it from scratch",
+)
+@click.option(
+    "--no_cache", is_flag=True, default=False, help="Do not use the response cache"
+)
+@click.option(
+    "--cache_path",
+    default="data/cache/responses.sqlite",
+    help="Path to the response cache database",
+)
+@click.option(
+    "--no_grader",
+    is_flag=True,
+    default=False,
+    help="Send every answer to the judge model instead of grading by rules first",
+)
+@click.option(
+    "--tolerance",
+    default=0.01,
+    show_default=True,
+    help="Relative tolerance of the rule grader for the decimal answers",
+)
+@click.option(
+    "--judge_batch",
+    default=8,
+    show_default=True,
+    help="Answers graded per judge call, 0 for the one answer free-form judge prompt",
+)
+def evaluate(
+    generated_output,
+    concurrency,
+    ollama_url,
+    resume,
+    no_cache,
+    cache_path,
+    no_grader,
+    tolerance,
+    judge_batch,
+):
+    from llm_eval.grader import Grader
+    from llm_eval.llm_eval import LLM_Evaluator
+    from llm_eval.response_cache import ResponseCache
+
     click.echo("Generating report")
     # Extract the name of evaluated model from the generated_output path
     model = generated_output.split("/")[-1].split("_")[-1].split(".")[0]
-    evaluator = LLM_Evaluator(model_to_eval=model)
-    evaluator.evaluate_model(generated_output_path=generated_output)
+    response_cache = ResponseCache(cache_path=cache_path, enabled=not no_cache)
+    evaluator = LLM_Evaluator(
+        model_to_eval=model,
+        ollama_url=ollama_url,
+        concurrency=concurrency,
+        response_cache=response_cache,
+        grader=None if no_grader else Grader(relative_tolerance=tolerance),
+        judge_batch=judge_batch,
+    )
+    evaluator.evaluate_model(generated_output_path=generated_output, resume=resume)
+    response_cache.close()
+
+
+@wireshairk.command()
+@click.option(
+    "--models",
+    default="llama2,mistral",
+    show_default=True,
+    help="Comma separated models to evaluate",
+)
+@click.option(
+    "--techniques",
+    default="zero_shot,one_shot,chain_of_thought",
+    show_default=True,
+    help="Comma separated prompting techniques, each one reads data/<technique>/dataset.sqlite, or data/<technique>/dataset.jsonl when there is no SQLite dataset",
+)
+@click.option("--evaluator_model", default="llama3", show_default=True)
+@click.option(
+    "--keep_alive",
+    default="30m",
+    show_default=True,
+    help="How long Ollama keeps a model loaded between the calls of its phase",
+)
+@click.option(
+    "--concurrency",
+    default=1,
+    show_default=True,
+    help="Maximum number of requests in flight",
+)
+@click.option("--ollama_url", default=OLLAMA_URL, help="URL of the Ollama API")
+@click.option(
+    "--resume/--restart",
+    default=True,
+    show_default=True,
+    help="Skip the work already in the output files or start it from scratch",
+)
+@click.option(
+    "--no_cache", is_flag=True, default=False, help="Do not use the response cache"
+)
+@click.option(
+    "--cache_path",
+    default="data/cache/responses.sqlite",
+    help="Path to the response cache database",
+)
+@click.option(
+    "--no_grader",
+    is_flag=True,
+    default=False,
+    help="Send every answer to the judge model instead of grading by rules first",
+)
+@click.option(
+    "--judge_batch",
+    default=8,
+    show_default=True,
+    help="Answers graded per judge call, 0 for the one answer free-form judge prompt",
+)
+@click.option(
+    "--report/--no_report",
+    default=True,
+    show_default=True,
+    help="Generate the report of every run at the end",
+)
+@click.option(
+    "--inference",
+    type=click.Choice(INFERENCE_MODES),
+    default="independent",
+    show_default=True,
+    help="Ask every question on its own, continue the prefilled capture prefix (context) or ask all the questions of a capture at once (batched)",
+)
+def run_matrix(
+    models,
+    techniques,
+    evaluator_model,
+    keep_alive,
+    concurrency,
+    ollama_url,
+    resume,
+    no_cache,
+    cache_path,
+    no_grader,
+    judge_batch,
+    report,
+    inference,
+):
+    """Answer, evaluate and report every model x technique in one run"""
+    from llm_eval.grader import Grader
+    from llm_eval.matrix import run_matrix as evaluation_matrix
+    from llm_eval.response_cache import ResponseCache
+
+    models = [model for model in models.split(",") if model]
+    techniques = [technique for technique in techniques.split(",") if technique]
+    click.echo(f"Running {len(models)} models x {len(techniques)} techniques")
+    response_cache = ResponseCache(cache_path=cache_path, enabled=not no_cache)
+    try:
+        evaluation_matrix(
+            models,
+            techniques,
+            evaluator_model=evaluator_model,
+            keep_alive=_duration(keep_alive),
+            ollama_url=ollama_url,
+            concurrency=concurrency,
+            response_cache=response_cache,
+            resume=resume,
+            grader=None if no_grader else Grader(),
+            judge_batch=judge_batch,
+            report=report,
+            inference=inference,
+        )
+    except (ValueError, ConnectionError) as e:
+        # ConnectionError when Ollama is not running and nobody can start it
+        raise click.ClickException(str(e))
+    finally:
+        response_cache.close()
+
+
+@wireshairk.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=11434, show_default=True)
+@click.option(
+    "--latency",
+    default="constant:0.05",
+    show_default=True,
+    help="Latency of every request: constant:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA",
+)
+@click.option("--tokens_per_second", default=100.0, show_default=True)
+@click.option("--prompt_tokens_per_second", default=20000.0, show_default=True)
+@click.option(
+    "--error_rate",
+    default=0.0,
+    show_default=True,
+    help="Share of the generate requests failing with an HTTP 500",
+)
+@click.option(
+    "--judge_replies",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="File with the replies of the judge, one per line, given in turn",
+)
+def mock_ollama(
+    host,
+    port,
+    latency,
+    tokens_per_second,
+    prompt_tokens_per_second,
+    error_rate,
+    judge_replies,
+):
+    """Serve a stand-in of the Ollama API that needs no model"""
+    try:
+        mock = _mock_ollama(
+            latency,
+            tokens_per_second,
+            prompt_tokens_per_second,
+            error_rate,
+            judge_replies,
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    click.echo(f"Mock Ollama listening on http://{host}:{port}")
+    mock.serve_forever(host, port)
+
+
+@wireshairk.command()
+@click.option(
+    "--ollama_url",
+    default=None,
+    help="Ollama API to load, by default a mock server started for the test",
+)
+@click.option(
+    "--concurrency",
+    default="1,4,8",
+    show_default=True,
+    help="Comma separated concurrencies to test",
+)
+@click.option(
+    "--stages",
+    default="answer,evaluate",
+    show_default=True,
+    help="Comma separated stages: answer, evaluate",
+)
+@click.option(
+    "--dataset_path",
+    default=None,
+    help="Dataset to answer, by default a synthetic one",
+)
+@click.option("--captures", default=20, show_default=True)
+@click.option("--packets", default=125, show_default=True)
+@click.option("--repeat", default=1, show_default=True, help="Runs of every stage")
+@click.option(
+    "--cache",
+    is_flag=True,
+    default=False,
+    help="Share a response cache between the repeated runs",
+)
+@click.option(
+    "--inference",
+    type=click.Choice(INFERENCE_MODES),
+    default="independent",
+    show_default=True,
+)
+@click.option("--judge_batch", default=8, show_default=True)
+@click.option("--no_grader", is_flag=True, default=False)
+@click.option(
+    "--latency",
+    default="lognormal:0.05,0.5",
+    show_default=True,
+    help="Latency distribution of the mock server",
+)
+@click.option("--tokens_per_second", default=100.0, show_default=True)
+@click.option("--prompt_tokens_per_second", default=20000.0, show_default=True)
+@click.option("--error_rate", default=0.0, show_default=True)
+@click.option(
+    "--judge_replies",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Replies of the mock judge, one per line",
+)
+@click.option("--output", default=None, help="JSON file to write the results to")
+def load_test(
+    ollama_url,
+    concurrency,
+    stages,
+    dataset_path,
+    captures,
+    packets,
+    repeat,
+    cache,
+    inference,
+    judge_batch,
+    no_grader,
+    latency,
+    tokens_per_second,
+    prompt_tokens_per_second,
+    error_rate,
+    judge_replies,
+    output,
+):
+    """Measure the throughput and latency of the evaluation pipeline"""
+    from llm_eval.grader import Grader
+    from llm_eval.load_test import STAGES, format_results, run_load_test
+
+    stages = [stage for stage in stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise click.BadParameter(f"Unknown stages {', '.join(sorted(unknown))}")
+
+    mock = None
+    if ollama_url is None:
+        try:
+            mock = _mock_ollama(
+                latency,
+                tokens_per_second,
+                prompt_tokens_per_second,
+                error_rate,
+                judge_replies,
+            )
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+        ollama_url = mock.start()
+        click.echo(f"Mock Ollama listening on {ollama_url}")
+
+    try:
+        results = run_load_test(
+            ollama_url,
+            [int(value) for value in concurrency.split(",")],
+            stages=stages,
+            dataset_path=dataset_path,
+            captures=captures,
+            packets=packets,
+            repeat=repeat,
+            cache=cache,
+            inference=inference,
+            judge_batch=judge_batch,
+            grader=None if no_grader else Grader(),
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    click.echo(format_results(results))
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        click.echo(f"Results written to {output}")
 
 
 @wireshairk.command()
 @click.option(
     "--evaluation_input", default="data/evaluation/generated_output_llama2.jsonl"
 )
-def generate_report(evaluation_input):
+@click.option(
+    "--all",
+    "all_runs",
+    is_flag=True,
+    default=False,
+    help="Report every evaluation_*.jsonl file of the evaluation folder at once",
+)
+@click.option(
+    "--evaluation_path",
+    default="data/evaluation",
+    help="Folder with the evaluation files, used with --all",
+)
+def generate_report(evaluation_input, all_runs, evaluation_path):
+    from llm_eval.llm_eval import LLM_Evaluator
+    from llm_eval.report import generate_full_report
+
+    if all_runs:
+        click.echo(f"Generating report for all the runs in: {evaluation_path}")
+        generate_full_report(evaluation_path)
+        return
+
     model = evaluation_input.split("/")[-1].split("_")[-1].split(".")[0]
     click.echo(f"Generating report for model: {model}")
     evaluator = LLM_Evaluator(model_to_eval=model)
     evaluator.generate_report(evaluation_input)
 
 
+@wireshairk.command()
+@click.argument("capture")
+@click.option(
+    "--split",
+    default=None,
+    type=int,
+    help="Split the capture with editcap in chunks of this many packets, counted in parallel",
+)
+@click.option(
+    "--workers",
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="Number of processes counting the chunks",
+)
+@click.option(
+    "--state",
+    default=None,
+    help="JSON file with the stats of a previous run, only the packets appended since are read",
+)
+@click.option(
+    "--approximate",
+    is_flag=True,
+    default=False,
+    help="Estimate the unique communicators and top talker in bounded memory",
+)
+@click.option(
+    "--distinct_error",
+    default=0.01,
+    show_default=True,
+    help="Relative error of the unique communicators estimate",
+)
+@click.option(
+    "--top_error",
+    default=0.001,
+    show_default=True,
+    help="Top talker count error, as a fraction of the IP packets",
+)
+def capture_stats(
+    capture, split, workers, state, approximate, distinct_error, top_error
+):
+    """Print the ground truth counters of a capture as JSON"""
+    from dataset.stats import CaptureStats, split_capture_stats
+    from lib.pcap import UnsupportedCapture
+
+    options = _stats_options(approximate, distinct_error, top_error)
+    stats = CaptureStats(**options)
+    if state and os.path.exists(state):
+        with open(state, "r") as f:
+            stats = CaptureStats.from_dict(json.load(f))
+
+    try:
+        if split:
+            stats = split_capture_stats(capture, split, workers, **options)
+        else:
+            read = stats.update_from(capture)
+            click.echo(f"{read} new packets from offset {stats.offset}", err=True)
+    except (UnsupportedCapture, ValueError) as e:
+        raise click.ClickException(str(e))
+
+    if state:
+        with open(state + ".tmp", "w") as f:
+            json.dump(stats.to_dict(), f)
+        os.replace(state + ".tmp", state)
+    click.echo(json.dumps(stats.to_dict(), indent=2))
+
+
+@wireshairk.command()
+@click.argument("capture", default="-")
+@click.option(
+    "--follow",
+    is_flag=True,
+    default=False,
+    help="Keep reading the packets appended to CAPTURE, as tail -f",
+)
+@click.option(
+    "--poll",
+    default=1.0,
+    show_default=True,
+    help="Seconds between reads of a followed capture",
+)
+@click.option(
+    "--idle_timeout",
+    default=None,
+    type=float,
+    help="Stop following after this many seconds without new packets",
+)
+@click.option(
+    "--replay_rate",
+    default=None,
+    type=float,
+    help="Replay CAPTURE at this many packets per second, 0 as fast as possible",
+)
+@click.option(
+    "--window",
+    default=10.0,
+    show_default=True,
+    help="Seconds of capture time per window",
+)
+@click.option(
+    "--history",
+    default=6,
+    show_default=True,
+    help="Windows of the rolling statistics",
+)
+@click.option(
+    "--model",
+    default=None,
+    help="Model summarizing every window, without one only the stats are printed",
+)
+@click.option("--ollama_url", default=OLLAMA_URL, help="URL of the Ollama API")
+@click.option(
+    "--queue_size",
+    default=2,
+    show_default=True,
+    help="Windows that can wait for the model before the overflow applies",
+)
+@click.option(
+    "--overflow",
+    default="merge",
+    show_default=True,
+    help="Merge the windows the model can not keep up with, or drop the oldest",
+)
+@click.option(
+    "--approximate",
+    is_flag=True,
+    default=False,
+    help="Estimate the unique communicators and top talker in bounded memory",
+)
+@click.option(
+    "--distinct_error",
+    default=0.01,
+    show_default=True,
+    help="Relative error of the unique communicators estimate",
+)
+@click.option(
+    "--top_error",
+    default=0.001,
+    show_default=True,
+    help="Top talker count error, as a fraction of the IP packets",
+)
+def analyze_live(
+    capture,
+    follow,
+    poll,
+    idle_timeout,
+    replay_rate,
+    window,
+    history,
+    model,
+    ollama_url,
+    queue_size,
+    overflow,
+    approximate,
+    distinct_error,
+    top_error,
+):
+    """Analyze a pcap stream from stdin (-) or a growing capture, window by window"""
+    from dataset.live import LiveAnalyzer, replay_packets
+    from lib.pcap import UnsupportedCapture, follow_packets, read_packets, read_stream
+
+    if capture == "-":
+        if follow or replay_rate is not None:
+            raise click.BadParameter("--follow and --replay_rate need a capture file")
+        packets = read_stream(sys.stdin.buffer)
+    elif follow:
+        if replay_rate is not None:
+            raise click.BadParameter("A followed capture can not be replayed")
+        packets = follow_packets(capture, poll, idle_timeout, ticks=True)
+    elif not os.path.exists(capture):
+        raise click.BadParameter(f"{capture} does not exist")
+    else:
+        packets = read_packets(capture)
+    if replay_rate is not None:
+        packets = replay_packets(packets, replay_rate)
+
+    try:
+        analyzer = LiveAnalyzer(
+            window=window,
+            history=history,
+            model=model,
+            ollama_url=ollama_url,
+            queue_size=queue_size,
+            overflow=overflow,
+            output=click.echo,
+            **_stats_options(approximate, distinct_error, top_error),
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    try:
+        result = analyzer.run(packets)
+    except UnsupportedCapture as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"{result['packets']} packets in {result['windows']} windows, "
+        f"{result['summaries']} summaries, {result['merged']} windows merged "
+        f"and {result['dropped']} dropped while the model was behind",
+        err=True,
+    )
+
+
+def _mock_ollama(
+    latency, tokens_per_second, prompt_tokens_per_second, error_rate, judge_replies
+):
+    from llm_eval.mock_ollama import MockOllama
+
+    replies = None
+    if judge_replies:
+        with open(judge_replies, "r") as f:
+            replies = [line.rstrip("\n") for line in f if line.strip()]
+    return MockOllama(
+        latency=latency,
+        tokens_per_second=tokens_per_second,
+        prompt_tokens_per_second=prompt_tokens_per_second,
+        error_rate=error_rate,
+        judge_replies=replies,
+    )
+
+
+def _duration(value: str):
+    """Ollama takes durations in seconds or as strings like 30m"""
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def _stats_options(approximate: bool, distinct_error: float, top_error: float):
+    if not approximate:
+        return {}
+    if not 0 < distinct_error < 1 or not 0 < top_error < 1:
+        raise click.BadParameter("The errors must be between 0 and 1")
+    return {
+        "approximate": True,
+        "distinct_error": distinct_error,
+        "top_error": top_error,
+    }
+
+
 if __name__ == "__main__":
     wireshairk()
@@ -0,0 +1,60 @@
+import socket
+import struct
+
+
+def ethernet(ethertype, payload):
+    return b"\x00" * 12 + struct.pack("!H", ethertype) + payload
+
+
+def ipv4(src, dst, protocol, payload=b"\x00" * 8):
+    return (
+        struct.pack("!BBHHHBBH", 0x45, 0, 20 + len(payload), 0, 0, 64, protocol, 0)
+        + socket.inet_aton(src)
+        + socket.inet_aton(dst)
+        + payload
+    )
+
+
+def ipv6(src, dst, next_header, payload=b"\x00" * 8):
+    return (
+        struct.pack("!IHBB", 6 << 28, len(payload), next_header, 64)
+        + socket.inet_pton(socket.AF_INET6, src)
+        + socket.inet_pton(socket.AF_INET6, dst)
+        + payload
+    )
+
+
+FRAMES = [
+    (10.5, ethernet(0x0800, ipv4("10.0.0.1", "10.0.0.2", 6))),
+    (11.0, ethernet(0x86DD, ipv6("fe80::1", "fe80::2", 17))),
+    (12.25, ethernet(0x0806, b"\x00" * 28)),
+]
+
+
+def write_pcap(path, frames, linktype=1):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, linktype))
+        for timestamp, frame in frames:
+            sec = int(timestamp)
+            usec = round((timestamp - sec) * 1_000_000)
+            f.write(struct.pack("<IIII", sec, usec, len(frame), len(frame)) + frame)
+
+
+def pcapng_block(block_type, body):
+    body += b"\x00" * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def write_pcapng(path, frames):
+    with open(path, "wb") as f:
+        f.write(pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1)))
+        # Interface with nanosecond resolution (if_tsresol = 9)
+        options = struct.pack("<HHB", 9, 1, 9) + b"\x00" * 3 + struct.pack("<HH", 0, 0)
+        f.write(pcapng_block(1, struct.pack("<HHI", 1, 0, 65535) + options))
+        for timestamp, frame in frames:
+            ticks = round(timestamp * 1_000_000_000)
+            header = struct.pack(
+                "<IIIII", 0, ticks >> 32, ticks & 0xFFFFFFFF, len(frame), len(frame)
+            )
+            f.write(pcapng_block(6, header + frame))
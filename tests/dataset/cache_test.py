@@ -0,0 +1,42 @@
+import os
+
+from dataset.cache import CaptureCache
+
+
+class TestCaptureCache:
+
+    def test_key_depends_on_content_only(self, tmp_path):
+        cache = CaptureCache(cache_path=str(tmp_path / "cache"))
+        (tmp_path / "a.pcap").write_bytes(b"capture")
+        (tmp_path / "b.pcap").write_bytes(b"capture")
+        (tmp_path / "c.pcap").write_bytes(b"other capture")
+
+        assert cache.key(str(tmp_path / "a.pcap")) == cache.key(
+            str(tmp_path / "b.pcap")
+        )
+        assert cache.key(str(tmp_path / "a.pcap")) != cache.key(
+            str(tmp_path / "c.pcap")
+        )
+
+    def test_put_get_and_rebuild(self, tmp_path):
+        cache = CaptureCache(cache_path=str(tmp_path))
+        cache.put("ab" * 32, {"table": "t", "answers": {"q": "a"}})
+
+        assert cache.get("ab" * 32) == {"table": "t", "answers": {"q": "a"}}
+        assert cache.get("cd" * 32) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert (
+            CaptureCache(cache_path=str(tmp_path), rebuild=True).get("ab" * 32) is None
+        )
+
+    def test_evict_least_recently_used(self, tmp_path):
+        cache = CaptureCache(cache_path=str(tmp_path), max_size=150)
+        for i, key in enumerate(["aa" * 32, "bb" * 32, "cc" * 32]):
+            cache.put(key, {"table": "x" * 50})
+            path = tmp_path / key[:2] / f"{key}.json"
+            os.utime(path, (i, i))
+
+        cache.evict()
+
+        assert cache.get("aa" * 32) is None
+        assert cache.get("cc" * 32) is not None
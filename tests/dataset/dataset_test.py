@@ -0,0 +1,57 @@
+from dataset.dataset import Dataset
+from dataset.storage import iter_dataset
+from dataset.windowed import CaptureWindows
+from tests.captures import FRAMES, write_pcap, write_pcapng
+
+ROWS = [["1", "0.000000", "10.0.0.1", "10.0.0.2", "TCP", "60", "80 -> 1234"]]
+
+
+class TestCaptureArtifacts:
+
+    def test_undecodable_large_capture_falls_back_to_the_table(
+        self, tmp_path, monkeypatch
+    ):
+        # Link type 105 (IEEE 802.11) is only decoded by tshark
+        write_pcap(tmp_path / "wifi.pcap", FRAMES[:1] * 300, linktype=105)
+        monkeypatch.setattr("dataset.dataset.read_rows", lambda path: iter(ROWS))
+        monkeypatch.setattr(
+            Dataset, "answer_questions_for_cap", lambda self, file: {"Q": "A"}
+        )
+        dataset = Dataset(str(tmp_path), windows=CaptureWindows(max_packets=125))
+
+        artifacts = dataset.capture_artifacts("wifi.pcap")
+
+        assert artifacts["answers"] == {"Q": "A"}
+        assert "10.0.0.1" in artifacts["table"]
+
+
+class TestGenerateDataset:
+
+    def test_rows_in_file_order_and_failures_returned(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        captures = tmp_path / "captures"
+        captures.mkdir()
+        # Larger captures first, so the workers finish out of order
+        write_pcap(captures / "a.pcap", FRAMES * 200)
+        write_pcapng(captures / "b.pcapng", FRAMES * 20)
+        (captures / "c.pcap").write_bytes(b"not a capture")
+        write_pcap(captures / "d.pcap", FRAMES[:1])
+        # Windowing every capture decodes them with the native reader alone
+        dataset = Dataset(str(captures), windows=CaptureWindows(max_packets=0))
+
+        failures = dataset.generate_dataset(
+            "test", 10 * [""], workers=3, output_format="jsonl"
+        )
+
+        assert [file for file, _ in failures] == ["c.pcap"]
+        rows = list(iter_dataset("data/test/dataset.jsonl"))
+        assert [row["id"] for row in rows[::9]] == [
+            "a.pcap#0",
+            "b.pcapng#0",
+            "d.pcap#0",
+        ]
+        assert [row["answer"] for row in rows[::9]] == [
+            "In the capture there are a total of 600 packets",
+            "In the capture there are a total of 60 packets",
+            "In the capture there are a total of 1 packets",
+        ]
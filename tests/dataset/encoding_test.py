@@ -0,0 +1,49 @@
+from dataset.encoding import CaptureEncoding, estimate_tokens
+
+ROWS = [
+    ["1", "0.000000", "10.0.0.1", "10.0.0.2", "TCP", "62", "3372 -> 80 [SYN]"],
+    ["2", "0.500000", "10.0.0.2", "10.0.0.1", "TCP", "62", "80 -> 3372 [SYN, ACK]"],
+    ["3", "0.750000", "10.0.0.1", "10.0.0.3", "DNS", "89", "Standard query"],
+]
+
+
+class TestCaptureEncoding:
+
+    def test_full_is_the_tshark_table(self):
+        assert CaptureEncoding().render(ROWS) == (
+            "No.|Time|Source|Destination|Protocol|Length|Info\n"
+            " 1 | 0.000000 | 10.0.0.1 | 10.0.0.2 | TCP | 62 | 3372 -> 80 [SYN]\n"
+            "2 | 0.500000 | 10.0.0.2 | 10.0.0.1 | TCP | 62 | 80 -> 3372 [SYN, ACK]\n"
+            "3 | 0.750000 | 10.0.0.1 | 10.0.0.3 | DNS | 89 | Standard query\n"
+        )
+
+    def test_compact_aliases_hosts_and_prunes_columns(self):
+        encoding = CaptureEncoding(compact=True, time_format="delta", time_precision=2)
+
+        assert encoding.render(ROWS) == (
+            "Hosts: H1=10.0.0.1, H2=10.0.0.2, H3=10.0.0.3\n"
+            "No.|Time|Source|Destination|Protocol|Length\n"
+            "1|0.00|H1|H2|TCP|62\n"
+            "2|0.50|H2|H1|TCP|62\n"
+            "3|0.25|H1|H3|DNS|89\n"
+        )
+        assert estimate_tokens(encoding.render(ROWS)) < estimate_tokens(
+            CaptureEncoding().render(ROWS)
+        )
+
+    def test_compact_times_keep_the_answer_precision(self):
+        rows = ROWS + [["4", "1.472116", "10.0.0.3", "10.0.0.1", "DNS", "105", ""]]
+
+        table = CaptureEncoding(compact=True).render(rows)
+
+        # The duration answer is rounded to 6 decimals
+        assert table.splitlines()[-1] == "4|1.472116|H3|H1|DNS|105"
+
+    def test_key_changes_with_the_options(self):
+        keys = {
+            CaptureEncoding().key(),
+            CaptureEncoding(compact=True).key(),
+            CaptureEncoding(compact=True, time_format="delta").key(),
+            CaptureEncoding(compact=True, columns=["No.", "Length"]).key(),
+        }
+        assert len(keys) == 4
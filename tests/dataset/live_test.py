@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from dataset.live import LiveAnalyzer, dominant_protocol, replay_packets
+from dataset.stats import CaptureStats
+from lib.pcap import Packet
+from llm_eval.mock_ollama import MockOllama
+
+PACKETS = [
+    Packet(
+        100 + i * 0.25,
+        60 + i % 7,
+        f"10.0.0.{i % 5}",
+        f"10.0.1.{i % 3}",
+        ("eth", "ip", "tcp" if i % 4 else "udp"),
+    )
+    for i in range(200)
+]
+
+
+class TestLiveAnalyzer:
+
+    def test_rolling_windows(self):
+        lines = []
+        result = LiveAnalyzer(window=10, history=2, output=lines.append).run(PACKETS)
+
+        assert result == {
+            "packets": 200,
+            "windows": 5,
+            "summaries": 0,
+            "merged": 0,
+            "dropped": 0,
+        }
+        # Header and a line per window, the rolling stats of the last two
+        assert len(lines) == 6
+        assert lines[1].startswith("1-1|1-40|0.000000|9.750000|")
+        assert lines[3].startswith("2-3|41-120|10.000000|29.750000|")
+        assert lines[3].endswith("|5042|8|10.0.1.1 (27)|tcp 60, udp 20|TCP|4.05|255.29")
+
+    def test_idle_ticks_close_the_window(self):
+        lines = []
+
+        def packets():
+            yield PACKETS[0]
+            yield None
+            # The window is still open, its time is not over
+            assert len(lines) == 1
+            time.sleep(0.2)
+            yield None
+            # Closed on the tick, before any other packet arrived
+            assert lines[1].startswith("1-1|1-1|")
+            yield PACKETS[1]
+
+        result = LiveAnalyzer(window=0.1, output=lines.append).run(packets())
+
+        assert result["packets"] == 2
+        assert result["windows"] == 2
+        assert lines[2].startswith("1-2|1-2|")
+
+    @pytest.mark.parametrize("overflow", ["merge", "drop"])
+    def test_back_pressure(self, overflow):
+        lines = []
+        with MockOllama(latency="constant:0.2", tokens_per_second=1e6) as mock:
+            result = LiveAnalyzer(
+                window=1,
+                model="llama3",
+                ollama_url=mock.start(),
+                queue_size=1,
+                overflow=overflow,
+                output=lines.append,
+            ).run(PACKETS)
+
+        assert result["windows"] == 50
+        assert result["summaries"] < 50
+        if overflow == "merge":
+            # Every window reaches the model, merged while it was busy
+            assert result["merged"] > 0 and result["dropped"] == 0
+            assert result["summaries"] + result["merged"] == 50
+        else:
+            assert result["dropped"] > 0 and result["merged"] == 0
+            assert result["summaries"] + result["dropped"] == 50
+        assert any(line.startswith("Summary of windows") for line in lines)
+
+    def test_dominant_protocol(self):
+        stats = CaptureStats()
+        assert dominant_protocol(stats) is None
+        stats.protocols_count = {"tcp": 2, "udp": 2, "ip": 4}
+        assert dominant_protocol(stats) is None
+        stats.protocols_count["udp"] = 3
+        assert dominant_protocol(stats) == "udp"
+
+    def test_replay_rate(self):
+        start = time.perf_counter()
+        assert len(list(replay_packets(PACKETS[:11], rate=100))) == 11
+
+        assert time.perf_counter() - start >= 0.1
@@ -0,0 +1,49 @@
+import json
+
+from dataset.stats import CaptureStats
+from lib.pcap import read_packets
+from tests.captures import FRAMES, write_pcap, write_pcapng
+
+
+class TestCaptureStats:
+
+    def test_serialization_round_trip(self, tmp_path):
+        write_pcap(tmp_path / "a.pcap", FRAMES)
+        stats = CaptureStats.from_packets(read_packets(tmp_path / "a.pcap"))
+
+        assert stats.num_packets == len(FRAMES)
+        assert CaptureStats.from_dict(json.loads(json.dumps(stats.to_dict()))) == stats
+
+    def test_update_from_growing_capture(self, tmp_path):
+        for name, write in (("a.pcap", write_pcap), ("a.pcapng", write_pcapng)):
+            path = tmp_path / name
+            write(path, FRAMES)
+            whole = CaptureStats.from_packets(read_packets(path))
+
+            write(path, FRAMES[:2])
+            stats = CaptureStats()
+            assert stats.update_from(path) == 2
+            assert stats.update_from(path) == 0
+
+            write(path, FRAMES)
+            assert stats.update_from(path) == len(FRAMES) - 2
+            stats.offset = whole.offset = 0
+            assert stats == whole
+
+    def test_approximate_merge_and_round_trip(self, tmp_path):
+        write_pcap(tmp_path / "a.pcap", FRAMES)
+        exact = CaptureStats.from_packets(read_packets(tmp_path / "a.pcap"))
+        first = CaptureStats.from_packets(
+            list(read_packets(tmp_path / "a.pcap"))[:2], approximate=True
+        )
+        rest = CaptureStats.from_packets(
+            list(read_packets(tmp_path / "a.pcap"))[2:], approximate=True
+        )
+        merged = first.merge(rest)
+
+        assert merged.ip_count == {}
+        assert merged.distinct_ips() == exact.distinct_ips()
+        assert merged.top_talker() == exact.top_talker()
+        assert (
+            CaptureStats.from_dict(json.loads(json.dumps(merged.to_dict()))) == merged
+        )
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from dataset.storage import DatasetStore, capture_rows, dataset_file, iter_dataset
+
+QUESTIONS = ["How many packets?", "How long?"]
+CONTEXTS = ["", "Example\nQ: How long?\nA: 2 seconds"]
+
+
+class TestDatasetStore:
+
+    def test_rows_match_the_jsonl_ones(self, tmp_path):
+        captures = {
+            "a.pcap": ("1 | 0.0 | TCP", {"How many packets?": "1", "How long?": "0"}),
+            "b.pcap": ("1 | 0.0 | UDP\n2 | 1.0 | UDP", {"How many packets?": "2"}),
+        }
+        store = DatasetStore.create(
+            str(tmp_path / "dataset.sqlite"), CONTEXTS, QUESTIONS
+        )
+        expected = []
+        for name, (table, answers) in captures.items():
+            store.add(name, table, answers)
+            expected.extend(capture_rows(name, table, CONTEXTS, answers))
+
+        assert list(store.rows()) == expected
+        assert len(store) == 3
+        assert [row["id"] for row in store.rows(prompts=False)] == [
+            "a.pcap#0",
+            "a.pcap#1",
+            "b.pcap#0",
+        ]
+        assert "prompt" not in next(store.rows(prompts=False))
+        assert [row["parts"] for row in store.rows(prompts=False, parts=True)][1:] == [
+            {"example": CONTEXTS[1], "table": "1 | 0.0 | TCP", "question": "How long?"},
+            {
+                "example": "",
+                "table": "1 | 0.0 | UDP\n2 | 1.0 | UDP",
+                "question": "How many packets?",
+            },
+        ]
+
+        output = tmp_path / "dataset.jsonl"
+        assert store.export_jsonl(str(output)) == 3
+        store.close()
+        assert output.read_text() == "".join(json.dumps(row) + "\n" for row in expected)
+        assert list(iter_dataset(str(output))) == expected
+        assert list(iter_dataset(str(tmp_path / "dataset.sqlite"))) == expected
+
+    def test_rejects_other_questions(self, tmp_path):
+        store = DatasetStore.create(
+            str(tmp_path / "dataset.sqlite"), CONTEXTS, QUESTIONS
+        )
+
+        with pytest.raises(ValueError):
+            store.add("a.pcap", "", {"How long?": "0"})
+
+    def test_dataset_file_prefers_sqlite(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "data" / "zero_shot").mkdir(parents=True)
+
+        assert dataset_file("zero_shot") == "data/zero_shot/dataset.jsonl"
+        (tmp_path / "data" / "zero_shot" / "dataset.sqlite").touch()
+        assert dataset_file("zero_shot") == "data/zero_shot/dataset.sqlite"
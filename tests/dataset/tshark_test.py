@@ -0,0 +1,161 @@
+import os
+import shutil
+import stat
+import subprocess
+import sys
+
+import pytest
+
+from dataset import cache
+from dataset.tshark import (
+    COLUMN_FIELDS,
+    COLUMN_FIELDS_4_2,
+    clean_row,
+    column_fields,
+    read_rows,
+)
+from tests.captures import FRAMES, write_pcap
+
+# The _ws.col fields of `tshark -G fields`, before and after Wireshark 4.2
+TSHARK_FIELDS = {
+    "4.0.11": [
+        "_ws.col.No.",
+        "_ws.col.Time",
+        "_ws.col.Source",
+        "_ws.col.Destination",
+        "_ws.col.Protocol",
+        "_ws.col.Length",
+        "_ws.col.Info",
+    ],
+    "4.2.5": [
+        "_ws.col.number",
+        "_ws.col.cls_time",
+        "_ws.col.abs_time",
+        "_ws.col.def_src",
+        "_ws.col.res_src",
+        "_ws.col.def_dst",
+        "_ws.col.res_dst",
+        "_ws.col.protocol",
+        "_ws.col.packet_length",
+        "_ws.col.info",
+    ],
+}
+
+# Answers --version, -G fields and -T fields like tshark, rejecting the
+# fields it does not know
+FAKE_TSHARK = """#!{python}
+import sys
+
+VERSION = {version!r}
+FIELDS = {fields!r}
+args = sys.argv[1:]
+if args == ["--version"]:
+    print(f"TShark (Wireshark) {{VERSION}} (Git v{{VERSION}} packaged as {{VERSION}}-1)")
+elif args == ["-G", "fields"]:
+    for field in FIELDS:
+        print(f"F\\t{{field}}\\t{{field}}\\tFT_STRING\\t_ws.col\\t\\t0x0\\t")
+else:
+    fields = [args[i + 1] for i, arg in enumerate(args) if arg == "-e"]
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        sys.exit("tshark: Some fields aren't valid:\\n\\t" + "\\n\\t".join(unknown))
+    sys.stdout.write("1\\t0.000000\\t10.0.0.1\\t10.0.0.2\\tTCP\\t62\\t3372 \u2192 80 [SYN]\\n")
+    sys.stdout.write("2\\t0.500000\\tfe80::1\\tfe80::2\\tDNS\\t70\\tStandard query \\\\t A\\n")
+"""
+
+
+@pytest.fixture(params=sorted(TSHARK_FIELDS))
+def fake_tshark(request, tmp_path, monkeypatch):
+    """A tshark of every version range first on the PATH"""
+    version = request.param
+    path = tmp_path / "bin" / "tshark"
+    path.parent.mkdir()
+    path.write_text(
+        FAKE_TSHARK.format(
+            python=sys.executable, version=version, fields=TSHARK_FIELDS[version]
+        ),
+        encoding="utf-8",
+    )
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{path.parent}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("PYTHONIOENCODING", "utf-8")
+    # The version is read once per process
+    monkeypatch.setattr(cache, "_tshark_version", None)
+    return version
+
+
+class TestTshark:
+
+    def test_column_fields_by_version(self):
+        assert column_fields("TShark (Wireshark) 3.6.2") == COLUMN_FIELDS
+        assert column_fields("TShark (Wireshark) 4.0.11") == COLUMN_FIELDS
+        assert column_fields("TShark (Wireshark) 4.2.0") == COLUMN_FIELDS_4_2
+        assert column_fields("TShark (Wireshark) 4.10.1") == COLUMN_FIELDS_4_2
+
+    def test_column_fields_are_tshark_fields(self, fake_tshark):
+        fields = subprocess.run(
+            ["tshark", "-G", "fields"], capture_output=True, text=True, check=True
+        ).stdout
+        names = {line.split("\t")[2] for line in fields.splitlines()}
+
+        assert cache.tshark_version().startswith(f"TShark (Wireshark) {fake_tshark}")
+        assert set(column_fields()) <= names
+
+    def test_read_rows_with_the_fields_of_the_version(self, fake_tshark, tmp_path):
+        capture = str(tmp_path / "capture.pcap")
+        write_pcap(capture, FRAMES)
+
+        assert list(read_rows(capture)) == [
+            ["1", "0.000000", "10.0.0.1", "10.0.0.2", "TCP", "62", "3372 -> 80 [SYN]"],
+            [
+                "2",
+                "0.500000",
+                "fe80::1",
+                "fe80::2",
+                "DNS",
+                "70",
+                "Standard query \\t A",
+            ],
+        ]
+
+    def test_read_rows_rejects_unknown_fields(self, fake_tshark, monkeypatch):
+        # The fields of the other version range
+        other = next(version for version in TSHARK_FIELDS if version != fake_tshark)
+        monkeypatch.setattr(cache, "_tshark_version", f"TShark (Wireshark) {other}")
+
+        with pytest.raises(subprocess.CalledProcessError) as error:
+            list(read_rows("capture.pcap"))
+        assert "Some fields aren't valid" in error.value.stderr
+
+    def test_fields_and_tabs_lines_clean_the_same(self):
+        fields = '1\t0.000000\t10.0.0.1\t10.0.0.2\tHTTP\t533\tGET "/" → 80\n'
+        tabs = '    1\t0.000000\t10.0.0.1\t→\t10.0.0.2\tHTTP\t533\tGET "/" → 80\n'
+
+        assert clean_row(fields) == clean_row(tabs)
+        assert clean_row(fields) == [
+            "1",
+            "0.000000",
+            "10.0.0.1",
+            "10.0.0.2",
+            "HTTP",
+            "533",
+            "GET '/' -> 80",
+        ]
+
+    @pytest.mark.skipif(
+        shutil.which("tshark") is None, reason="tshark is not installed"
+    )
+    def test_fields_match_the_tabs_table(self, tmp_path):
+        capture = str(tmp_path / "capture.pcap")
+        write_pcap(capture, FRAMES)
+        tabs = subprocess.run(
+            ["tshark", "-r", capture, "-T", "tabs"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+
+        # The column fields of the installed tshark give its default table
+        assert list(read_rows(capture)) == [
+            clean_row(line) for line in tabs.splitlines()
+        ]
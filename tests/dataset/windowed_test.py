@@ -0,0 +1,52 @@
+from dataset.stats import CaptureStats
+from dataset.windowed import CaptureWindows
+from lib.pcap import Packet
+
+PACKETS = [
+    Packet(
+        100 + i * 0.25,
+        60 + i % 7,
+        f"10.0.0.{i % 5}",
+        f"10.0.1.{i % 3}",
+        ("eth", "ip", "tcp" if i % 4 else "udp"),
+    )
+    for i in range(1000)
+]
+
+
+class TestCaptureWindows:
+
+    def test_windows_by_size_and_duration(self):
+        by_size = list(CaptureWindows(size=300).iter_windows(PACKETS))
+        by_time = list(CaptureWindows(duration=10).iter_windows(PACKETS))
+
+        assert [(first, len(w)) for first, w in by_size] == [
+            (1, 300),
+            (301, 300),
+            (601, 300),
+            (901, 100),
+        ]
+        assert all(len(w) == 40 for _, w in by_time)
+
+    def test_merged_window_stats_are_exact(self):
+        merged = CaptureStats()
+        for _, window in CaptureWindows(size=77).iter_windows(PACKETS):
+            merged.merge(CaptureStats.from_packets(window))
+
+        assert merged == CaptureStats.from_packets(PACKETS)
+        assert list(merged.ip_count) == list(
+            CaptureStats.from_packets(PACKETS).ip_count
+        )
+
+    def test_summary_is_bounded(self):
+        stats, table = CaptureWindows(size=10, rows=8).summarize(iter(PACKETS))
+        lines = table.splitlines()
+
+        assert stats == CaptureStats.from_packets(PACKETS)
+        assert (
+            lines[0]
+            == "Capture of 1000 packets summarized in 100 windows of 10 packets"
+        )
+        assert 2 < len(lines) <= 2 + 8
+        assert lines[2].startswith("1|1-")
+        assert lines[-1].split("|")[1].endswith("-1000")
@@ -0,0 +1,65 @@
+import errno
+import os
+
+from lib.clean_raw_data import _link_or_copy, clean_raw_data
+from tests.captures import FRAMES, write_pcap
+
+
+class TestCleanRawData:
+
+    def test_failures_are_returned(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        os.mkdir(tmp_path / "data")
+        raw = tmp_path / "raw"
+        os.mkdir(raw)
+        write_pcap(raw / "good.pcap", FRAMES)
+        write_pcap(raw / "large.pcap", FRAMES * 10)
+        (raw / "bad.pcap").write_bytes(b"not a capture")
+        (raw / "notes.txt").write_text("")
+
+        failures = clean_raw_data(str(raw), max_packets=10, workers=2)
+
+        assert [file for file, _ in failures] == ["bad.pcap"]
+        assert os.listdir(tmp_path / "data" / "cleaned") == ["good.pcap"]
+
+
+class TestLinkOrCopy:
+
+    def test_copy_when_the_reflink_fails(self, tmp_path, monkeypatch):
+        (tmp_path / "src").write_bytes(b"capture")
+        (tmp_path / "dst").write_bytes(b"old")
+
+        def no_link(src, dst):
+            raise OSError(errno.EPERM, "Operation not permitted")
+
+        def failing_ioctl(fd, request, arg):
+            raise OSError(errno.EIO, "Input/output error")
+
+        monkeypatch.setattr("os.link", no_link)
+        monkeypatch.setattr("fcntl.ioctl", failing_ioctl)
+
+        _link_or_copy(str(tmp_path / "src"), str(tmp_path / "dst"))
+
+        assert (tmp_path / "dst").read_bytes() == b"capture"
+
+    def test_no_reflink_across_devices(self, tmp_path, monkeypatch):
+        (tmp_path / "src").write_bytes(b"capture")
+        clones = []
+
+        def cross_device(src, dst):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+        monkeypatch.setattr("os.link", cross_device)
+        monkeypatch.setattr("fcntl.ioctl", lambda *args: clones.append(args))
+
+        _link_or_copy(str(tmp_path / "src"), str(tmp_path / "dst"))
+
+        assert clones == []
+        assert (tmp_path / "dst").read_bytes() == b"capture"
+
+    def test_hardlink(self, tmp_path):
+        (tmp_path / "src").write_bytes(b"capture")
+
+        _link_or_copy(str(tmp_path / "src"), str(tmp_path / "dst"))
+
+        assert os.path.samefile(tmp_path / "src", tmp_path / "dst")
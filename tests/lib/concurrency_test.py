@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from lib.concurrency import ordered_map
+
+
+class TestOrderedMap:
+
+    def test_results_in_input_order(self):
+        def slow_for_small(n):
+            time.sleep(0.001 * (10 - n))
+            return n * n
+
+        assert list(ordered_map(slow_for_small, range(10), workers=4)) == [
+            n * n for n in range(10)
+        ]
+
+    def test_at_most_window_items_in_flight(self):
+        lock = threading.Lock()
+        in_flight = 0
+        most = 0
+
+        def track(n):
+            nonlocal in_flight, most
+            with lock:
+                in_flight += 1
+                most = max(most, in_flight)
+            time.sleep(0.002)
+            with lock:
+                in_flight -= 1
+            return n
+
+        consumed = []
+
+        def items():
+            for n in range(20):
+                consumed.append(n)
+                yield n
+
+        results = ordered_map(track, items(), workers=2, window=3)
+        assert next(results) == 0
+        # The input is read only as far as the window
+        assert len(consumed) == 3
+        assert list(results) == list(range(1, 20))
+        assert most <= 2
+
+    def test_single_worker_is_lazy_map(self):
+        results = ordered_map(str, iter([1, 2]), workers=1)
+
+        assert next(results) == "1"
+        assert list(results) == ["2"]
+
+    def test_errors_propagate(self):
+        def fail_on_three(n):
+            if n == 3:
+                raise ValueError("three")
+            return n
+
+        results = ordered_map(fail_on_three, range(6), workers=2)
+
+        assert [next(results) for _ in range(3)] == [0, 1, 2]
+        with pytest.raises(ValueError):
+            next(results)
@@ -0,0 +1,140 @@
+import struct
+
+import pytest
+
+from lib.pcap import (
+    UnsupportedCapture,
+    count_packets,
+    follow_packets,
+    read_packets,
+    read_packets_at,
+    read_stream,
+)
+from tests.captures import FRAMES, write_pcap, write_pcapng
+
+
+class TestPcapReader:
+
+    @pytest.mark.parametrize("writer", [write_pcap, write_pcapng])
+    def test_read_packets(self, tmp_path, writer):
+        path = tmp_path / "capture"
+        writer(path, FRAMES)
+
+        packets = list(read_packets(str(path)))
+
+        assert [p.timestamp for p in packets] == [10.5, 11.0, 12.25]
+        assert [p.length for p in packets] == [len(frame) for _, frame in FRAMES]
+        assert [(p.src, p.dst) for p in packets] == [
+            ("10.0.0.1", "10.0.0.2"),
+            ("fe80::1", "fe80::2"),
+            (None, None),
+        ]
+        assert [p.layers for p in packets] == [
+            ("eth", "ip", "tcp"),
+            ("eth", "ipv6", "udp"),
+            ("eth", "arp"),
+        ]
+
+    def test_unsupported_linktype(self, tmp_path):
+        path = tmp_path / "capture.pcap"
+        write_pcap(path, FRAMES, linktype=105)
+
+        with pytest.raises(UnsupportedCapture):
+            list(read_packets(str(path)))
+
+    def test_unknown_format(self, tmp_path):
+        path = tmp_path / "capture.cap"
+        path.write_bytes(b"not a capture file")
+
+        with pytest.raises(UnsupportedCapture):
+            list(read_packets(str(path)))
+
+
+class TestStreams:
+
+    def test_read_stream_in_small_chunks(self, tmp_path):
+        path = tmp_path / "capture.pcap"
+        write_pcap(path, FRAMES)
+        data = path.read_bytes()
+
+        class Pipe:
+            """Returns at most 7 bytes a read, as a pipe may"""
+
+            def __init__(self):
+                self.position = 0
+
+            def read(self, size):
+                chunk = data[self.position : self.position + min(size, 7)]
+                self.position += len(chunk)
+                return chunk
+
+        assert list(read_stream(Pipe())) == list(read_packets(str(path)))
+
+    def test_read_stream_rejects_pcapng(self, tmp_path):
+        path = tmp_path / "capture.pcapng"
+        write_pcapng(path, FRAMES)
+
+        with path.open("rb") as f, pytest.raises(UnsupportedCapture):
+            list(read_stream(f))
+
+    def test_follow_appended_packets(self, tmp_path):
+        path = tmp_path / "capture.pcap"
+        write_pcap(path, FRAMES[:1])
+        first_record = path.read_bytes()[24:]
+        packets = follow_packets(str(path), poll=0.01, idle_timeout=0.05)
+
+        assert next(packets).timestamp == 10.5
+        with path.open("ab") as f:
+            f.write(first_record)
+        assert [p.timestamp for p in packets] == [10.5]
+
+    def test_pcapng_resumes_after_the_read_blocks(self, tmp_path):
+        path = tmp_path / "capture.pcapng"
+        write_pcapng(path, FRAMES[:1])
+        # The packet block follows the section (28 bytes) and interface blocks
+        data = bytearray(path.read_bytes())
+        packet_block = data[60:]
+        section = {}
+        [(offset, _)] = read_packets_at(str(path), 0, section)
+        assert section["offset"] == offset == len(data)
+
+        # Break the interface block, only a read from the start parses it again
+        data[36:38] = struct.pack("<H", 999)
+        path.write_bytes(data + packet_block)
+        with pytest.raises(UnsupportedCapture):
+            list(read_packets_at(str(path), offset))
+        packets = read_packets_at(str(path), offset, section)
+        assert [(end, p.timestamp) for end, p in packets] == [
+            (len(data) + len(packet_block), 10.5)
+        ]
+
+    def test_follow_yields_idle_ticks(self, tmp_path):
+        path = tmp_path / "capture.pcap"
+        write_pcap(path, FRAMES[:1])
+        first_record = path.read_bytes()[24:]
+        packets = follow_packets(str(path), poll=0.01, idle_timeout=0.05, ticks=True)
+
+        assert next(packets).timestamp == 10.5
+        assert next(packets) is None
+        with path.open("ab") as f:
+            f.write(first_record)
+        assert next(packets).timestamp == 10.5
+        assert set(packets) == {None}
+
+
+class TestCountPackets:
+
+    @pytest.mark.parametrize("writer", [write_pcap, write_pcapng])
+    def test_count_packets(self, tmp_path, writer):
+        path = tmp_path / "capture"
+        writer(path, FRAMES * 100)
+
+        assert count_packets(str(path)) == 300
+        # Counting stops right after the limit
+        assert count_packets(str(path), limit=125) == 126
+
+    def test_count_ignores_linktype(self, tmp_path):
+        path = tmp_path / "capture.pcap"
+        write_pcap(path, FRAMES, linktype=105)
+
+        assert count_packets(str(path)) == 3
@@ -0,0 +1,38 @@
+import json
+
+from lib import profiling
+
+
+class TestProfiling:
+
+    def test_disabled_is_a_shared_no_op(self):
+        profiling.disable()
+
+        assert profiling.span("stage") is profiling.span("other stage")
+        profiling.count("packets")
+        assert not profiling.enabled()
+
+    def test_nested_spans_counters_and_export(self, tmp_path):
+        profiler = profiling.enable()
+        try:
+            with profiling.span("outer"):
+                with profiling.span("inner", file="a.pcap"):
+                    profiling.count("packets", 10)
+                profiling.count("packets", 5)
+        finally:
+            profiling.disable()
+
+        profiler.export(str(tmp_path / "profile.jsonl"))
+        profiler.export(str(tmp_path / "trace.json"))
+        lines = (tmp_path / "profile.jsonl").read_text().splitlines()
+        trace = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+
+        assert [
+            (json.loads(line)["name"], json.loads(line)["depth"]) for line in lines[:2]
+        ] == [
+            ("outer", 0),
+            ("inner", 1),
+        ]
+        assert json.loads(lines[-1]) == {"counters": {"packets": 15}}
+        assert {event["ph"] for event in trace} == {"X", "C"}
+        assert "inner" in profiler.summary()
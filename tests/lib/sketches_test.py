@@ -0,0 +1,49 @@
+from lib.sketches import HyperLogLog, SpaceSaving
+
+
+class TestHyperLogLog:
+
+    def test_estimate_within_error(self):
+        sketch = HyperLogLog(error=0.01)
+        for i in range(50000):
+            sketch.add(f"10.{i >> 16}.{(i >> 8) & 255}.{i & 255}")
+            sketch.add("10.0.0.1")
+
+        assert abs(sketch.count() - 50000) < 50000 * 0.03
+        assert HyperLogLog.from_dict(sketch.to_dict()).count() == sketch.count()
+
+    def test_merge_is_the_union(self):
+        first, second, both = HyperLogLog(0.02), HyperLogLog(0.02), HyperLogLog(0.02)
+        for i in range(3000):
+            (first if i % 2 else second).add(str(i))
+            both.add(str(i))
+
+        assert first.merge(second).registers == both.registers
+
+
+class TestSpaceSaving:
+
+    def test_finds_heavy_hitters_with_bounded_counters(self):
+        sketch = SpaceSaving(capacity=50)
+        for i in range(20000):
+            sketch.add("10.0.0.1" if i % 4 == 0 else f"10.1.{i % 251}.{i % 253}")
+
+        item, count, error = sketch.top(1)[0]
+        assert item == "10.0.0.1"
+        assert count - error <= 5000 <= count
+        assert len(sketch.counts) == 50
+
+    def test_merge_keeps_the_error_bound(self):
+        first, second = SpaceSaving(capacity=2), SpaceSaving(capacity=2)
+        streams = [["a"] * 10, ["a"] * 3 + ["b"] * 5 + ["c"] * 5]
+        for sketch, stream in zip([first, second], streams):
+            for item in stream:
+                sketch.add(item)
+        # "a" was evicted from the second sketch, after 3 occurrences
+        assert second.counts == {"b": 5, "c": 8}
+
+        merged = first.merge(second)
+        assert merged.top(2) == [("a", 15, 5), ("c", 8, 3)]
+        for item, count, error in merged.top(2):
+            true_count = sum(stream.count(item) for stream in streams)
+            assert count - error <= true_count <= count
@@ -0,0 +1,18 @@
+from lib.pcap import read_packets
+from lib.synthetic import write_synthetic_capture
+
+
+class TestSyntheticCapture:
+
+    def test_size_mix_and_determinism(self, tmp_path):
+        write_synthetic_capture(tmp_path / "a.pcap", 5000, {"tcp": 0.75, "arp": 0.25})
+        write_synthetic_capture(tmp_path / "b.pcap", 5000, {"tcp": 0.75, "arp": 0.25})
+
+        packets = list(read_packets(tmp_path / "a.pcap"))
+        tcp = sum("tcp" in packet.layers for packet in packets)
+
+        assert len(packets) == 5000
+        assert 3500 < tcp < 4000
+        assert all(packet.src is None for packet in packets if "arp" in packet.layers)
+        assert packets == sorted(packets, key=lambda packet: packet.timestamp)
+        assert (tmp_path / "a.pcap").read_bytes() == (tmp_path / "b.pcap").read_bytes()
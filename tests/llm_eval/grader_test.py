@@ -0,0 +1,108 @@
+import json
+
+from llm_eval.grader import (
+    Grader,
+    extract_ips,
+    extract_numbers,
+    judge_prompt,
+    parse_judgement,
+)
+
+YES = {"is_correct": "Yes", "punctuation": 100}
+NO = {"is_correct": "No", "punctuation": 0}
+
+
+class TestExtract:
+
+    def test_numbers_skip_ips_and_read_separators(self):
+        text = "Host 10.0.0.1 sent 1,234 packets in 12.5 s, ICMPv6 was 3."
+
+        assert extract_numbers(text) == [1234.0, 12.5, 3.0]
+
+    def test_ips_are_normalized_in_order(self):
+        text = "From fe80:0:0::1 to 192.168.1.2, not 12:30:45 or 1.2.3.4.5"
+
+        assert extract_ips(text) == ["fe80::1", "192.168.1.2"]
+
+
+class TestGrader:
+
+    def test_counts(self):
+        grader = Grader()
+        answer = "In the capture there are a total of 1234 packets"
+
+        assert grader.grade(0, "The capture has 1,234 packets.", answer) == YES
+        assert grader.grade(0, "There are 1235 packets.", answer) == NO
+        # The right number along with another one is left to the judge
+        assert grader.grade(0, "1234 packets, 1200 of them TCP", answer) is None
+        assert grader.grade(0, "About 1.2 thousand packets", answer) is None
+        assert grader.grade(0, "I can not tell.", answer) is None
+
+    def test_decimals_within_tolerance(self):
+        grader = Grader(relative_tolerance=0.01)
+        answer = "The communication lasts 100.0 seconds."
+
+        assert grader.grade(6, "It lasts 100.9 seconds", answer) == YES
+        assert grader.grade(6, "It lasts 102 seconds", answer) == NO
+
+    def test_communicators(self):
+        grader = Grader()
+        answer = "There are a total of 2 unique communicators in the trace. These are the IPs: 10.0.0.1, 10.0.0.2"
+
+        assert grader.grade(1, "2 hosts: 10.0.0.2 and 10.0.0.1", answer) == YES
+        assert grader.grade(1, "3 hosts: 10.0.0.1, 10.0.0.2, 10.0.0.3", answer) == NO
+        assert grader.grade(1, "2 hosts: 10.0.0.1 and 10.0.0.3", answer) is None
+
+    def test_top_talker(self):
+        grader = Grader()
+        answer = "The IP that participates the most in the communication is the IP 10.0.0.1 this appears in a total of 42 communications."
+
+        assert grader.grade(2, "10.0.0.1 with 42 packets", answer) == YES
+        assert grader.grade(2, "10.0.0.9 with 40 packets", answer) == NO
+        assert grader.grade(2, "10.0.0.9 with 42 packets", answer) is None
+
+    def test_protocol(self):
+        grader = Grader()
+        answer = "In the capture predominates the use of ICMP."
+
+        assert grader.grade(5, "Mostly icmp traffic", answer) == YES
+        assert grader.grade(5, "ICMPv6 is the most used", answer) == NO
+        assert grader.grade(5, "ICMP, then TCP", answer) is None
+
+    def test_undecidable_answers(self):
+        grader = Grader()
+
+        assert (
+            grader.grade(
+                1,
+                "There are 2 hosts",
+                "There are approximately 2 unique communicators in the trace (estimated).",
+            )
+            is None
+        )
+        assert grader.grade(None, "3 packets", "a total of 3 packets") is None
+
+
+class TestJudgeBatch:
+
+    def test_prompt_numbers_the_answers(self):
+        prompt = judge_prompt([("a", "b"), ("c", "d")])
+
+        assert prompt.startswith("Answer 0:\nModel to evaluate answer: a")
+        assert "Answer 1:\nModel to evaluate answer: c\nReal answer:\nd" in prompt
+
+    def test_parse_keeps_valid_grades(self):
+        output = json.dumps(
+            {
+                "grades": [
+                    {"answer": 0, "is_correct": "Yes", "punctuation": 90},
+                    {"answer": 1, "is_correct": "Maybe", "punctuation": 50},
+                    {"answer": 5, "is_correct": "No", "punctuation": 0},
+                ]
+            }
+        )
+
+        assert parse_judgement(output, 2) == {
+            0: {"is_correct": "Yes", "punctuation": 90}
+        }
+        assert parse_judgement("not json", 2) == {}
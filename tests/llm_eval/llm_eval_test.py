@@ -0,0 +1,310 @@
+import json
+import os
+import socket
+from functools import partial
+
+import pytest
+
+from dataset.storage import DatasetStore, capture_rows
+from llm_eval.grader import Grader
+from llm_eval.llm_eval import LLM_Evaluator, _answer_key, _completed_keys, _join_rows
+from llm_eval.mock_ollama import MockOllama
+from llm_eval.ollama import OllamaClient
+from llm_eval.response_cache import ResponseCache
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("llm_eval.llm_eval.RETRY_DELAY", 0)
+    path = tmp_path / "dataset.jsonl"
+    path.write_text(
+        "".join(
+            json.dumps(
+                {
+                    "id": f"a.pcap#{i}",
+                    "question": i,
+                    "context": "",
+                    "prompt": f"table\nQ: question {i}",
+                    "answer": f"answer {i}",
+                }
+            )
+            + "\n"
+            for i in range(2)
+        )
+    )
+    return str(path)
+
+
+def read_jsonl(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestResume:
+
+    def test_completed_keys_truncates_partial_line(self, tmp_path):
+        output = tmp_path / "generated_output_llama2.jsonl"
+        output.write_text(
+            json.dumps({"key": "a", "prompt": "p1"})
+            + "\n"
+            + json.dumps({"prompt": "p2"})
+            + "\n"
+            + '{"key": "c", "pro'
+        )
+
+        completed = _completed_keys(str(output), partial(_answer_key, "llama2"))
+
+        assert completed == {"a", _answer_key("llama2", {"prompt": "p2"})}
+        assert output.read_text().endswith('"p2"}\n')
+
+    def test_missing_output_file(self, tmp_path):
+        assert _completed_keys(str(tmp_path / "missing.jsonl")) == set()
+
+
+class TestJoinRows:
+
+    def test_join_by_id_out_of_order(self):
+        dataset = [
+            {"id": "a.pcap#0", "question": 0, "prompt": "p0", "answer": "r0"},
+            {"id": "a.pcap#1", "question": 1, "prompt": "p1", "answer": "r1"},
+            {"id": "a.pcap#2", "question": 2, "prompt": "p2", "answer": "r2"},
+        ]
+        generated = [{"id": "a.pcap#1"}, {"id": "missing"}, {"id": "a.pcap#0"}]
+
+        joined = [(g["id"], d) for g, d in _join_rows(generated, iter(dataset))]
+
+        assert joined == [
+            ("a.pcap#1", {"answer": "r1", "question": 1}),
+            ("missing", None),
+            ("a.pcap#0", {"answer": "r0", "question": 0}),
+        ]
+
+    def test_missing_key_reads_ahead_a_bounded_window(self):
+        read = []
+
+        def dataset():
+            for i in range(10):
+                read.append(i)
+                yield {"id": f"a.pcap#{i}", "question": i, "answer": f"r{i}"}
+
+        generated = [{"id": "stale"}] + [{"id": f"a.pcap#{i}"} for i in range(10)]
+        looked_up = []
+
+        def lookup(key):
+            looked_up.append(key)
+            return {"answer": "found", "question": None} if key != "stale" else None
+
+        joined = _join_rows(generated, dataset(), lookup=lookup, window=3)
+
+        assert next(joined) == ({"id": "stale"}, None)
+        assert read == [0, 1, 2]
+        assert [d["answer"] for _, d in joined] == [f"r{i}" for i in range(10)]
+        assert looked_up == ["stale"]
+
+    def test_rows_dropped_from_the_window_are_looked_up(self):
+        dataset = [{"id": f"a.pcap#{i}", "answer": f"r{i}"} for i in range(5)]
+        generated = [{"id": "a.pcap#4"}, {"id": "a.pcap#3"}, {"id": "a.pcap#0"}]
+
+        def lookup(key):
+            return {"answer": f"lookup {key}", "question": None}
+
+        joined = [d["answer"] for _, d in _join_rows(generated, dataset, lookup, 2)]
+
+        # a.pcap#4 is beyond the window, a.pcap#0 is dropped to read a.pcap#3
+        assert joined == ["lookup a.pcap#4", "r3", "lookup a.pcap#0"]
+
+    def test_join_legacy_rows_by_prompt(self):
+        dataset = [{"prompt": "p0", "answer": "r0"}, {"prompt": "p1", "answer": "r1"}]
+        generated = [{"prompt": "p1", "generated_output": "x"}]
+
+        assert [d for _, d in _join_rows(generated, dataset)] == [
+            {"answer": "r1", "question": None}
+        ]
+
+
+class TestRetries:
+
+    def test_failed_requests_are_retried_then_skipped(self, dataset):
+        with MockOllama(latency="constant:0", error_rate=1.0) as mock:
+            evaluator = LLM_Evaluator(dataset_path=dataset, ollama_url=mock.start())
+            evaluator.answer_questions("generated.jsonl", resume=False)
+
+            assert mock.requests == 2 * 3
+        assert read_jsonl("generated.jsonl") == []
+
+    def test_connection_errors_skip_without_retries(self, dataset, monkeypatch, capsys):
+        # Ollama goes away after being checked
+        monkeypatch.setattr(OllamaClient, "wait_until_running", lambda self: None)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            url = f"http://127.0.0.1:{s.getsockname()[1]}"
+        evaluator = LLM_Evaluator(dataset_path=dataset, ollama_url=url)
+
+        evaluator.answer_questions("generated.jsonl", resume=False)
+
+        assert read_jsonl("generated.jsonl") == []
+        errors = [
+            line
+            for line in capsys.readouterr().out.splitlines()
+            if line.startswith("ConnectionError")
+        ]
+        assert len(errors) == 2
+
+
+class TestStreaming:
+
+    def test_streamed_answers_are_cached_with_their_metrics(self, dataset):
+        cache = ResponseCache(cache_path="responses.sqlite")
+        with MockOllama(latency="constant:0", tokens_per_second=1e4) as mock:
+            evaluator = LLM_Evaluator(
+                dataset_path=dataset,
+                ollama_url=mock.start(),
+                response_cache=cache,
+                stream=True,
+            )
+            evaluator.answer_questions("generated.jsonl", resume=False)
+            streamed = read_jsonl("generated.jsonl")
+            evaluator.answer_questions("generated.jsonl", resume=False)
+            cached = read_jsonl("generated.jsonl")
+
+            assert mock.requests == 2
+        cache.close()
+
+        assert [row["generated_output"] for row in streamed] == [
+            "Mock answer to Q: question 0",
+            "Mock answer to Q: question 1",
+        ]
+        assert all(row["metrics"]["time_to_first_token"] for row in streamed)
+        assert [row["generated_output"] for row in cached] == [
+            row["generated_output"] for row in streamed
+        ]
+        assert all(row["metrics"]["cached"] for row in cached)
+        assert (
+            cached[0]["metrics"]["eval_count"] == streamed[0]["metrics"]["eval_count"]
+        )
+
+
+TABLE = "No.|Time|Source|Destination|Protocol|Length|Info\n 1|0.0|10.0.0.1|10.0.0.2|TCP|60|80 -> 1234"
+EXAMPLES = ["Example\nQ: How many?\nA: 3", "Example\nQ: How long?\nA: 2 s"]
+ANSWERS = {"How many?": "1", "How long?": "0"}
+
+
+@pytest.fixture
+def few_shot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = DatasetStore.create(
+        str(tmp_path / "dataset.sqlite"), EXAMPLES, list(ANSWERS)
+    )
+    store.add("a.pcap", TABLE, ANSWERS)
+    store.add("b.pcap", TABLE.replace("TCP", "UDP"), ANSWERS)
+    store.close()
+    return str(tmp_path / "dataset.sqlite")
+
+
+class TestAnswerCapture:
+
+    def answer(self, dataset, inference):
+        with MockOllama(latency="constant:0", tokens_per_second=1e6) as mock:
+            evaluator = LLM_Evaluator(
+                dataset_path=dataset, ollama_url=mock.start(), inference=inference
+            )
+            evaluator.answer_questions("generated.jsonl", resume=False)
+        return mock, read_jsonl("generated.jsonl")
+
+    def test_batched_asks_the_table_once(self, few_shot):
+        mock, rows = self.answer(few_shot, "batched")
+
+        assert mock.requests == 2
+        assert all(prompt.count(" 1|0.0|") == 1 for prompt in mock.prompts)
+        assert mock.prompts[0].startswith(f"\n{TABLE}\nAnswer each of these 2")
+        assert f"Question 0:\n{EXAMPLES[0]}\nQ: How many?" in mock.prompts[0]
+        assert [row["id"] for row in rows] == [
+            "a.pcap#0",
+            "a.pcap#1",
+            "b.pcap#0",
+            "b.pcap#1",
+        ]
+        assert [row["generated_output"] for row in rows[:2]] == [
+            "Mock answer 0",
+            "Mock answer 1",
+        ]
+        assert rows[0]["metrics"]["batch"] == 2
+
+    def test_context_prefills_the_table(self, few_shot):
+        mock, rows = self.answer(few_shot, "context")
+
+        # A prefill and a question continuing it per question of every capture
+        assert mock.requests == 6
+        assert mock.prompts[:3] == [
+            f"\n{TABLE}\n",
+            f"{EXAMPLES[0]}\nQ: How many?",
+            f"{EXAMPLES[1]}\nQ: How long?",
+        ]
+        assert rows[1]["generated_output"] == "Mock answer to Q: How long?"
+        assert rows[1]["metrics"]["inference"] == "context"
+        assert rows[1]["metrics"]["prefill_latency"] is not None
+
+    def test_few_shot_jsonl_is_rejected(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        path = tmp_path / "dataset.jsonl"
+        path.write_text(
+            "".join(
+                json.dumps(row) + "\n"
+                for row in capture_rows("a.pcap", TABLE, EXAMPLES, ANSWERS)
+            )
+        )
+        evaluator = LLM_Evaluator(dataset_path=str(path), inference="context")
+
+        with pytest.raises(ValueError):
+            evaluator.answer_questions("generated.jsonl", resume=False)
+
+
+class TestEvaluate:
+
+    def test_rules_and_batched_judge_skip_broken_rows(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        answers = [
+            "In the capture there are a total of 5 packets",
+            "Cannot answer the question.",
+            "The IP is approximately 10.0.0.1 (estimated).",
+            "In the capture is not used any of those protocols.",
+            "The average size of packets in bytes is 60 bytes.",
+        ]
+        with open("dataset.jsonl", "w") as f:
+            for i, answer in enumerate(answers):
+                f.write(
+                    json.dumps({"id": f"a.pcap#{i}", "question": i, "answer": answer})
+                    + "\n"
+                )
+        generated = [
+            {"id": "a.pcap#0", "generated_output": "There are 5 packets"},
+            {"id": "a.pcap#1", "generated_output": "3"},
+            {"id": "a.pcap#2", "generated_output": "10.0.0.1"},
+            {"id": "a.pcap#3", "generated_output": "UDP"},
+            # Written by a failed run
+            {"id": "a.pcap#4"},
+        ]
+        os.makedirs("data/evaluation")
+        with open("data/evaluation/generated.jsonl", "w") as f:
+            f.writelines(json.dumps(row) + "\n" for row in generated)
+
+        with MockOllama(latency="constant:0") as mock:
+            evaluator = LLM_Evaluator(
+                dataset_path="dataset.jsonl",
+                ollama_url=mock.start(),
+                grader=Grader(),
+                judge_batch=2,
+            )
+            evaluator.evaluate_model("data/evaluation/generated.jsonl", resume=False)
+
+            # The second batch can not be judged, its valid answer is judged alone
+            assert mock.requests == 2
+        rows = read_jsonl("data/evaluation/evaluation_generated.jsonl")
+        assert sorted((row["id"], row["grader"]) for row in rows) == [
+            ("a.pcap#0", "rules"),
+            ("a.pcap#1", "judge"),
+            ("a.pcap#2", "judge"),
+            ("a.pcap#3", "judge"),
+        ]
+        assert all(row["evaluation"]["is_correct"] for row in rows)
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+from llm_eval.llm_eval import LLM_Evaluator
+from llm_eval.matrix import PHASES, run_matrix
+from llm_eval.mock_ollama import MockOllama
+
+
+@pytest.fixture
+def datasets(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for technique in ["zero_shot", "one_shot"]:
+        os.makedirs(f"data/{technique}")
+        with open(f"data/{technique}/dataset.jsonl", "w") as f:
+            for i in range(2):
+                row = {
+                    "id": f"a.pcap#{i}",
+                    "question": i,
+                    "context": "",
+                    "prompt": f"{technique}\ntable\nQ: question {i}",
+                    "answer": f"answer {i}",
+                }
+                f.write(json.dumps(row) + "\n")
+
+
+@pytest.fixture
+def mock():
+    with MockOllama(latency="constant:0", tokens_per_second=1e6) as mock:
+        yield mock
+
+
+class TestRunMatrix:
+
+    def test_grouped_by_model(self, datasets, mock):
+        timings = run_matrix(
+            ["llama2", "mistral"],
+            ["zero_shot", "one_shot", "missing"],
+            ollama_url=mock.start(),
+            report=False,
+        )
+
+        # Every model is loaded once and unloaded when its work is done
+        assert mock.loads == [
+            ("llama2", "30m"),
+            ("llama2", 0),
+            ("mistral", "30m"),
+            ("mistral", 0),
+            ("llama3", "30m"),
+            ("llama3", 0),
+        ]
+        assert sorted(os.listdir("data/evaluation")) == sorted(
+            f"{prefix}{technique}_{model}.jsonl"
+            for prefix in ["", "evaluation_"]
+            for technique in ["zero_shot", "one_shot"]
+            for model in ["llama2", "mistral"]
+        )
+        # The judge prompts come after all the answers
+        judged = [i for i, p in enumerate(mock.prompts) if p.startswith("Model to")]
+        assert judged == list(range(8, 16))
+        assert list(timings) == PHASES
+        assert timings["answer"] > 0 and timings["judge"] > 0
+        assert timings["report"] == 0
+
+    def test_inference_mode_in_the_output_paths(self, datasets, mock):
+        run_matrix(
+            ["llama2"],
+            ["zero_shot"],
+            ollama_url=mock.start(),
+            report=False,
+            inference="batched",
+        )
+
+        assert os.path.exists("data/evaluation/zero_shot-batched_llama2.jsonl")
+        assert os.path.exists(
+            "data/evaluation/evaluation_zero_shot-batched_llama2.jsonl"
+        )
+
+    def test_model_unloaded_when_answering_fails(self, datasets, mock, monkeypatch):
+        def fail(self, output_path, resume):
+            raise RuntimeError("answering failed")
+
+        monkeypatch.setattr(LLM_Evaluator, "answer_questions", fail)
+
+        with pytest.raises(RuntimeError):
+            run_matrix(["llama2"], ["zero_shot"], ollama_url=mock.start())
+
+        assert mock.loads == [("llama2", "30m"), ("llama2", 0)]
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from llm_eval.grader import JUDGE_SCHEMA
+from llm_eval.load_test import percentile, run_load_test
+from llm_eval.mock_ollama import MockOllama, parse_latency
+from llm_eval.ollama import OllamaClient
+
+
+@pytest.fixture
+def mock():
+    with MockOllama(latency="constant:0", tokens_per_second=1e6) as mock:
+        yield mock
+
+
+class TestMockOllama:
+
+    def test_generate_with_and_without_stream(self, mock):
+        client = OllamaClient(url=mock.start())
+        client.wait_until_running()
+
+        response, metrics = client.generate("llama2", "", "table\nQ: How many?")
+        streamed, stream_metrics = client.generate(
+            "llama2", "", "table\nQ: How many?", stream=True
+        )
+
+        assert response == streamed == "Mock answer to Q: How many?"
+        assert metrics["eval_count"] == stream_metrics["eval_count"] > 0
+        assert stream_metrics["time_to_first_token"] is not None
+        assert client.model_digest("llama3")
+
+    def test_scripted_and_structured_judge_replies(self):
+        with MockOllama(latency="constant:0", judge_replies=["bad", "good"]) as mock:
+            client = OllamaClient(url=mock.start())
+            replies = [
+                client.generate("llama3", "evaluate this", "a")[0] for _ in range(3)
+            ]
+            graded, _ = client.generate(
+                "llama3",
+                "evaluate",
+                "Answer 0:\nx\n\nAnswer 1:\ny",
+                format=JUDGE_SCHEMA,
+            )
+
+        assert replies == ["bad", "good", "bad"]
+        assert [grade["answer"] for grade in json.loads(graded)["grades"]] == [0, 1]
+
+    def test_errors(self):
+        with MockOllama(latency="constant:0", error_rate=1.0) as mock:
+            client = OllamaClient(url=mock.start())
+
+            assert client.generate("llama2", "", "Q: a") == ("", {})
+
+    def test_latency_distributions(self):
+        assert parse_latency("constant:0.5")(None) == 0.5
+        with pytest.raises(ValueError):
+            parse_latency("normal:1,2")
+
+
+class TestLoadTest:
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([], 50) is None
+
+    def test_answer_and_evaluate_with_cache(self, mock):
+        results = run_load_test(
+            mock.start(), [2], captures=2, packets=5, repeat=2, cache=True
+        )
+
+        assert [(r["stage"], r["run"], r["rows"]) for r in results] == [
+            ("answer", 1, 18),
+            ("evaluate", 1, 18),
+            ("answer", 2, 18),
+            ("evaluate", 2, 18),
+        ]
+        assert results[0]["calls"] == 18 and results[0]["p50"] is not None
+        assert results[2]["calls"] == 0 and results[2]["cache_hits"] == 18
@@ -0,0 +1,107 @@
+import io
+import socket
+import time
+
+import pytest
+import requests
+
+from llm_eval.mock_ollama import MockOllama
+from llm_eval.ollama import OllamaClient, _metrics
+
+
+@pytest.fixture
+def mock():
+    with MockOllama(latency="constant:0", tokens_per_second=1e6) as mock:
+        yield mock
+
+
+def closed_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+class TestOllamaClient:
+
+    def test_generate_metrics(self, mock):
+        client = OllamaClient(url=mock.start())
+
+        response, metrics = client.generate("llama2", "", "Q: How many?")
+
+        assert response == "Mock answer to Q: How many?"
+        assert metrics["prompt_eval_count"] > 0
+        assert metrics["eval_count"] == 7
+        assert metrics["latency"] > 0
+        assert metrics["time_to_first_token"] is None
+
+    def test_stream_measures_time_to_first_token(self, mock):
+        client = OllamaClient(url=mock.start())
+
+        response, metrics = client.generate("llama2", "", "Q: How many?", stream=True)
+
+        assert response == "Mock answer to Q: How many?"
+        assert metrics["eval_count"] == 7
+        assert 0 < metrics["time_to_first_token"] <= metrics["latency"]
+
+    def test_prefill_returns_the_context(self, mock):
+        client = OllamaClient(url=mock.start())
+
+        context, metrics = client.prefill("llama2", "", "table")
+
+        assert context and metrics["latency"] > 0
+        response, _ = client.generate("llama2", "", "Q: a", context=context)
+        assert response
+
+    def test_model_digest_without_tag(self, mock):
+        client = OllamaClient(url=mock.start())
+
+        assert client.model_digest("llama2") == client.model_digest("llama2:latest")
+        assert client.model_digest("llama2") != client.model_digest("llama3")
+        assert client.model_digest("unknown") == ""
+
+    def test_http_errors_give_an_empty_response(self):
+        with MockOllama(latency="constant:0", error_rate=1.0) as mock:
+            client = OllamaClient(url=mock.start())
+
+            assert client.generate("llama2", "", "Q: a", stream=True) == ("", {})
+            assert client.prefill("llama2", "", "table") == ([], {})
+
+    def test_connection_errors_propagate(self):
+        client = OllamaClient(url=closed_url())
+
+        with pytest.raises(requests.ConnectionError):
+            client.generate("llama2", "", "Q: a")
+
+    def test_not_running_without_terminal(self, monkeypatch):
+        monkeypatch.setattr("sys.stdin", io.StringIO())
+        client = OllamaClient(url=closed_url())
+
+        with pytest.raises(ConnectionError):
+            client.wait_until_running()
+
+
+class TestMetrics:
+
+    def test_tokens_per_second(self):
+        final = {
+            "prompt_eval_count": 10,
+            "eval_count": 50,
+            "eval_duration": 2 * 10**9,
+        }
+
+        metrics = _metrics(final, time.perf_counter() - 1, None)
+
+        assert metrics["tokens_per_second"] == 25.0
+        assert metrics["latency"] >= 1
+        assert metrics["time_to_first_token"] is None
+        assert metrics["prompt_eval_count"] == 10
+
+    def test_without_final_chunk(self):
+        start = time.perf_counter()
+
+        metrics = _metrics({}, start, start + 0.5)
+
+        assert metrics["time_to_first_token"] == 0.5
+        assert metrics["eval_count"] is None
+        assert metrics["tokens_per_second"] is None
@@ -0,0 +1,90 @@
+import json
+import os
+
+from llm_eval.report import _run_figures, aggregate, load_evaluations, summarize_runs
+
+
+def write_evaluation(path, rows):
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+class TestReport:
+
+    def test_aggregate_runs(self, tmp_path):
+        write_evaluation(
+            tmp_path / "evaluation_zero_shot_llama2.jsonl",
+            [
+                {
+                    "question": 0,
+                    "evaluation": {"is_correct": "Yes", "punctuation": 100},
+                },
+                {"question": 0, "evaluation": {"is_correct": "No", "punctuation": 0}},
+            ],
+        )
+        # Older files without question index are bucketed by position
+        write_evaluation(
+            tmp_path / "evaluation_chain_of_thought_mistral.jsonl",
+            [
+                {"evaluation": {"is_correct": "Yes", "punctuation": 80}},
+                {
+                    "evaluation": {
+                        "is_correct": "No",
+                        "punctuation": 0,
+                        "note": "Model to evaluate the answer is not working properly",
+                    }
+                },
+            ],
+        )
+
+        per_question = aggregate(load_evaluations(str(tmp_path)))
+
+        assert per_question[
+            ["model", "technique", "question", "total", "correct", "problematic_eval"]
+        ].values.tolist() == [
+            ["llama2", "zero_shot", 0, 2, 1, 0],
+            ["mistral", "chain_of_thought", 0, 1, 1, 0],
+            ["mistral", "chain_of_thought", 1, 1, 0, 1],
+        ]
+        assert per_question["average_punct"].tolist() == [50, 80, 0]
+
+    def test_summarize_runs(self, tmp_path):
+        write_evaluation(
+            tmp_path / "evaluation_zero_shot_mistral.jsonl",
+            [
+                {"question": 0, "evaluation": {"is_correct": "Yes", "punctuation": 90}},
+                {"question": 1, "evaluation": {"is_correct": "No", "punctuation": 10}},
+                {"question": 1, "evaluation": {"is_correct": "No", "punctuation": 20}},
+            ],
+        )
+        write_evaluation(
+            tmp_path / "evaluation_one_shot_llama2.jsonl",
+            [{"question": 0, "evaluation": {"is_correct": "Yes", "punctuation": 70}}],
+        )
+        evaluations = load_evaluations(str(tmp_path))
+
+        per_run = summarize_runs(evaluations, aggregate(evaluations))
+
+        # Every run keeps its own punctuation, matched on model and technique
+        assert per_run[
+            ["model", "technique", "total", "correct", "accuracy", "average_punct"]
+        ].values.tolist() == [
+            ["llama2", "one_shot", 1, 1, 100.0, 70.0],
+            ["mistral", "zero_shot", 3, 1, 33.33, 40.0],
+        ]
+
+    def test_run_charts_do_not_overwrite_the_run_report(self, tmp_path):
+        write_evaluation(
+            tmp_path / "evaluation_zero_shot_llama2.jsonl",
+            [{"question": 0, "evaluation": {"is_correct": "Yes", "punctuation": 100}}],
+        )
+        per_question = aggregate(load_evaluations(str(tmp_path)))
+
+        figures = _run_figures(per_question, "llama2", "zero_shot", str(tmp_path))
+
+        assert sorted(os.path.basename(path) for path in figures) == [
+            "full_report_correct_incorrect_bar_chart.png",
+            "full_report_correct_incorrect_pie_chart.png",
+            "full_report_total_punctuation_radar_chart.png",
+        ]
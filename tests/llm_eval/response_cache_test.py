@@ -0,0 +1,50 @@
+import hashlib
+import json
+
+from llm_eval.response_cache import ResponseCache
+
+
+class TestResponseCache:
+
+    def test_key_depends_on_payload_and_digest(self, tmp_path):
+        cache = ResponseCache(cache_path=str(tmp_path / "responses.sqlite"))
+        payload = {"model": "llama2", "prompt": "Q", "options": {"temperature": 0}}
+
+        assert cache.key(payload, "digest") == cache.key(dict(payload), "digest")
+        assert cache.key(payload, "digest") != cache.key(payload, "other")
+
+    def test_entries_of_older_versions_are_not_read(self, tmp_path):
+        cache = ResponseCache(cache_path=str(tmp_path / "responses.sqlite"))
+        payload = {"model": "llama2", "prompt": "Q", "options": {"temperature": 0}}
+        # Key of the entries storing only the response text
+        legacy_key = hashlib.sha256(
+            json.dumps([payload, "digest"], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        cache.put(legacy_key, "text")
+
+        assert cache.get(cache.key(payload, "digest")) is None
+        cache.close()
+
+    def test_hits_misses_and_eviction(self, tmp_path):
+        cache = ResponseCache(
+            cache_path=str(tmp_path / "responses.sqlite"), max_size=20
+        )
+        cache.put("a", "x" * 10)
+        cache.put("b", "y" * 10)
+
+        assert cache.get("a") == "x" * 10
+        assert cache.get("c") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # "b" is now the least recently used entry
+        cache.evict()
+        assert cache.get("b") is None
+        assert cache.get("a") == "x" * 10
+        cache.close()
+
+    def test_disabled(self, tmp_path):
+        cache = ResponseCache(cache_path=str(tmp_path / "r.sqlite"), enabled=False)
+        cache.put("a", "x")
+
+        assert cache.get("a") is None
+        assert not (tmp_path / "r.sqlite").exists()
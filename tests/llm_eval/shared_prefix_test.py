@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from llm_eval.shared_prefix import (
+    batched_prompt,
+    capture_groups,
+    parse_answers,
+    shared_prompts,
+)
+
+
+class TestSharedPrefix:
+
+    def test_groups_consecutive_rows_of_a_capture(self):
+        rows = [
+            {"id": "a.pcap#0"},
+            {"id": "a.pcap#1"},
+            {"id": "b#c.pcap#0"},
+            {"prompt": "old"},
+            {"prompt": "older"},
+            {"id": "a.pcap#2"},
+        ]
+
+        groups = [[row.get("id") for row in group] for group in capture_groups(rows)]
+
+        assert groups == [
+            ["a.pcap#0", "a.pcap#1"],
+            ["b#c.pcap#0"],
+            [None],
+            [None],
+            ["a.pcap#2"],
+        ]
+
+    def test_zero_shot_prompts_split_at_a_line_end(self):
+        prefix, questions = shared_prompts(
+            [
+                {"prompt": "\n1 | TCP\nQ: How many packets?"},
+                {"prompt": "\n1 | TCP\nQ: How long?"},
+            ]
+        )
+
+        assert prefix == "\n1 | TCP\n"
+        assert questions == ["Q: How many packets?", "Q: How long?"]
+        assert shared_prompts([{"prompt": "a\nQ: b"}]) == ("a\n", ["Q: b"])
+
+    def test_few_shot_prompts_share_the_table_first(self):
+        rows = [
+            {
+                "prompt": "Example\nQ: a\nA: 1\n1 | TCP\nQ: a",
+                "parts": {
+                    "example": "Example\nQ: a\nA: 1",
+                    "table": "1 | TCP",
+                    "question": "a",
+                },
+            },
+            {
+                "prompt": "\n1 | TCP\nQ: b",
+                "parts": {"example": "", "table": "1 | TCP", "question": "b"},
+            },
+        ]
+
+        assert shared_prompts(rows) == (
+            "\n1 | TCP\n",
+            ["Example\nQ: a\nA: 1\nQ: a", "Q: b"],
+        )
+        with pytest.raises(ValueError):
+            shared_prompts([{"prompt": row["prompt"]} for row in rows])
+
+    def test_batched_prompt_and_answers(self):
+        prompt = batched_prompt("table\n", ["Q: a", "Q: b"])
+        output = json.dumps(
+            {
+                "answers": [
+                    {"question": 1, "answer": "B"},
+                    {"question": 0, "answer": " "},
+                    {"question": 7, "answer": "X"},
+                ]
+            }
+        )
+
+        assert prompt.startswith("table\nAnswer each of these 2 questions:")
+        assert "Question 1:\nQ: b" in prompt
+        assert parse_answers(output, 2) == {1: "B"}
+        assert parse_answers("{", 2) == {}
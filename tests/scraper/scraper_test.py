@@ -1,5 +1,12 @@
+import os
+import stat
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from unittest import mock
 
+import pytest
+
 from scraper.scraper import Scraper
 
 
@@ -35,3 +42,74 @@ class TestScraper:
             "https://wiki.wireshark.org/capture2.pcap",
             "https://wiki.wireshark.org/capture3.pcapng",
         ]
+
+
+class CaptureHandler(SimpleHTTPRequestHandler):
+    requests_seen = []
+
+    def log_request(self, code="-", size="-"):
+        CaptureHandler.requests_seen.append(str(int(code)))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def capture_server(tmp_path):
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "capture1.pcap").write_bytes(b"\xd4\xc3\xb2\xa1" + b"\x00" * 2048)
+    (served / "capture2.pcapng").write_bytes(b"\x0a\x0d\x0d\x0a" + b"\x01" * 4096)
+
+    CaptureHandler.requests_seen = []
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(CaptureHandler, directory=str(served))
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", served
+    server.shutdown()
+    server.server_close()
+
+
+class TestDownloadCaptures:
+
+    @mock.patch("requests.get", side_effect=mocked_requests_get)
+    def test_download_and_conditional_rerun(self, mock_get, tmp_path, capture_server):
+        url, served = capture_server
+        output = tmp_path / "raw"
+
+        scraper = Scraper(workers=2)
+        scraper.download_urls = [
+            f"{url}/capture1.pcap",
+            f"{url}/capture2.pcapng",
+            f"{url}/missing.pcap",
+        ]
+        scraper.download_captures(output_path=str(output))
+
+        for name in ("capture1.pcap", "capture2.pcapng"):
+            assert (output / name).read_bytes() == (served / name).read_bytes()
+        assert not (output / "missing.pcap").exists()
+        assert not list(output.glob("*.part"))
+        assert sorted(CaptureHandler.requests_seen) == ["200", "200", "404"]
+
+        # The second run only revalidates the captures already on disk
+        CaptureHandler.requests_seen = []
+        scraper.download_captures(output_path=str(output))
+
+        assert sorted(CaptureHandler.requests_seen) == ["304", "304", "404"]
+
+    @mock.patch("requests.get", side_effect=mocked_requests_get)
+    def test_downloads_follow_the_umask(self, mock_get, tmp_path, capture_server):
+        url, _ = capture_server
+        output = tmp_path / "raw"
+        umask = os.umask(0o027)
+        try:
+            scraper = Scraper()
+        finally:
+            os.umask(umask)
+        scraper.download_urls = [f"{url}/capture1.pcap"]
+
+        scraper.download_captures(output_path=str(output))
+
+        assert stat.S_IMODE((output / "capture1.pcap").stat().st_mode) == 0o640
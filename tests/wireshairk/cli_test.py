@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import struct
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+from tests.captures import FRAMES, write_pcap
+from wireshairk.__main__ import wireshairk
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src")
+
+# Seconds importing the CLI may take. It needs about 0.05 s, importing the
+# dependencies of the commands eagerly takes ten times more
+IMPORT_BUDGET = 0.25
+
+HEAVY_MODULES = ["bs4", "pandas", "plotly", "pyshark", "requests"]
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    path = [SRC] + [p for p in os.environ.get("PYTHONPATH", "").split(os.pathsep) if p]
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(path)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+class TestStartup:
+
+    def test_import_time_budget(self):
+        timings = []
+        for _ in range(3):
+            result = run_python("import wireshairk.__main__")
+            cumulative = re.search(
+                r"^import time:\s+\d+ \|\s+(\d+) \| wireshairk\.__main__$",
+                result.stderr,
+                re.MULTILINE,
+            )
+            timings.append(int(cumulative.group(1)) / 1e6)
+
+        # The best of three runs, a busy machine only makes some slower
+        assert min(timings) < IMPORT_BUDGET
+
+    def test_help_loads_no_command_dependencies(self):
+        result = run_python(
+            "import sys\n"
+            "from click.testing import CliRunner\n"
+            "from wireshairk.__main__ import wireshairk\n"
+            "runner = CliRunner()\n"
+            "assert runner.invoke(wireshairk, ['--help']).exit_code == 0\n"
+            "for name in wireshairk.commands:\n"
+            "    assert runner.invoke(wireshairk, [name, '--help']).exit_code == 0, name\n"
+            f"print(sorted(set({HEAVY_MODULES!r}) & set(sys.modules)))"
+        )
+
+        assert result.stdout.strip().splitlines()[-1] == "[]"
+
+
+class TestCaptureStats:
+
+    def test_incremental_run_after_split_with_state(self, tmp_path, monkeypatch):
+        frames = FRAMES * 4
+        capture = tmp_path / "capture.pcap"
+        write_pcap(capture, frames)
+
+        def editcap(command):
+            # Chunks as editcap -c writes them
+            size, output = int(command[2]), command[4]
+            base, extension = os.path.splitext(output)
+            for i in range(0, len(frames), size):
+                write_pcap(f"{base}_{i // size:05d}{extension}", frames[i : i + size])
+
+        monkeypatch.setattr("dataset.stats.check_output", editcap)
+        state = str(tmp_path / "state.json")
+        runner = CliRunner()
+
+        def run(*args):
+            result = runner.invoke(
+                wireshairk, ["capture-stats", str(capture), "--state", state, *args]
+            )
+            assert result.exit_code == 0, result.output
+            with open(state) as f:
+                return json.load(f)["num_packets"]
+
+        assert run("--split", "5", "--workers", "1") == 12
+        assert run() == 12
+
+        with open(capture, "ab") as f:
+            _, frame = FRAMES[0]
+            f.write(struct.pack("<IIII", 20, 0, len(frame), len(frame)) + frame)
+        assert run() == 13
+
+
+class TestScrapeAndClean:
+
+    def test_forwards_the_clean_options(self, monkeypatch):
+        import lib.clean_raw_data
+        import scraper.scraper
+
+        downloads = []
+        cleans = []
+
+        class Scraper:
+            # The real one lists the captures of the Wireshark wiki
+            def __init__(self, workers):
+                self.workers = workers
+
+            def download_captures(self):
+                downloads.append(self.workers)
+
+        monkeypatch.setattr(scraper.scraper, "Scraper", Scraper)
+        monkeypatch.setattr(
+            lib.clean_raw_data,
+            "clean_raw_data",
+            lambda **options: cleans.append(options) or [],
+        )
+
+        result = CliRunner().invoke(
+            wireshairk,
+            [
+                "scrape-and-clean",
+                "--workers",
+                "2",
+                "--min_packets",
+                "5",
+                "--max_packets",
+                "50",
+                "--clean_workers",
+                "3",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert downloads == [2]
+        assert cleans == [{"min_packets": 5, "max_packets": 50, "workers": 3}]
+
+
+class TestRunMatrix:
+
+    def test_ollama_not_running(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        result = CliRunner().invoke(
+            wireshairk,
+            ["run-matrix", "--ollama_url", "http://127.0.0.1:9", "--no_cache"],
+        )
+
+        # A clear error instead of a traceback
+        assert result.exit_code == 1
+        assert "Error: Ollama is not running at http://127.0.0.1:9" in result.output
+        assert "Traceback" not in result.output